@@ -0,0 +1,285 @@
+"""
+Offline benchmark of the requesters on the fixtures of every ``RequestApi``, served by ``StandInServer``.
+
+Each (API, requester) scenario runs in a fresh process and reports:
+
+* chapters/s: completed chapters per second of wall time, catalogue included
+* p50/p99: latency of one chapter page, from sending its request to having it parsed
+* CPU time of each stage: ``catalogue``, ``fetch`` (requests and the event loop) and ``parse`` (decoding, parsing and
+  decrypting, only separated for the APIs with a parse stage, see ``RequestApi.has_parse_stage``)
+* peak RSS of the process
+
+The requesters:
+
+* ``iterative``: ``IterativeRequester`` following the next chapters from the first one, only for the APIs whose
+  chapters link to the next ones
+* ``sync``: ``AsyncRequester`` with ``is_async=False``, i.e. the catalogue then the chapters one by one
+* ``async``: ``AsyncRequester`` on the event loop, parsing on the loop too
+* ``async-threads``: ``AsyncRequester`` parsing in a thread pool
+
+Usage: ``python -m benchmarks.bench_requesters --chapters 200 --latency 0.02 --error-rate 0.05 --json out.json``
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from benchmarks.fixtures import Fixture, NAMESPACES, build, write_accounts
+from benchmarks.server import StandInServer, LocalSessionPool, LocalSession
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REQUESTERS = ['iterative', 'sync', 'async', 'async-threads']
+
+
+class InlineExecutor(Executor):
+    """Run the parse stage right away on the event loop, so that its CPU time is measured apart from the fetch"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+class Probe:
+    """Timers wrapped around the stages of an API and a requester"""
+
+    def __init__(self, n_chapters):
+        self.n_chapters = n_chapters
+        self.latencies = []
+        self.cpu = dict(catalogue=0., parse=0.)
+        self.n_pages = 0
+
+    def wrap_sync(self, obj, name, stage=None, latency=False, limit=False, clock=time.thread_time):
+        func = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            start, cpu = time.perf_counter(), clock()
+            result = func(*args, **kwargs)
+            if stage is not None:
+                self.cpu[stage] += clock() - cpu
+            if latency:
+                self.latencies.append(time.perf_counter() - start)
+            if limit:
+                # stop following the next chapters after the last one of the fixture
+                self.n_pages += 1
+                if self.n_pages >= self.n_chapters:
+                    result = result[0], None
+            return result
+
+        setattr(obj, name, wrapper)
+
+    def wrap_async(self, obj, name, stage=None, latency=False):
+        func = getattr(obj, name)
+
+        async def wrapper(*args, **kwargs):
+            start, cpu = time.perf_counter(), time.process_time()
+            result = await func(*args, **kwargs)
+            if stage is not None:
+                self.cpu[stage] += time.process_time() - cpu
+            if latency:
+                self.latencies.append(time.perf_counter() - start)
+            return result
+
+        setattr(obj, name, wrapper)
+
+
+def run_async_requester(api, probe, fixture, base_url, threads=False, *, concurrency=16, per_host=8,
+                        retry_count=20):
+    from schomeless.requester import AsyncRequester
+
+    executor = ThreadPoolExecutor(4) if threads else InlineExecutor()
+    requester = AsyncRequester(api, max_concurrency=concurrency, max_per_host=per_host, parse_executor=executor)
+    probe.wrap_async(requester, 'request_page', latency=True)
+
+    async def _core():
+        async with LocalSession(requester.create_session(), base_url) as session:
+            return await requester.run_internal_async(fixture.catalogue, session=session, retry_count=retry_count)
+
+    try:
+        return asyncio.run(_core())
+    finally:
+        executor.shutdown()
+
+
+def run_scenario(fixture, requester, base_url, *, concurrency=16, per_host=8, retry_count=20):
+    """Run one requester on one fixture in this process
+
+    Returns:
+        dict: metrics
+    """
+    from schomeless.api import RequestApi, CookieManager, FqNovelApi
+    from schomeless.requester import IterativeRequester, AsyncRequester
+    from schomeless.utils import RequestsTool, SessionPool
+
+    account_path = CookieManager.ACCOUNT_PATH
+    tempdir = tempfile.TemporaryDirectory()
+    write_accounts(tempdir.name)
+    RequestsTool.set_sessions(LocalSessionPool(base_url, size=concurrency, pool_maxsize=per_host))
+    try:
+        api = RequestApi[fixture.namespace]()
+        probe = Probe(fixture.n_chapters)
+        probe.wrap_sync(api, 'parse_chapter', 'parse')
+        # the catalogue pages may be requested in threads, but nothing else runs meanwhile
+        probe.wrap_sync(api, 'get_chapter_list', 'catalogue', clock=time.process_time)
+        probe.wrap_async(api, 'get_chapter_list_async', 'catalogue')
+        rss_before = peak_rss_mb()
+        start, cpu = time.perf_counter(), time.process_time()
+        if requester == 'iterative':
+            probe.wrap_sync(api, 'get_chapter', latency=True, limit=True)
+            chapters = IterativeRequester(api).run_internal(fixture.first)
+        elif requester == 'sync':
+            probe.wrap_sync(api, 'get_chapter', latency=True)
+            chapters = AsyncRequester(api).run_internal(fixture.catalogue, is_async=False, retry_count=retry_count)
+        else:
+            chapters = run_async_requester(api, probe, fixture, base_url, requester == 'async-threads',
+                                           concurrency=concurrency, per_host=per_host, retry_count=retry_count)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    finally:
+        RequestsTool.set_sessions(SessionPool())
+        FqNovelApi.shutdown_executor()
+        CookieManager.ACCOUNT_PATH = account_path
+        tempdir.cleanup()
+    n_done = sum(1 for c in chapters if c is not None and c.content)
+    parse_cpu = probe.cpu['parse'] if api.has_parse_stage() and requester.startswith('async') else None
+    return dict(
+        api=fixture.namespace,
+        requester=requester,
+        chapters=n_done,
+        expected=fixture.n_chapters,
+        seconds=elapsed,
+        chapters_per_sec=n_done / elapsed if elapsed else None,
+        p50_ms=(percentile(probe.latencies, 50) or 0) * 1000,
+        p99_ms=(percentile(probe.latencies, 99) or 0) * 1000,
+        cpu_catalogue=probe.cpu['catalogue'],
+        cpu_fetch=cpu - probe.cpu['catalogue'] - (parse_cpu or 0),
+        cpu_parse=parse_cpu,
+        rss_mb=peak_rss_mb(),
+        rss_before_mb=rss_before
+    )
+
+
+def _run_in_process(path, requester, base_url, kwargs):
+    logging.disable(logging.INFO)
+    return run_scenario(Fixture.load(path), requester, base_url, **kwargs)
+
+
+def run(namespaces=None, requesters=None, *, n_chapters=100, chapter_size=3000, latency=0., jitter=0.,
+        error_rate=0., fixture_dir=None, isolate=True, **kwargs):
+    """
+
+    Args:
+        namespaces (list[str], optional): all in ``NAMESPACES`` if not provided
+        requesters (list[str], optional): all in ``REQUESTERS`` if not provided
+        n_chapters (int, optional): chapters of each synthesized fixture
+        chapter_size (int, optional): characters of each synthesized chapter
+        latency (float, optional): see ``StandInServer``
+        jitter (float, optional):
+        error_rate (float, optional):
+        fixture_dir (str, optional): use ``{namespace}.json`` in it instead of synthesizing if exists, \
+                                     e.g. recorded ones
+        isolate (bool, optional): run each scenario in a new process, so that the peak RSS is its own
+        **kwargs: see ``run_scenario``
+
+    Returns:
+        list[dict]: metrics of each scenario
+    """
+    namespaces = namespaces or NAMESPACES
+    requesters = requesters or REQUESTERS
+    results = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        paths = {}
+        for ns in namespaces:
+            path = os.path.join(fixture_dir, f'{ns}.json') if fixture_dir else None
+            if path is None or not os.path.exists(path):
+                path = os.path.join(tempdir, f'{ns}.json')
+                build(ns, n_chapters, chapter_size).save(path)
+            paths[ns] = path
+        fixtures = {ns: Fixture.load(path) for ns, path in paths.items()}
+        with StandInServer(list(fixtures.values()), latency=latency, jitter=jitter, error_rate=error_rate) as server:
+            for ns in namespaces:
+                for requester in requesters:
+                    if requester == 'iterative' and fixtures[ns].first is None:
+                        continue
+                    if isolate:
+                        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+                            result = executor.submit(_run_in_process, paths[ns], requester, server.base_url,
+                                                     kwargs).result()
+                    else:
+                        result = run_scenario(fixtures[ns], requester, server.base_url, **kwargs)
+                    results.append(result)
+                    print(format_row(result), flush=True)
+            stats = server.stats()
+    print(f"Server: {stats['requests']} requests, {stats['errors']} injected errors, {stats['misses']} unmatched")
+    return results
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+HEADER = f"{'API':<8} {'requester':<14} {'done':>9} {'chap/s':>8} {'p50 ms':>8} {'p99 ms':>8} " \
+         f"{'cpu cat':>8} {'cpu fetch':>9} {'cpu parse':>9} {'RSS MB':>7}"
+
+
+def format_row(r):
+    return f"{r['api']:<8} {r['requester']:<14} {r['chapters']:>4}/{r['expected']:<4} " \
+           f"{_fmt(r['chapters_per_sec'], '8.1f')} {r['p50_ms']:8.1f} {r['p99_ms']:8.1f} " \
+           f"{r['cpu_catalogue']:8.3f} {r['cpu_fetch']:9.3f} {_fmt(r['cpu_parse'], '9.3f')} " \
+           f"{_fmt(r['rss_mb'], '7.0f')}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apis', nargs='+', choices=NAMESPACES)
+    parser.add_argument('--requesters', nargs='+', choices=REQUESTERS)
+    parser.add_argument('--chapters', type=int, default=100)
+    parser.add_argument('--chapter-size', type=int, default=3000)
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds before each response')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--fixtures', help='directory of recorded fixtures, see benchmarks.fixtures')
+    parser.add_argument('--no-isolate', action='store_true', help='run all scenarios in this process')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    print(HEADER)
+    results = run(args.apis, args.requesters, n_chapters=args.chapters, chapter_size=args.chapter_size,
+                  latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, fixture_dir=args.fixtures,
+                  isolate=not args.no_isolate, concurrency=args.concurrency, per_host=args.per_host)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Microbenchmark of the FQNOVEL ``TextEncoder.decrypt``: the translation table vs. mapping ``_interpret``.
+
+Usage: ``python -m benchmarks.bench_text_encoder [size_in_MB]``
+"""
+import random
+import sys
+import time
+
+from schomeless.api.fqnovel import TextEncoder
+
+
+def make_corpus(size_mb=5, seed=0):
+    """A synthetic chapter corpus of about ``size_mb`` MB in UTF-8, mixing encrypted and plain characters"""
+    rng = random.Random(seed)
+    start, n = TextEncoder.CODE_START, len(TextEncoder.CHARSET)
+    chars = [chr(c) for c in range(start, start + n)] + list('，。“”！？\n') + list('的一是了我不人在他有')
+    n_chars = size_mb * 1024 * 1024 // 3
+    return ''.join(rng.choices(chars, k=n_chars))
+
+
+def timeit(func, text, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(size_mb=5):
+    text = make_corpus(size_mb)
+    assert TextEncoder.decrypt(text) == ''.join(map(TextEncoder._interpret, text))
+    baseline = timeit(lambda t: ''.join(map(TextEncoder._interpret, t)), text)
+    table = timeit(TextEncoder.decrypt, text)
+    print(f"{size_mb} MB corpus: map(_interpret) {baseline:.3f}s, str.translate {table:.3f}s, "
+          f"speedup x{baseline / table:.1f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
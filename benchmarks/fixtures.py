@@ -0,0 +1,506 @@
+"""
+Recorded HTTP responses of a book for each ``RequestApi``, replayed by ``benchmarks.server.StandInServer``.
+
+A fixture is either synthesized offline by the builder of its namespace (see ``build``), or recorded from the live
+site (see ``record``). Both are saved in the same JSON format, so a recorded fixture can replace a synthetic one.
+
+Usage::
+
+    python -m benchmarks.fixtures build JJWXC --chapters 200 --out fixtures/JJWXC.json
+    python -m benchmarks.fixtures record JJWXC '{"novel_id": 1234}' --chapters 20 --out fixtures/JJWXC.json
+"""
+import argparse
+import base64
+import dataclasses
+import importlib
+import json
+import random
+from dataclasses import dataclass, field
+from typing import List, Optional
+from urllib.parse import urlsplit, parse_qsl
+
+from Crypto.Cipher import AES, DES
+from Crypto.Util.Padding import pad
+
+from schomeless.api import (RequestApi, CookieManager, JjwxcApi, FqNovelApi, QimaoApi, LofterApi, Po18Api,
+                            LongmaApi, MyRicsApi)
+from schomeless.api.fqnovel import TextEncoder
+from schomeless.api.jjwxc import KEY_HARDCODE, IV_HARDCODE
+from schomeless.api.qimao import CONTENT_KEY
+from schomeless.utils import SessionPool, RequestsTool
+
+__all__ = [
+    'Response',
+    'Fixture',
+    'build',
+    'record',
+    'write_accounts',
+    'NAMESPACES'
+]
+
+CHARS = '的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多' \
+        '然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长'
+PUNCTUATION = '，，，。。！？'
+CONTENT_TYPES = {
+    'html': 'text/html; charset={charset}',
+    'json': 'application/json; charset={charset}',
+    'text': 'text/plain; charset={charset}'
+}
+ACCOUNT = {
+    'cookies': 'sessionid=benchmark; token=benchmark',
+    'token': '1_0123456789abcdef0123456789abcdef'
+}
+"""A fake account for every namespace, as ``CookieManager`` requires one to create most APIs"""
+IGNORED_PARAMS = {'token', 'versionCode'}
+"""Parameters of the account or the app version, not recorded so that a fixture is replayed with any account"""
+
+
+@dataclass
+class Response:
+    """A recorded response, matched by its method, URL and a subset of the query, form or JSON parameters"""
+    method: str
+    url: str
+    body: bytes
+    params: dict = field(default_factory=dict)
+    status: int = 200
+    headers: dict = field(default_factory=dict)
+    kind: str = 'chapter'
+    """``catalogue`` or ``chapter``, errors are only injected into chapters, see ``StandInServer``"""
+
+    @property
+    def key(self):
+        """
+
+        Returns:
+            3-tuple: ``(method, host, path)``
+        """
+        parsed = urlsplit(self.url)
+        return self.method.upper(), parsed.netloc, parsed.path or '/'
+
+    def match(self, params):
+        """
+
+        Args:
+            params (dict[str, str]): all parameters of a request
+
+        Returns:
+            int: number of parameters matched, or -1 if not matched
+        """
+        for k, v in self.params.items():
+            if params.get(k) != v:
+                return -1
+        return len(self.params)
+
+    def to_json(self):
+        return dict(method=self.method, url=self.url, params=self.params, status=self.status, headers=self.headers,
+                    kind=self.kind, body=base64.b64encode(self.body).decode('ascii'))
+
+    @staticmethod
+    def from_json(obj):
+        obj = dict(obj)
+        obj['body'] = base64.b64decode(obj['body'])
+        return Response(**obj)
+
+
+@dataclass
+class Fixture:
+    """Responses of one book"""
+    namespace: str
+    catalogue: object
+    """CatalogueRequest of the book"""
+    first: Optional[object] = None
+    """ChapterRequest of the first chapter, if the chapters link to the next ones, i.e. for ``IterativeRequester``"""
+    responses: List[Response] = field(default_factory=list)
+    n_chapters: int = 0
+
+    def add(self, method, url, body, *, params=None, kind='chapter', content_type='html', charset='utf-8',
+            status=200, headers=None):
+        """
+
+        Args:
+            method (str):
+            url (str): the query is moved to ``params``
+            body (str, bytes, dict or list): ``str`` is encoded in ``charset``, ``dict`` and ``list`` are dumped to JSON
+            params (dict, optional): parameters to match besides the query of the URL
+            kind (str, optional):
+            content_type (str, optional): a key of ``CONTENT_TYPES``, or a full content type
+            charset (str, optional):
+            status (int, optional):
+            headers (dict, optional): other headers of the response
+        """
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode(charset)
+        parsed = urlsplit(url)
+        all_params = dict(parse_qsl(parsed.query))
+        all_params.update({k: str(v) for k, v in (params or {}).items()})
+        headers = dict(headers or {})
+        headers['Content-Type'] = CONTENT_TYPES.get(content_type, content_type).format(charset=charset)
+        self.responses.append(Response(method.upper(), parsed._replace(query='').geturl(), body, all_params, status,
+                                       headers, kind))
+
+    def save(self, path):
+        obj = dict(namespace=self.namespace, catalogue=encode_request(self.catalogue),
+                   first=encode_request(self.first), n_chapters=self.n_chapters,
+                   responses=[r.to_json() for r in self.responses])
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            obj = json.load(f)
+        return Fixture(obj['namespace'], decode_request(obj['catalogue']), decode_request(obj['first']),
+                       [Response.from_json(r) for r in obj['responses']], obj['n_chapters'])
+
+
+def encode_request(req):
+    if req is None:
+        return None
+    cls = type(req)
+    return {'type': f'{cls.__module__}:{cls.__qualname__}', 'fields': dataclasses.asdict(req)}
+
+
+def decode_request(obj):
+    if obj is None:
+        return None
+    module, qualname = obj['type'].split(':')
+    cls = importlib.import_module(module)
+    for name in qualname.split('.'):
+        cls = getattr(cls, name)
+    return cls(**obj['fields'])
+
+
+def write_accounts(dirname):
+    """Write a fake account of every namespace, and let ``CookieManager`` read them
+
+    Args:
+        dirname (str):
+    """
+    for name in NAMESPACES:
+        with open(f'{dirname}/{name.lower()}.json', 'w') as f:
+            json.dump(ACCOUNT, f)
+    CookieManager.ACCOUNT_PATH = f'{dirname}/{{name}}.json'
+
+
+# ====================== Synthetic content ===========================
+def make_paragraphs(rng, size, chars=CHARS):
+    """
+
+    Args:
+        rng (random.Random):
+        size (int): approximate number of characters
+        chars (str, optional):
+
+    Returns:
+        list[str]
+    """
+    paragraphs = []
+    n = 0
+    while n < size:
+        length = rng.randint(40, 160)
+        words = [''.join(rng.choices(chars, k=rng.randint(4, 16))) for _ in range(length // 10)]
+        paragraph = ''.join(w + rng.choice(PUNCTUATION) for w in words)
+        paragraphs.append(paragraph)
+        n += len(paragraph)
+    return paragraphs
+
+
+def make_title(rng, i):
+    return f"第{i + 1}章 {''.join(rng.choices(CHARS, k=rng.randint(2, 8)))}"
+
+
+def html_page(body, charset='utf-8'):
+    return f'<!DOCTYPE html><html><head><meta charset="{charset}"><title>benchmark</title></head>' \
+           f'<body>{body}</body></html>'
+
+
+def html_paragraphs(paragraphs):
+    return ''.join(f'<p>{p}</p>' for p in paragraphs)
+
+
+# ====================== Builders ===========================
+BUILDERS = {}
+"""Namespace -> ``builder(n_chapters, chapter_size, rng)``, which returns a ``Fixture``"""
+
+
+def builder(namespace):
+    def decorator(func):
+        BUILDERS[namespace] = func
+        return func
+
+    return decorator
+
+
+@builder('JJWXC')
+def build_jjwxc(n_chapters, chapter_size, rng):
+    """The first half of the chapters are free on the Web, the rest are VIP ones encrypted in the APP API"""
+    novel_id = 1000001
+    n_free = n_chapters // 2
+    fixture = Fixture('JJWXC', JjwxcApi.CatalogueRequest(novel_id), JjwxcApi.ChapterRequest(True, novel_id, 1, False),
+                      n_chapters=n_chapters)
+    titles = [make_title(rng, i) for i in range(n_chapters)]
+    fixture.add('GET', JjwxcApi.CATALOGUE_APP_API.format(req=fixture.catalogue), content_type='json',
+                kind='catalogue', body={'chapterlist': [
+                    dict(novelid=str(novel_id), chapterid=str(i + 1), isvip=int(i >= n_free), chaptername=title,
+                         chaptertype='0') for i, title in enumerate(titles)]})
+    for i, title in enumerate(titles):
+        chapter_id = i + 1
+        paragraphs = make_paragraphs(rng, chapter_size)
+        if i < n_free:
+            next_page = 'onebook.php' if i + 1 < n_free else 'onebook_vip.php'
+            next_href = f'{next_page}?novelid={novel_id}&chapterid={chapter_id + 1}'
+            body = html_page(
+                f'<div class="noveltitle"><a href="#">{title}</a></div>'
+                f'<div class="novelbody"><div><div><h2>{title}</h2></div>{"<br>".join(paragraphs)}'
+                f'<div>作者有话要说</div></div></div>'
+                f'<div class="noveltitle"><a href="{next_href}">下一章</a></div>', 'gb18030')
+            fixture.add('GET', JjwxcApi.CHAPTER_WEB_API.format(req=JjwxcApi.ChapterRequest(True, novel_id, chapter_id,
+                                                                                             False)),
+                        body, charset='gbk')
+            continue
+        des = DES.new(KEY_HARDCODE.encode(), DES.MODE_CBC, IV_HARDCODE.encode())
+        content = base64.b64encode(des.encrypt(pad('\n'.join(paragraphs).encode('utf-8'), DES.block_size)))
+        fixture.add('GET', JjwxcApi.CHAPTER_APP_API, content_type='json',
+                    params=dict(novelId=novel_id, chapterId=chapter_id),
+                    body=dict(chapterName=title, content=content.decode('ascii'), encryptField=['content']))
+    fixture.add('GET', JjwxcApi.CHAPTER_APP_API, content_type='json',
+                params=dict(novelId=novel_id, chapterId=n_chapters + 1), body=dict(message='章节不存在'))
+    return fixture
+
+
+@builder('FQNOVEL')
+def build_fqnovel(n_chapters, chapter_size, rng):
+    """The content is obfuscated with ``TextEncoder`` in both the APP and the Web API"""
+    book_id = 7000000000000000001
+    item_ids = [7100000000000000001 + i * 7 for i in range(n_chapters)]
+    fixture = Fixture('FQNOVEL', FqNovelApi.CatalogueRequest(book_id), FqNovelApi.ChapterRequest(True, item_ids[0]),
+                      n_chapters=n_chapters)
+    fixture.add('GET', FqNovelApi.CATALOGUE_APP_API, content_type='json', kind='catalogue',
+                params=dict(book_id=book_id), body={'code': 0, 'data': {
+                    'item_list': list(map(str, item_ids)),
+                    'book_info': dict(book_name='benchmark', author='benchmark', abstract='',
+                                      category_v2_ids='1, 2')}})
+    encoded = {c: chr(TextEncoder.CODE_START + i) for i, c in reversed(list(enumerate(TextEncoder.CHARSET)))
+               if c != '?'}
+    chars = ''.join(sorted(set(TextEncoder.CHARSET) - {'?'}))
+    for i, item_id in enumerate(item_ids):
+        paragraphs = [''.join(encoded.get(c, c) for c in p) for p in make_paragraphs(rng, chapter_size, chars)]
+        content = html_paragraphs(paragraphs)
+        fixture.add('GET', FqNovelApi.CHAPTER_APP_API, content, params=dict(item_id=item_id), content_type='text')
+        next_item = item_ids[i + 1] if i + 1 < n_chapters else 0
+        fixture.add('GET', FqNovelApi.CHAPTER_WEB_API, content_type='json', params=dict(itemId=item_id), body={
+            'code': 0, 'data': {'chapterData': dict(title=make_title(rng, i), content=content,
+                                                    nextItemId=str(next_item) if next_item else '')}})
+    return fixture
+
+
+@builder('QIMAO')
+def build_qimao(n_chapters, chapter_size, rng):
+    """The content is encrypted in AES"""
+    book_id = 1800001
+    fixture = Fixture('QIMAO', QimaoApi.CatalogueRequest(book_id), n_chapters=n_chapters)
+    chapter_ids = [1500000000 + i for i in range(n_chapters)]
+    fixture.add('GET', QimaoApi.CATALOGUE_APP_API, content_type='json', kind='catalogue', params=dict(id=book_id),
+                body={'data': {'chapter_lists': [dict(id=str(cid), title=make_title(rng, i))
+                                                 for i, cid in enumerate(chapter_ids)]}})
+    for chapter_id in chapter_ids:
+        iv = bytes(rng.getrandbits(8) for _ in range(16))
+        text = '\n'.join(make_paragraphs(rng, chapter_size)).encode('utf-8')
+        text += b' ' * (-len(text) % AES.block_size)
+        content = base64.b64encode(iv + AES.new(CONTENT_KEY, AES.MODE_CBC, iv).encrypt(text)).decode('ascii')
+        fixture.add('GET', QimaoApi.CHAPTER_APP_API, content_type='json', params=dict(chapterId=chapter_id, id=book_id),
+                    body={'data': {'content': content}})
+    return fixture
+
+
+@builder('LOFTER')
+def build_lofter(n_chapters, chapter_size, rng):
+    """A collection of posts, requested with POST forms"""
+    collection_id, blog_id = 30000001, 500001
+    post_ids = [10000000000 + i * 3 for i in range(n_chapters)]
+    fixture = Fixture('LOFTER', LofterApi.AppApiCollectionCatalogue(collection_id), n_chapters=n_chapters)
+    items = [{'post': dict(blogId=blog_id, id=pid, title=make_title(rng, i))} for i, pid in enumerate(post_ids)]
+    for limit in sorted({1, n_chapters}):
+        fixture.add('POST', LofterApi.COLLECTION_API, content_type='json', kind='catalogue',
+                    params=dict(collectionid=collection_id, limit=limit), body={'meta': {'msg': ''}, 'response': {
+                        'collection': {'postCount': n_chapters}, 'items': items[:limit]}})
+    for item in items:
+        post = item['post']
+        content = html_paragraphs(make_paragraphs(rng, chapter_size))
+        fixture.add('POST', LofterApi.POST_API, content_type='json',
+                    params=dict(postid=post['id'], targetblogid=blog_id), body={'meta': {'msg': ''}, 'response': {
+                        'posts': [{'post': dict(title=post['title'], content=content)}]}})
+    return fixture
+
+
+@builder('PO18')
+def build_po18(n_chapters, chapter_size, rng, page_size=100):
+    """The catalogue is paginated, and only says whether there is a next page"""
+    book_id = 700001
+    fixture = Fixture('PO18', Po18Api.CatalogueRequest(book_id), n_chapters=n_chapters)
+    reqs = [Po18Api.ChapterRequest(True, book_id, 1200001 + i, make_title(rng, i)) for i in range(n_chapters)]
+    n_pages = max(1, (n_chapters + page_size - 1) // page_size)
+    for pid in range(1, n_pages + 1):
+        items = ''.join(
+            f'<div class="c_l"><div class="l_chaptname">{req.title}</div>'
+            f'<div class="l_btn"><a href="/books/{book_id}/articles/{req.chapter_id}">閱讀</a></div></div>'
+            for req in reqs[(pid - 1) * page_size:pid * page_size])
+        pager = f'<div id="w1"><a href="?page={pid + 1}">&gt;</a></div>' if pid < n_pages else '<div id="w1"></div>'
+        fixture.add('GET', Po18Api.CATALOGUE_API.format(req=fixture.catalogue), html_page(items + pager),
+                    params=dict(page=pid), kind='catalogue')
+    for req in reqs:
+        body = f'<h1>{req.title}</h1>' + html_paragraphs(make_paragraphs(rng, chapter_size))
+        fixture.add('GET', Po18Api.CONTENT_API.format(req=req), body)
+    return fixture
+
+
+@builder('LONGMA')
+def build_longma(n_chapters, chapter_size, rng, page_size=50):
+    """Each chapter takes two requests: the page for the hash, then the content with the hash"""
+    book_id = 900001
+    chapter_ids = [3000001 + i for i in range(n_chapters)]
+    fixture = Fixture('LONGMA', LongmaApi.CatalogueRequest(book_id), LongmaApi.ChapterRequest(True, chapter_ids[0]),
+                      n_chapters=n_chapters)
+    titles = [make_title(rng, i) for i in range(n_chapters)]
+    n_pages = max(1, (n_chapters + page_size - 1) // page_size)
+    # the page after the last one is empty
+    for pid in range(1, n_pages + 2):
+        items = ''.join(f'<li><a href="/?act=showpaper&paperid={cid}">{title}</a></li>'
+                        for cid, title in list(zip(chapter_ids, titles))[(pid - 1) * page_size:pid * page_size])
+        fixture.add('POST', LongmaApi.CATALOGUE_API, html_page(f'<ul>{items}</ul>'), kind='catalogue',
+                    params=dict(ebookid=book_id, pages=pid))
+    for i, (cid, title) in enumerate(zip(chapter_ids, titles)):
+        vercode = f'{rng.getrandbits(64):016x}'
+        nav = '<a href="/" uk-icon="home"></a>'
+        if i + 1 < n_chapters:
+            nav += f'<a href="/?act=showpaper&paperid={chapter_ids[i + 1]}" uk-icon="chevron-right"></a>'
+        page = html_page(f'<h3 class="uk-card-title">{title}</h3><div id="paperbox"></div>'
+                         f"<script>$.post('showpapercolor.php', {{paperid: {cid}, vercodechk: '{vercode}'}})</script>"
+                         f'<div id="bottomNav">{nav}</div>')
+        fixture.add('GET', LongmaApi.CHAPTER_API.format(req=LongmaApi.ChapterRequest(True, cid)), page)
+        fixture.add('POST', LongmaApi.CONTENT_API, html_paragraphs(make_paragraphs(rng, chapter_size)),
+                    params=dict(paperid=cid, vercodechk=vercode), charset='utf-8-sig')
+    return fixture
+
+
+@builder('MY-RICS')
+def build_myrics(n_chapters, chapter_size, rng, page_size=50):
+    """The catalogue is paginated with a known total, requested with POST JSON"""
+    book_id = 20001
+    chapter_ids = [400001 + i for i in range(n_chapters)]
+    fixture = Fixture('MY-RICS', MyRicsApi.CatalogueRequest(book_id), MyRicsApi.ChapterRequest(True, chapter_ids[0]),
+                      n_chapters=n_chapters)
+    titles = [make_title(rng, i) for i in range(n_chapters)]
+    n_pages = max(1, (n_chapters + page_size - 1) // page_size)
+    for pid in range(1, n_pages + 1):
+        items = [dict(id=cid, title=title)
+                 for cid, title in list(zip(chapter_ids, titles))[(pid - 1) * page_size:pid * page_size]]
+        fixture.add('POST', MyRicsApi.CATALOGUE_API, content_type='json', charset='ascii', kind='catalogue',
+                    params=dict(id=book_id, page=pid), body={'data': {'total_page': n_pages, 'list': items}})
+    for i, (cid, title) in enumerate(zip(chapter_ids, titles)):
+        nav = f'<a href="#" @click.prevent="check({chapter_ids[i + 1]})">下一章</a>' if i + 1 < n_chapters else ''
+        body = html_page(f'<h1>{i + 1}. {title}</h1><div class="wysiwyg">'
+                         f'{html_paragraphs(make_paragraphs(rng, chapter_size))}</div>{nav}')
+        fixture.add('GET', MyRicsApi.CHAPTER_WEB_API.format(req=MyRicsApi.ChapterRequest(True, cid)), body)
+    return fixture
+
+
+NAMESPACES = list(BUILDERS)
+
+
+def build(namespace, n_chapters=100, chapter_size=3000, seed=0):
+    """Synthesize the fixture of a namespace
+
+    Args:
+        namespace (str): a key of ``BUILDERS``
+        n_chapters (int, optional):
+        chapter_size (int, optional): approximate number of characters of a chapter
+        seed (int, optional):
+
+    Returns:
+        Fixture
+    """
+    return BUILDERS[namespace](n_chapters, chapter_size, random.Random(seed))
+
+
+# ====================== Recording ===========================
+class RecordingSessionPool(SessionPool):
+    """Keep the responses of all sync requests as a ``Fixture``"""
+
+    def __init__(self, fixture, kind='catalogue', **kwargs):
+        super().__init__(**kwargs)
+        self.fixture = fixture
+        self.kind = kind
+
+    def request(self, method, url, **kwargs):
+        res = super().request(method, url, **kwargs)
+        params = dict(parse_qsl(urlsplit(res.url).query))
+        for key in ('params', 'data', 'json'):
+            if isinstance(kwargs.get(key), dict):
+                params.update({k: v for k, v in kwargs[key].items() if v is not None})
+        params = {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+        headers = {k: v for k, v in res.headers.items() if k.lower() in ('content-type', 'accesskey', 'keystring')}
+        url = urlsplit(url)._replace(query='').geturl()
+        self.fixture.add(method, url, res.content, params=params, kind=self.kind, status=res.status_code,
+                         content_type=headers.pop('Content-Type', 'application/octet-stream'), headers=headers)
+        return res
+
+
+def record(namespace, catalogue, n_chapters=20, api_kwargs=None):
+    """Record the catalogue and the first chapters of a live book, with the sync API
+
+    Args:
+        namespace (str):
+        catalogue (CatalogueRequest):
+        n_chapters (int, optional):
+        api_kwargs (dict, optional): arguments to create the API
+
+    Returns:
+        Fixture
+    """
+    api = RequestApi[namespace](**(api_kwargs or {}))
+    fixture = Fixture(namespace, catalogue)
+    pool = RecordingSessionPool(fixture)
+    old, RequestsTool.sessions = RequestsTool.sessions, pool
+    try:
+        reqs = api.get_chapter_list(catalogue)[:n_chapters]
+        pool.kind = 'chapter'
+        for i, req in enumerate(reqs):
+            _, next = api.get_chapter(req)
+            if i == 0 and next is not None:
+                fixture.first = req
+    finally:
+        RequestsTool.sessions = old
+        pool.close()
+    fixture.n_chapters = len(reqs)
+    return fixture
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='synthesize a fixture')
+    build_parser.add_argument('namespace', choices=NAMESPACES)
+    build_parser.add_argument('--chapter-size', type=int, default=3000)
+    build_parser.add_argument('--seed', type=int, default=0)
+    record_parser = commands.add_parser('record', help='record a fixture from the live site')
+    record_parser.add_argument('namespace', choices=NAMESPACES)
+    record_parser.add_argument('catalogue', help='fields of the CatalogueRequest of the API in JSON')
+    record_parser.add_argument('--type', default='CatalogueRequest', help='name of the CatalogueRequest class')
+    for p in (build_parser, record_parser):
+        p.add_argument('--chapters', type=int, default=20)
+        p.add_argument('--out', required=True)
+    args = parser.parse_args()
+    if args.command == 'build':
+        fixture = build(args.namespace, args.chapters, args.chapter_size, args.seed)
+    else:
+        catalogue = getattr(RequestApi[args.namespace], args.type)(**json.loads(args.catalogue))
+        fixture = record(args.namespace, catalogue, args.chapters)
+    fixture.save(args.out)
+    print(f"{fixture.namespace}: {fixture.n_chapters} chapters, {len(fixture.responses)} responses -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
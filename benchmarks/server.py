@@ -0,0 +1,230 @@
+"""
+Local stand-in of the novel sites, serving ``Fixture`` responses with configurable latency and injected errors.
+
+The server runs its own event loop in a background thread, so both the sync and the async requests can use it. The
+requests are redirected to it by rewriting ``https://host/path?query`` into ``http://127.0.0.1:port/host/path?query``,
+see ``LocalSessionPool`` for the sync ones and ``LocalSession`` for the async ones.
+"""
+import asyncio
+import logging
+import random
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from schomeless.utils import SessionPool
+
+__all__ = [
+    'StandInServer',
+    'LocalSessionPool',
+    'LocalSession',
+    'rewrite_url'
+]
+
+logger = logging.getLogger('StandInServer')
+
+
+def rewrite_url(url, base_url):
+    """
+
+    Args:
+        url (str): URL of the real site
+        base_url (str): URL of the stand-in server, e.g. ``http://127.0.0.1:8080``
+
+    Returns:
+        str
+    """
+    parsed = urlsplit(url)
+    path = f'{base_url}/{parsed.netloc}{parsed.path or "/"}'
+    return f'{path}?{parsed.query}' if parsed.query else path
+
+
+class StandInServer:
+    """Serve the responses of fixtures
+
+    A request is answered with the response of the same method, host and path whose parameters are all in the
+    request, preferring the one with the most parameters. Unmatched requests get 404.
+    """
+
+    def __init__(self, fixtures, *, latency=0., jitter=0., error_rate=0., error_status=503, retry_after=0, seed=0):
+        """
+
+        Args:
+            fixtures (list[Fixture]):
+            latency (float, optional): seconds before each response
+            jitter (float, optional): max random seconds added to ``latency``
+            error_rate (float, optional): probability of responding ``error_status`` to a chapter request
+            error_status (int, optional):
+            retry_after (int, optional): ``Retry-After`` header of the errors. No header if None.
+            seed (int, optional):
+        """
+        self.responses = defaultdict(list)
+        for fixture in fixtures:
+            for res in fixture.responses:
+                self.responses[res.key].append(res)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.n_requests = 0
+        self.n_errors = 0
+        self.misses = []
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.base_url = None
+
+    async def get_params(self, request):
+        params = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == 'application/json':
+                body = await request.json()
+                if isinstance(body, dict):
+                    params.update({k: str(v) for k, v in body.items()})
+            else:
+                params.update(await request.post())
+        return params
+
+    def match(self, method, host, path, params):
+        """
+
+        Returns:
+            Response: None if not matched
+        """
+        best, best_score = None, -1
+        for res in self.responses.get((method, host, path), []):
+            score = res.match(params)
+            if score > best_score:
+                best, best_score = res, score
+        return best
+
+    async def handle(self, request):
+        self.n_requests += 1
+        host = request.match_info['host']
+        path = '/' + request.match_info['path']
+        res = self.match(request.method, host, path, await self.get_params(request))
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if res is None:
+            self.misses.append(f'{request.method} {host}{path}?{request.query_string}')
+            return web.Response(status=404, text='No fixture')
+        if res.kind == 'chapter' and self.error_rate and self.rng.random() < self.error_rate:
+            self.n_errors += 1
+            headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else None
+            return web.Response(status=self.error_status, headers=headers, text='Injected error')
+        return web.Response(status=res.status, headers=res.headers, body=res.body)
+
+    async def start_async(self, host='127.0.0.1', port=0):
+        app = web.Application()
+        app.router.add_route('*', '/{host}/{path:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f'http://{host}:{port}'
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve in a background thread
+
+        Returns:
+            str: base URL of the server
+        """
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start_async(host, port))
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=serve, name='StandInServer', daemon=True)
+        self.thread.start()
+        started.wait()
+        logger.debug(f"Serving {sum(map(len, self.responses.values()))} responses at {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+    def stats(self):
+        return dict(requests=self.n_requests, errors=self.n_errors, misses=len(self.misses))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class LocalSessionPool(SessionPool):
+    """Sessions of the sync requests, redirected to the stand-in server"""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def request(self, method, url, **kwargs):
+        return super().request(method, rewrite_url(url, self.base_url), **kwargs)
+
+
+class LocalSession:
+    """Wrap an ``aiohttp.ClientSession`` to redirect its requests to the stand-in server"""
+
+    def __init__(self, session, base_url):
+        self.session = session
+        self.base_url = base_url
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, rewrite_url(url, self.base_url), **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self.session, item)
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.session.__aexit__(exc_type, exc_val, exc_tb)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from benchmarks.fixtures import Fixture
+
+    parser = argparse.ArgumentParser(description='Serve fixtures until interrupted')
+    parser.add_argument('fixtures', nargs='+', help='paths of the fixtures')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.)
+    args = parser.parse_args()
+    server = StandInServer([Fixture.load(p) for p in args.fixtures], latency=args.latency)
+    print(f"Serving at {server.start(port=args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os.path
 from dataclasses import dataclass
@@ -6,7 +7,7 @@ from typing import Optional
 from selenium import webdriver
 
 from schomeless.schema import ChapterRequest, CatalogueRequest, BookInfoRequest
-from schomeless.utils import Registerable, EnumExtension
+from schomeless.utils import Registerable, EnumExtension, SelectorTool
 
 __all__ = [
     'RequestApi',
@@ -22,6 +23,35 @@ BASE_DIR = os.path.dirname(__file__)
 
 
 class RequestApi(metaclass=Registerable):
+    SELECTORS = {}
+    """Name -> CSS selector used to parse the pages of the site, see ``select``"""
+
+    @classmethod
+    def select(cls, d, name):
+        """Same as ``d(selector)``, but the selector is compiled only once
+
+        Args:
+            d (PyQuery or lxml.etree.Element):
+            name (str): a key of ``SELECTORS``, or a CSS selector
+
+        Returns:
+            PyQuery
+        """
+        return SelectorTool.select(d, cls.SELECTORS.get(name, name))
+
+    @classmethod
+    def findall(cls, d, name):
+        """Same as ``select``, but the plain ``lxml`` elements, see ``SelectorTool.findall``
+
+        Args:
+            d (PyQuery or lxml.etree.Element):
+            name (str): a key of ``SELECTORS``, or a CSS selector
+
+        Returns:
+            list[lxml.etree.Element]
+        """
+        return SelectorTool.findall(d, cls.SELECTORS.get(name, name))
+
     def get_chapter(self, chapter_request):
         """Get one page
 
@@ -45,6 +75,48 @@ class RequestApi(metaclass=Registerable):
         """
         raise NotImplementedError("`get_chapter_async`")
 
+    async def fetch_chapter_async(self, session, chapter_request):
+        """Only the network part of ``get_chapter_async``. Optional, see ``has_parse_stage``.
+
+        Args:
+            session (aiohttp.ClientSession):
+            chapter_request (ChapterRequest):
+
+        Returns:
+            Any picklable raw response, e.g. ``RawResponse``, passed to ``parse_chapter``.
+        """
+        raise NotImplementedError("`fetch_chapter_async`")
+
+    def parse_chapter(self, chapter_request, raw):
+        """Only the CPU part of ``get_chapter_async``, i.e. decoding, parsing and decrypting. \
+        It may run in another process, so it should not depend on the state of the API, e.g. a static method.
+
+        Args:
+            chapter_request (ChapterRequest):
+            raw: the result of ``fetch_chapter_async``
+
+        Returns:
+            2-tuple: ``(Chapter, ChapterRequest=None)``. If ``ChapterRequest`` is None, no next chapter.
+        """
+        raise NotImplementedError("`parse_chapter`")
+
+    @classmethod
+    def has_parse_stage(cls):
+        """Whether ``get_chapter_async`` is split into ``fetch_chapter_async`` and ``parse_chapter``"""
+        return cls.fetch_chapter_async is not RequestApi.fetch_chapter_async
+
+    def predict_next(self, chapter_request):
+        """Guess the next chapter before ``chapter_request`` is requested, so that it can be prefetched.
+        A wrong guess only costs a wasted request, since it's checked against the actual next one.
+
+        Args:
+            chapter_request (ChapterRequest):
+
+        Returns:
+            ChapterRequest: None if unpredictable
+        """
+        return None
+
     def get_chapter_list(self, catalogue_request):
         """
 
@@ -56,6 +128,19 @@ class RequestApi(metaclass=Registerable):
         """
         raise NotImplementedError("`get_chapter_list`")
 
+    async def get_chapter_list_async(self, session, catalogue_request):
+        """Run ``get_chapter_list`` in a thread by default, so that the event loop is not blocked
+
+        Args:
+            session (aiohttp.ClientSession):
+            catalogue_request (CatalogueRequest):
+
+        Returns:
+            list[ChapterRequest]
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_chapter_list, catalogue_request)
+
     def get_book_info(self, book_info_request):
         """
 
@@ -67,6 +152,19 @@ class RequestApi(metaclass=Registerable):
         """
         raise NotImplementedError("`get_book_info`")
 
+    async def get_book_info_async(self, session, book_info_request):
+        """Run ``get_book_info`` in a thread by default, so that the event loop is not blocked
+
+        Args:
+            session (aiohttp.ClientSession):
+            book_info_request (BookInfoRequest):
+
+        Returns:
+            Book
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_book_info, book_info_request)
+
 
 @dataclass
 class UrlChapterRequest(ChapterRequest):
@@ -1,6 +1,9 @@
+import asyncio
 import logging
 import os.path
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Optional
 
@@ -12,7 +15,7 @@ from selenium.webdriver.support.wait import WebDriverWait
 
 from schomeless.api.base import RequestApi, UrlCatalogueRequest, UrlChapterRequest, CookieManager, UrlBookInfoRequest
 from schomeless.schema import Chapter, ChapterRequest, CatalogueRequest, BookInfoRequest, Book
-from schomeless.utils import RequestsTool
+from schomeless.utils import RequestsTool, RequestCoalescer
 
 __all__ = [
     'FqNovelApi',
@@ -290,6 +293,15 @@ class TextEncoder:
         '四', '数', '期', '中', 'C', '外', '样', 'a', '海', '们', '任'
     ]
 
+    TABLE = None
+    """Translation table of ``str.translate``, the same as mapping ``_interpret`` over the characters"""
+
+    @classmethod
+    def get_table(cls):
+        if cls.TABLE is None:
+            cls.TABLE = str.maketrans({cls.CODE_START + i: c for i, c in enumerate(cls.CHARSET) if c != '?'})
+        return cls.TABLE
+
     @classmethod
     def _interpret(cls, char):
         code = ord(char)
@@ -301,7 +313,7 @@ class TextEncoder:
     @classmethod
     def decrypt(cls, text):
         try:
-            return "".join(map(cls._interpret, text))
+            return text.translate(cls.get_table())
         except Exception as e:
             logger.warning(traceback.format_exc())
 
@@ -355,6 +367,13 @@ class FqNovelApi(RequestApi):
     CHAPTER_APP_API = f"https://fqnovel.pages.dev/content"
     SEARCH_APP_API = 'http://novel.snssdk.com/api/novel/channel/homepage/search/search/v1/'
     ENCODING = 'utf-8'
+    SELECTORS = {
+        'catalogue_item': 'div.chapter-item a.chapter-item-title'
+    }
+    APP_WORKERS = 4
+    executor = None
+    """Thread pool of the APP requests of the sync ``get_chapter``, shared by all the instances, see ``get_executor``"""
+    executor_lock = threading.Lock()
 
     @dataclass
     class ChapterRequest(ChapterRequest):
@@ -388,14 +407,41 @@ class FqNovelApi(RequestApi):
     class BookInfoRequest(BookInfoRequest):
         book_id: int
 
-    def __init__(self, web_service_port=9999):
+    def __init__(self, web_service_port=9999, skip_web=False):
+        """
+
+        Args:
+            web_service_port (int, optional):
+            skip_web (bool, optional): only request the APP API for chapters whose title is known from the \
+                                       catalogue. Then no next chapter is returned, so don't use it for \
+                                       iterative requests.
+        """
         super().__init__()
         self.port = web_service_port
+        self.skip_web = skip_web
         self.cookies = CookieManager.get_cookie(namespace.lower())
         self.headers = {
             "user-agent": "Mozilla/5.0 (Danger hiptop 3.4; U; AvantGo 3.2)",
             'cookie': self.cookies
         }
+        self.coalescer = RequestCoalescer()
+
+    @classmethod
+    def get_executor(cls):
+        with cls.executor_lock:
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(max_workers=cls.APP_WORKERS, thread_name_prefix=namespace)
+            return cls.executor
+
+    @classmethod
+    def shutdown_executor(cls):
+        """Stop the threads of the shared pool, e.g. when the downloads are done. A later call of ``get_chapter``
+        starts a new pool.
+        """
+        with cls.executor_lock:
+            executor, cls.executor = cls.executor, None
+        if executor is not None:
+            executor.shutdown()
 
     # ====================== Get chapter ===========================
     @staticmethod
@@ -480,15 +526,24 @@ class FqNovelApi(RequestApi):
         """
         if isinstance(req, UrlChapterRequest):
             req = FqNovelApi._parse_from_url_request(req)
-        try:
+        if self._is_app_only(req):
             chap_app, next_app = self.get_chapter_app(req)
+            assert chap_app is not None, f"Failed to get chapter {req.item_id} from APP API"
+            return chap_app, next_app
+        # the APP and WEB APIs are independent, request them at the same time
+        app_future = FqNovelApi.get_executor().submit(self.get_chapter_app, req)
+        chap_web, next_web = self.get_chapter_web(req)
+        try:
+            chap_app, next_app = app_future.result()
         except Exception as e:
             chap_app, next_app = None, None
-        chap_web, next_web = self.get_chapter_web(req)
         if chap_app is not None:
             chap_web.content = chap_app.content
         return chap_web, next_web
 
+    def _is_app_only(self, req):
+        return self.skip_web and req.title is not None
+
     async def get_chapter_web_async(self, session, req):
         item = await RequestsTool.request_and_json_async(
             session,
@@ -520,8 +575,65 @@ class FqNovelApi(RequestApi):
         """
         if isinstance(req, UrlChapterRequest):
             req = FqNovelApi._parse_from_url_request(req)
-        chap_app, next_app = await self.get_chapter_app_async(session, req)
-        chap_web, next_web = await self.get_chapter_web_async(session, req)
+        if self._is_app_only(req):
+            chap_app, next_app = await self.get_chapter_app_async(session, req)
+            assert chap_app is not None, f"Failed to get chapter {req.item_id} from APP API"
+            return chap_app, next_app
+        # the APP and WEB APIs are independent, request them at the same time
+        app, web = await asyncio.gather(
+            self.get_chapter_app_async(session, req),
+            self.get_chapter_web_async(session, req),
+            return_exceptions=True
+        )
+        for res in (app, web):
+            if isinstance(res, BaseException):
+                raise res
+        (chap_app, next_app), (chap_web, next_web) = app, web
+        chap_web.content = chap_app.content
+        return chap_web, next_web
+
+    async def fetch_chapter_async(self, session, req):
+        if isinstance(req, UrlChapterRequest):
+            req = FqNovelApi._parse_from_url_request(req)
+        app = RequestsTool.request_raw_async(
+            session,
+            FqNovelApi.CHAPTER_APP_API,
+            encoding=FqNovelApi.ENCODING,
+            request_kwargs=dict(headers=self.headers, params=self._preprocess_chapter_app(req))
+        )
+        if self._is_app_only(req):
+            return await app, None
+        web = RequestsTool.request_raw_async(
+            session,
+            FqNovelApi.CHAPTER_WEB_API,
+            encoding=FqNovelApi.ENCODING,
+            request_kwargs=dict(headers=self.headers, params=self._preprocess_chapter_web(req))
+        )
+        results = await asyncio.gather(app, web, return_exceptions=True)
+        for res in results:
+            if isinstance(res, BaseException):
+                raise res
+        return tuple(results)
+
+    @staticmethod
+    def parse_chapter(req, raw):
+        """
+
+        Args:
+            req (UrlChapterRequest, or FqNovelApi.ChapterRequest):
+            raw (tuple): ``(RawResponse, RawResponse)`` of the APP and WEB API. The WEB one is None if skipped.
+
+        Returns:
+            2-tuple: ``(Chapter, FqNovelApi.ChapterRequest=None)``
+        """
+        if isinstance(req, UrlChapterRequest):
+            req = FqNovelApi._parse_from_url_request(req)
+        app, web = raw
+        chap_app, next_app = FqNovelApi._parse_chapter_app(req, app.text(FqNovelApi.ENCODING))
+        if web is None:
+            assert chap_app is not None, f"Failed to get chapter {req.item_id} from APP API"
+            return chap_app, next_app
+        chap_web, next_web = FqNovelApi._parse_chapter_web(req, web.json(FqNovelApi.ENCODING))
         chap_web.content = chap_app.content
         return chap_web, next_web
 
@@ -532,7 +644,6 @@ class FqNovelApi(RequestApi):
             'book_id': req.book_id,
             'device_platform': 'android',
             'version_code': 600,
-            'novel_version': None,
             'app_name': 'news_article',
             'version_name': '6.0.0',
             'app_version': '6.0.0aid=520',
@@ -557,33 +668,72 @@ class FqNovelApi(RequestApi):
         except Exception as e:
             raise ValueError(f'Invalid FQNOVEL catalogue URL: `{req.url}`')
 
-    def get_chapter_list_web(self, req):
+    @staticmethod
+    def _parse_chapter_list_web(d):
         def get_item(item):
             url = 'https://fanqienovel.com' + item.attrib.get('href')
             spec = FqNovelApi._parse_from_url_request(UrlChapterRequest(True, url))
             spec.title = FqNovelApi._parse_title(item.text.strip())
             return spec
 
+        items = list(FqNovelApi.select(d, 'catalogue_item'))
+        return list(map(get_item, items))
+
+    def get_chapter_list_web(self, req):
         catalogue = FqNovelApi.CATALOGUE_WEB_API.format(req=req)
         d = RequestsTool.request_and_pyquery(catalogue, FqNovelApi.ENCODING,
                                              request_kwargs=dict(headers=self.headers))
-        items = list(d("div.chapter-item a.chapter-item-title"))
-        return list(map(get_item, items))
+        return FqNovelApi._parse_chapter_list_web(d)
 
-    def get_chapter_list_app(self, req):
-        params = FqNovelApi._get_chapter_list_params(req)
-        res = RequestsTool.request_and_json(
-            FqNovelApi.CATALOGUE_APP_API,
+    async def get_chapter_list_web_async(self, session, req):
+        catalogue = FqNovelApi.CATALOGUE_WEB_API.format(req=req)
+        d = await RequestsTool.request_and_pyquery_async(session, catalogue, FqNovelApi.ENCODING,
+                                                         request_kwargs=dict(headers=self.headers))
+        return FqNovelApi._parse_chapter_list_web(d)
+
+    def _catalogue_app_payload(self, req):
+        return dict(
+            url=FqNovelApi.CATALOGUE_APP_API,
             encoding=FqNovelApi.ENCODING,
-            request_kwargs=dict(headers=self.headers, params=params))
+            request_kwargs=dict(headers=self.headers, params=FqNovelApi._get_chapter_list_params(req))
+        )
+
+    def request_catalogue_app(self, req):
+        """The catalogue API responds both the book info and the chapter list. \
+        Concurrent calls for the same book share one request.
+
+        Args:
+            req (FqNovelApi.CatalogueRequest or FqNovelApi.BookInfoRequest):
+
+        Returns:
+            dict
+        """
+        res = self.coalescer.call(req.book_id, RequestsTool.request_and_json, **self._catalogue_app_payload(req))
+        if int(res.get('code', '-1')) != 0:
+            logger.warning("Failed to get book info.")
+        return res
+
+    async def request_catalogue_app_async(self, session, req):
+        res = await self.coalescer.call_async(req.book_id, RequestsTool.request_and_json_async, session,
+                                              **self._catalogue_app_payload(req))
         if int(res.get('code', '-1')) != 0:
             logger.warning("Failed to get book info.")
+        return res
+
+    @staticmethod
+    def _parse_chapter_list_app(res):
         items = res['data'].get('item_list', [])
         return [FqNovelApi.ChapterRequest(
             True,
             int(item)
         ) for item in items]
 
+    def get_chapter_list_app(self, req):
+        return FqNovelApi._parse_chapter_list_app(self.request_catalogue_app(req))
+
+    async def get_chapter_list_app_async(self, session, req):
+        return FqNovelApi._parse_chapter_list_app(await self.request_catalogue_app_async(session, req))
+
     def get_chapter_list(self, req):
         """
 
@@ -601,17 +751,50 @@ class FqNovelApi(RequestApi):
             chapters = self.get_chapter_list_web(req)
         return chapters
 
+    async def get_chapter_list_async(self, session, req):
+        if isinstance(req, UrlCatalogueRequest):
+            req = FqNovelApi._parse_from_url_catalogue_request(req)
+        try:
+            chapters = await self.get_chapter_list_app_async(session, req)
+        except Exception as e:
+            chapters = await self.get_chapter_list_web_async(session, req)
+        return chapters
+
     # ====================== Get Book Info ===========================
-    def get_book_info(self, req):
+    @staticmethod
+    def _parse_from_url_book_info_request(req):
         if isinstance(req, (UrlBookInfoRequest, UrlCatalogueRequest)):
             req = FqNovelApi.BookInfoRequest(FqNovelApi._parse_from_url_catalogue_request(req).book_id)
-        params = FqNovelApi._get_chapter_list_params(req)
-        res = RequestsTool.request_and_json(
-            FqNovelApi.CATALOGUE_APP_API,
-            encoding=FqNovelApi.ENCODING,
-            request_kwargs=dict(headers=self.headers, params=params))
-        if int(res.get('code', '-1')) != 0:
-            logger.warning("Failed to get book info.")
+        return req
+
+    def get_book_info(self, req):
+        req = FqNovelApi._parse_from_url_book_info_request(req)
+        return FqNovelApi._parse_book_info(self.request_catalogue_app(req))
+
+    async def get_book_info_async(self, session, req):
+        req = FqNovelApi._parse_from_url_book_info_request(req)
+        return FqNovelApi._parse_book_info(await self.request_catalogue_app_async(session, req))
+
+    def get_book_and_catalogue(self, req):
+        """Get the book info and the chapter list with one request
+
+        Args:
+            req (UrlCatalogueRequest, UrlBookInfoRequest, FqNovelApi.CatalogueRequest or FqNovelApi.BookInfoRequest):
+
+        Returns:
+            2-tuple: ``(Book, list[FqNovelApi.ChapterRequest])``
+        """
+        req = FqNovelApi._parse_from_url_book_info_request(req)
+        res = self.request_catalogue_app(req)
+        return FqNovelApi._parse_book_info(res), FqNovelApi._parse_chapter_list_app(res)
+
+    async def get_book_and_catalogue_async(self, session, req):
+        req = FqNovelApi._parse_from_url_book_info_request(req)
+        res = await self.request_catalogue_app_async(session, req)
+        return FqNovelApi._parse_book_info(res), FqNovelApi._parse_chapter_list_app(res)
+
+    @staticmethod
+    def _parse_book_info(res):
         info = res['data']['book_info']
         tag_ids = list(map(lambda x: int(x.strip()), info['category_v2_ids'].split(',')))
         tags = ", ".join([ID_TO_TAG[t] for t in tag_ids if t in ID_TO_TAG])
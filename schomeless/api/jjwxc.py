@@ -1,18 +1,15 @@
-import base64
 import json
 import logging
 import os.path
 from dataclasses import dataclass
 from typing import Optional
 
-from Crypto.Cipher import DES
-from Crypto.Util.Padding import unpad
 from selenium import webdriver
 from selenium.webdriver.support.wait import WebDriverWait
 
 from schomeless.api.base import RequestApi, UrlCatalogueRequest, UrlChapterRequest, CookieManager
 from schomeless.schema import Chapter, ChapterRequest, CatalogueRequest
-from schomeless.utils import RequestsTool, EncodingTool
+from schomeless.utils import RequestsTool, CryptoTool
 
 __all__ = [
     'JjwxcApi',
@@ -69,6 +66,13 @@ class JjwxcApi(RequestApi):
     CHAPTER_APP_API = "https://app.jjwxc.org/androidapi/chapterContent"
     WEB_ENCODING = 'gb18030'
     APP_ENCODING = 'ascii'
+    SELECTORS = {
+        'chapter_block': 'div.novelbody:first > div',
+        'chapter_title': 'h2',
+        'chapter_nav': '.noveltitle',
+        'vip_content': '#show',
+        'catalogue_item': 'tr[itemscope] span[itemprop=headline] div:first a[itemprop=url]'
+    }
     APP_VERSION = 379
 
     @dataclass
@@ -114,11 +118,8 @@ class JjwxcApi(RequestApi):
 
     @staticmethod
     def _decrypt(raw, key=KEY_HARDCODE, iv=IV_HARDCODE):
-        key = key.encode(INTERNAL_ENCODING)
-        iv = iv.encode(INTERNAL_ENCODING)
-        des = DES.new(key, DES.MODE_CBC, iv)
-        decrypted = des.decrypt(base64.b64decode(raw.encode(INTERNAL_ENCODING)))
-        return unpad(decrypted, DES.block_size).decode('utf-8')
+        decrypted = CryptoTool.des_cbc_decrypt(CryptoTool.b64decode(raw), key, iv)
+        return decrypted.decode('utf-8')
 
     @staticmethod
     def _parse_key_from_headers(content, headers):
@@ -149,8 +150,8 @@ class JjwxcApi(RequestApi):
             v38 = content[0:12]
             dest = content[12:len(content)]
 
-        key = EncodingTool.MD5(v43 + v38)[0:8]
-        iv = EncodingTool.MD5(v38)[0:8]
+        key = CryptoTool.md5_prefix(v43 + v38)
+        iv = CryptoTool.md5_prefix(v38)
         return key, iv, dest
 
     @staticmethod
@@ -160,13 +161,26 @@ class JjwxcApi(RequestApi):
             key, iv, content = JjwxcApi._parse_key_from_headers(text, headers)
         return JjwxcApi._decrypt(content, key, iv)
 
+    @staticmethod
+    def decrypt_contents(items, processes=None):
+        """Decrypt a batch of chapter responses
+
+        Args:
+            items (list[tuple]): ``(text, headers)`` of each response. ``headers`` is None for the hardcoded key.
+            processes (int, optional): if provided, decrypt in a pool of processes
+
+        Returns:
+            list[str]
+        """
+        return CryptoTool.map(JjwxcApi._decrypt_content, items, processes)
+
     @staticmethod
     def _parse_chapter_web(req, url, d):
-        block = d('div.novelbody:first > div')
-        title = block('h2').text()
-        next_url = d('.noveltitle').eq(1).find('a:last').attr('href')
+        block = JjwxcApi.select(d, 'chapter_block')
+        title = JjwxcApi.select(block, 'chapter_title').text()
+        next_url = JjwxcApi.select(d, 'chapter_nav').eq(1).find('a:last').attr('href')
         if req.is_vip:
-            content = block('#show').next().text().strip()
+            content = JjwxcApi.select(block, 'vip_content').next().text().strip()
             next_url = RequestsTool.get_host(url) + next_url
         else:
             block.remove('div')
@@ -271,6 +285,55 @@ class JjwxcApi(RequestApi):
                 pass
         return await self.get_chapter_web_async(session, req)
 
+    def predict_next(self, req):
+        """The next chapter ID with the same VIP flag, since the flag of the next chapter is unknown before it's
+        requested. So the first VIP chapter is a known miss, i.e. one wasted request per book.
+        """
+        if isinstance(req, UrlChapterRequest):
+            req = JjwxcApi._parse_from_url_request(req)
+        return JjwxcApi.ChapterRequest(True, req.novel_id, req.chapter_id + 1, req.is_vip)
+
+    async def fetch_chapter_async(self, session, req):
+        if isinstance(req, UrlChapterRequest):
+            req = JjwxcApi._parse_from_url_request(req)
+        if req.is_vip:
+            try:
+                params, headers = self._preprocess_chapter_app(req)
+                raw = await RequestsTool.request_raw_async(session, JjwxcApi.CHAPTER_APP_API,
+                                                           encoding=JjwxcApi.APP_ENCODING,
+                                                           request_kwargs=dict(headers=headers, params=params))
+                return 'app', raw
+            except Exception as e:
+                pass
+        url, headers = self._preprocess_chapter_web(req)
+        raw = await RequestsTool.request_raw_async(session, url, encoding=JjwxcApi.WEB_ENCODING,
+                                                   request_kwargs=dict(headers=headers))
+        return 'web', raw
+
+    @staticmethod
+    def parse_chapter(req, raw):
+        """
+
+        Args:
+            req (UrlChapterRequest, or JjwxcApi.ChapterRequest):
+            raw (tuple): ``(source, RawResponse)`` from ``fetch_chapter_async``, ``source`` is "app" or "web".
+
+        Returns:
+            2-tuple: ``(Chapter, JjwxcApi.ChapterRequest=None)``
+        """
+        if isinstance(req, UrlChapterRequest):
+            req = JjwxcApi._parse_from_url_request(req)
+        source, res = raw
+        if source == 'app':
+            try:
+                return JjwxcApi._parse_chapter_app(req, res.text(JjwxcApi.APP_ENCODING), res.headers)
+            except Exception as e:
+                # ``get_chapter_async`` falls back to the WEB API here, which refuses VIP chapters, so there is no
+                # WEB leg to request in advance
+                raise AssertionError(VIP_ERROR_WEB) from e
+        url = JjwxcApi.CHAPTER_WEB_API.format(req=req)
+        return JjwxcApi._parse_chapter_web(req, url, res.pyquery(JjwxcApi.WEB_ENCODING))
+
     # ====================== Get chapter list ===========================
     @staticmethod
     def _parse_from_url_catalogue_request(req):
@@ -287,25 +350,45 @@ class JjwxcApi(RequestApi):
         except Exception as e:
             raise ValueError(f'Invalid JJWXC catalogue URL: `{req.url}`')
 
-    def get_chapter_list_web(self, req):
+    @staticmethod
+    def _parse_chapter_list_web(res):
         def get_item(item):
             url = item.attrib.get('href', item.attrib.get('rel'))
             spec = JjwxcApi._parse_from_url_request(UrlChapterRequest(True, url, item.text.strip()))
             return spec
 
-        catalogue = JjwxcApi.CATALOGUE_WEB_API.format(req=req)
-        d = RequestsTool.request_and_pyquery(catalogue, JjwxcApi.WEB_ENCODING,
-                                             request_kwargs=dict(headers=self.headers))
-        items = list(d("tr[itemscope] span[itemprop=headline] div:first a[itemprop=url]"))
+        items = JjwxcApi.findall(res.tree(JjwxcApi.WEB_ENCODING), 'catalogue_item')
         return list(map(get_item, items))
 
+    def get_chapter_list_web(self, req):
+        catalogue = JjwxcApi.CATALOGUE_WEB_API.format(req=req)
+        res = RequestsTool.request_raw(catalogue, encoding=JjwxcApi.WEB_ENCODING,
+                                       request_kwargs=dict(headers=self.headers))
+        return JjwxcApi._parse_chapter_list_web(res)
+
+    async def get_chapter_list_web_async(self, session, req):
+        catalogue = JjwxcApi.CATALOGUE_WEB_API.format(req=req)
+        res = await RequestsTool.request_raw_async(session, catalogue, encoding=JjwxcApi.WEB_ENCODING,
+                                                   request_kwargs=dict(headers=self.headers))
+        return JjwxcApi._parse_chapter_list_web(res)
+
+    @staticmethod
+    def _parse_chapter_list_app(res):
+        items = res.get('chapterlist', [])
+        return [JjwxcApi.ChapterRequest(True, int(item['novelid']), int(item['chapterid']), bool(item['isvip']),
+                                        item['chaptername']) for item in items if item['chaptertype'] == '0']
+
     def get_chapter_list_app(self, req):
         catalogue = JjwxcApi.CATALOGUE_APP_API.format(req=req)
         res = RequestsTool.request_and_json(catalogue, encoding=JjwxcApi.APP_ENCODING,
                                             request_kwargs=dict(headers=self.headers))
-        items = res.get('chapterlist', [])
-        return [JjwxcApi.ChapterRequest(True, int(item['novelid']), int(item['chapterid']), bool(item['isvip']),
-                                        item['chaptername']) for item in items if item['chaptertype'] == '0']
+        return JjwxcApi._parse_chapter_list_app(res)
+
+    async def get_chapter_list_app_async(self, session, req):
+        catalogue = JjwxcApi.CATALOGUE_APP_API.format(req=req)
+        res = await RequestsTool.request_and_json_async(session, catalogue, encoding=JjwxcApi.APP_ENCODING,
+                                                        request_kwargs=dict(headers=self.headers))
+        return JjwxcApi._parse_chapter_list_app(res)
 
     def get_chapter_list(self, req):
         """
@@ -323,3 +406,12 @@ class JjwxcApi(RequestApi):
         except Exception as e:
             chapters = self.get_chapter_list_web(req)
         return chapters
+
+    async def get_chapter_list_async(self, session, req):
+        if isinstance(req, UrlCatalogueRequest):
+            req = JjwxcApi._parse_from_url_catalogue_request(req)
+        try:
+            chapters = await self.get_chapter_list_app_async(session, req)
+        except Exception as e:
+            chapters = await self.get_chapter_list_web_async(session, req)
+        return chapters
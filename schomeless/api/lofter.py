@@ -4,7 +4,6 @@ import shutil
 from dataclasses import dataclass
 from typing import Optional
 
-import requests
 from pyquery import PyQuery as pq
 
 from schomeless.api.base import RequestApi, UrlChapterRequest, UrlCatalogueRequest
@@ -109,15 +108,22 @@ class LofterApi(RequestApi):
         res = self.send_api_request(LofterApi.BLOG_API, payload)
         return int(res['blogsetting']['blogId'])
 
-    def get_blog_domain_name_from_id(self, blog_id):
-        payload = {
+    @staticmethod
+    def _blog_info_payload(blog_id):
+        return {
             'targetblogid': blog_id,
             'checkpwd': '1',
             'method': 'getBlogInfoDetail',
             'needgetpoststat': '0',
             'returnData': '1'
         }
-        res = self.send_api_request(LofterApi.BLOG_API, payload)
+
+    def get_blog_domain_name_from_id(self, blog_id):
+        res = self.send_api_request(LofterApi.BLOG_API, LofterApi._blog_info_payload(blog_id))
+        return res['blogLink']
+
+    async def get_blog_domain_name_from_id_async(self, session, blog_id):
+        res = await self.send_api_request_async(session, LofterApi.BLOG_API, LofterApi._blog_info_payload(blog_id))
         return res['blogLink']
 
     @staticmethod
@@ -181,11 +187,12 @@ class LofterApi(RequestApi):
                     img = imgs.eq(i)
                     url = img.attr('src')
                     filepath = temp_path.format(filename=f"{title}_img{i}{FileSysTool.File.parse(url).extension}")
-                    r = requests.get(url, stream=True)
-                    r.raise_for_status()
-                    with open(filepath, 'wb') as f:
-                        r.raw.decode_content = True
-                        shutil.copyfileobj(r.raw, f)
+                    with RequestsTool.sessions.session() as session:
+                        r = session.get(url, stream=True)
+                        r.raise_for_status()
+                        with open(filepath, 'wb') as f:
+                            r.raw.decode_content = True
+                            shutil.copyfileobj(r.raw, f)
                     out = ocr.ocr(filepath)
                     text = '<br>'.join([x['text'] for x in out])
                     img.replace_with(f"<p>{text}</p>")
@@ -234,43 +241,49 @@ class LofterApi(RequestApi):
         return LofterApi.AppApiBlogCatalogue(blog_domain=RequestsTool.get_domain_name(url))
 
     # ====================== Get chapter list ===========================
-    def get_collection(self, req):
-        """
-
-        Args:
-            req (LofterApi.AppApiCollectionCatalogue):
-
-        Returns:
-            list[ChapterRequest]
-        """
-        payload = {
+    @staticmethod
+    def _collection_payload(req, limit=1):
+        return {
             'collectionid': req.collection_id,
-            'limit': 1,
+            'limit': limit,
             'method': 'getCollectionDetail',
             'offset': 0,
             'order': 1,
         }
-        res = self.send_api_request(LofterApi.COLLECTION_API, payload)
-        total = res['collection']['postCount']
-        payload['limit'] = total
-        res = self.send_api_request(LofterApi.COLLECTION_API, payload)
+
+    @staticmethod
+    def _parse_collection(res):
         items = [item['post'] for item in res['items']]
         return [LofterApi.AppApiChapterRequest(True, obj['blogId'], obj['id'], obj['title']) for obj in items]
 
-    def get_blog(self, req):
+    def get_collection(self, req):
         """
 
         Args:
-            req (AppApiBlogCatalogue):
+            req (LofterApi.AppApiCollectionCatalogue):
 
         Returns:
             list[ChapterRequest]
         """
+        res = self.send_api_request(LofterApi.COLLECTION_API, LofterApi._collection_payload(req))
+        total = res['collection']['postCount']
+        res = self.send_api_request(LofterApi.COLLECTION_API, LofterApi._collection_payload(req, total))
+        return LofterApi._parse_collection(res)
+
+    async def get_collection_async(self, session, req):
+        res = await self.send_api_request_async(session, LofterApi.COLLECTION_API, LofterApi._collection_payload(req))
+        total = res['collection']['postCount']
+        res = await self.send_api_request_async(session, LofterApi.COLLECTION_API,
+                                                LofterApi._collection_payload(req, total))
+        return LofterApi._parse_collection(res)
+
+    @staticmethod
+    def _blog_payload(req, pid):
         limit = req.post_per_page
         payload = {
             'method': 'getPostLists',
             'limit': limit,
-            'offset': 0,
+            'offset': (pid - 1) * limit,
             'order': 0,
             'supportposttypes': '1,2,3,4,5,6',
         }
@@ -279,47 +292,81 @@ class LofterApi(RequestApi):
         if req.blog_domain is not None:
             payload['blogdomain'] = req.blog_domain
         assert 'targetblogid' in payload or 'blogdomain' in payload, "Either blog ID or blog domain name is required!"
-        chapters = []
-        while True:
-            res = self.send_api_request(LofterApi.BLOG_API, payload)
-            items = [item['post'] for item in res['posts']]
-            add = len(items)
-            chapters += [LofterApi.AppApiChapterRequest(True, obj['blogId'], obj['id'], obj['title']) for obj in items]
-            if add < limit:
-                break
-            payload['offset'] += add
-        return chapters
+        return payload
 
-    def get_search(self, req):
+    @staticmethod
+    def _parse_blog_page(res):
+        items = [item['post'] for item in res['posts']]
+        return [LofterApi.AppApiChapterRequest(True, obj['blogId'], obj['id'], obj['title']) for obj in items]
+
+    def get_blog(self, req):
         """
 
         Args:
-            req (AppApiSearchCatalogue):
+            req (AppApiBlogCatalogue):
 
         Returns:
             list[ChapterRequest]
         """
+        def get_page(pid):
+            res = self.send_api_request(LofterApi.BLOG_API, LofterApi._blog_payload(req, pid))
+            return LofterApi._parse_blog_page(res)
+
+        pages = RequestsTool.fetch_pages(get_page, is_last=lambda pages: len(pages[-1]) < req.post_per_page)
+        return [chap for chapters in pages for chap in chapters]
+
+    async def get_blog_async(self, session, req):
+        async def get_page(pid):
+            res = await self.send_api_request_async(session, LofterApi.BLOG_API, LofterApi._blog_payload(req, pid))
+            return LofterApi._parse_blog_page(res)
 
+        pages = await RequestsTool.fetch_pages_async(get_page,
+                                                     is_last=lambda pages: len(pages[-1]) < req.post_per_page)
+        return [chap for chapters in pages for chap in chapters]
+
+    @staticmethod
+    def _search_page_url(req, page_id):
+        return RequestsTool.quote(LofterApi.SEARCH_API.format(req=req, page_id=page_id))
+
+    @staticmethod
+    def _parse_search_page(d):
         def valid_url(url):
             if url:
                 key = f"{RequestsTool.get_domain_name(url)}/post"
                 return key in url
             return False
 
-        page_id = 1
+        urls = [(item.attrib.get('href', ''), item.text) for item in d('h2 a')]
+        return [UrlChapterRequest(True, url, txt) for url, txt in urls if valid_url(url)]
+
+    def get_search(self, req):
+        """
+
+        Args:
+            req (AppApiSearchCatalogue):
+
+        Returns:
+            list[ChapterRequest]
+        """
+        def get_page(page_id):
+            d = RequestsTool.request_and_pyquery(LofterApi._search_page_url(req, page_id))
+            return LofterApi._parse_search_page(d)
+
         if req.blog_domain is None:
             req.blog_domain = self.get_blog_domain_name_from_id(req.blog_id)
-        reqs = []
-        while True:
-            url = RequestsTool.quote(LofterApi.SEARCH_API.format(req=req, page_id=page_id))
-            d = RequestsTool.request_and_pyquery(url)
-            urls = [(item.attrib.get('href', ''), item.text) for item in d('h2 a')]
-            page_reqs = [UrlChapterRequest(True, url, txt) for url, txt in urls if valid_url(url)]
-            reqs += page_reqs
-            add = len(page_reqs)
-            if add == 0:
-                break
-            page_id += 1
+        pages = RequestsTool.fetch_pages(get_page, is_last=lambda pages: len(pages[-1]) == 0)
+        reqs = [page_req for page_reqs in pages for page_req in page_reqs]
+        return reqs[::-1]
+
+    async def get_search_async(self, session, req):
+        async def get_page(page_id):
+            d = await RequestsTool.request_and_pyquery_async(session, LofterApi._search_page_url(req, page_id))
+            return LofterApi._parse_search_page(d)
+
+        if req.blog_domain is None:
+            req.blog_domain = await self.get_blog_domain_name_from_id_async(session, req.blog_id)
+        pages = await RequestsTool.fetch_pages_async(get_page, is_last=lambda pages: len(pages[-1]) == 0)
+        reqs = [page_req for page_reqs in pages for page_req in page_reqs]
         return reqs[::-1]
 
     def get_chapter_list(self, catalogue):
@@ -348,3 +395,14 @@ class LofterApi(RequestApi):
         if isinstance(catalogue, LofterApi.AppApiSearchCatalogue):
             return self.get_search(catalogue)
         assert False, f"Unsupported Catalogue Request: {catalogue}"
+
+    async def get_chapter_list_async(self, session, catalogue):
+        if isinstance(catalogue, UrlCatalogueRequest):
+            catalogue = self._url_to_request(catalogue.url)
+        if isinstance(catalogue, LofterApi.AppApiBlogCatalogue):
+            return await self.get_blog_async(session, catalogue)
+        if isinstance(catalogue, LofterApi.AppApiCollectionCatalogue):
+            return await self.get_collection_async(session, catalogue)
+        if isinstance(catalogue, LofterApi.AppApiSearchCatalogue):
+            return await self.get_search_async(session, catalogue)
+        assert False, f"Unsupported Catalogue Request: {catalogue}"
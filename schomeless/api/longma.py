@@ -57,6 +57,11 @@ class LongmaApi(RequestApi):
     CHAPTER_API = "https://ebook.longmabook.com/?act=showpaper&paperid={req.chapter_id}"
     WEB_ENCODING = 'utf-8'
     CONTENT_ENCODING = 'UTF-8-SIG'
+    SELECTORS = {
+        'buy_button': '#paperbuybtm',
+        'chapter_title': 'h3.uk-card-title',
+        'chapter_nav': '#bottomNav a'
+    }
 
     @dataclass
     class BookInfoRequest(BookInfoRequest):
@@ -85,7 +90,7 @@ class LongmaApi(RequestApi):
 
     # ====================== Get Chapter ===========================
     def _parse_hash(self, req, page):
-        if len(page('#paperbuybtm')) > 0:
+        if len(LongmaApi.select(page, 'buy_button')) > 0:
             return None
         parts = page.html().split("vercodechk: '", maxsplit=1)
         if len(parts) > 1:
@@ -93,10 +98,10 @@ class LongmaApi(RequestApi):
         return ''
 
     def _postprocess_chapter(self, req, page, d):
-        title = page('h3.uk-card-title').text().strip().split('\n')[-1]
+        title = LongmaApi.select(page, 'chapter_title').text().strip().split('\n')[-1]
         content = d.text().strip()
-        hrefs = list(
-            item.attrib['href'] for item in page('#bottomNav a') if item.attrib.get('uk-icon', None) == 'chevron-right')
+        hrefs = list(item.attrib['href'] for item in LongmaApi.select(page, 'chapter_nav')
+                     if item.attrib.get('uk-icon', None) == 'chevron-right')
         next = None
         if len(hrefs) > 0:
             next = LongmaApi._url_to_chapter_req("http://a.com" + hrefs[0])
@@ -168,50 +173,77 @@ class LongmaApi(RequestApi):
         Returns:
             list[ChapterRequest]
         """
-        chapters = []
-        pid = 1
-        host = RequestsTool.get_host(LongmaApi.CATALOGUE_API)
-        while True:
-            params = {
-                'ebookid': req.book_id,
-                'pages': pid,
-                'showbooklisttype': 0
-            }
-            d = RequestsTool.request_and_pyquery(
-                LongmaApi.CATALOGUE_API,
-                LongmaApi.CONTENT_ENCODING,
-                request_kwargs=dict(headers=self.headers, data=params),
-                method='POST'
-            )
-            items = d('a')
-            n = len(items)
-            new_chapters = []
-            for i in range(n):
-                item = items.eq(i)
-                href = item.attr('href')
-                if not href or 'showpaper' not in href: continue
-                creq = LongmaApi._url_to_chapter_req(host + href)
-                creq.title = item.text().strip()
-                new_chapters.append(creq)
-            pid += 1
-            has_next = len(new_chapters) > 0 and (not chapters or new_chapters[-1] != chapters[-1])
-            if not has_next:
-                break
-            chapters += new_chapters
-        return chapters
+        pages = RequestsTool.fetch_pages(lambda pid: self.get_catalogue_page(req, pid),
+                                         is_last=LongmaApi._is_last_catalogue_page)
+        return [chap for new_chapters in pages[:-1] for chap in new_chapters]
 
-    # ====================== Get Book Info ==============================
-    def get_book_info(self, req):
+    async def get_chapter_list_async(self, session, req):
+        pages = await RequestsTool.fetch_pages_async(lambda pid: self.get_catalogue_page_async(session, req, pid),
+                                                     is_last=LongmaApi._is_last_catalogue_page)
+        return [chap for new_chapters in pages[:-1] for chap in new_chapters]
+
+    @staticmethod
+    def _is_last_catalogue_page(pages):
+        # a page after the last one is either empty or the same as the last one
+        return len(pages[-1]) == 0 or (len(pages) > 1 and pages[-1][-1] == pages[-2][-1])
+
+    def _catalogue_payload(self, req, pid=None):
         params = {
             'ebookid': req.book_id,
             'showbooklisttype': 0
         }
-        d = RequestsTool.request_and_pyquery(
-            LongmaApi.CATALOGUE_API,
-            LongmaApi.CONTENT_ENCODING,
+        if pid is not None:
+            params['pages'] = pid
+        return dict(
+            url=LongmaApi.CATALOGUE_API,
+            encoding=LongmaApi.CONTENT_ENCODING,
             request_kwargs=dict(headers=self.headers, data=params),
             method='POST'
         )
+
+    def get_catalogue_page(self, req, pid):
+        """
+
+        Args:
+            req (CatalogueRequest):
+            pid (int): page number, starts from 1
+
+        Returns:
+            list[ChapterRequest]
+        """
+        d = RequestsTool.request_and_pyquery(**self._catalogue_payload(req, pid))
+        return LongmaApi._parse_catalogue_page(d)
+
+    async def get_catalogue_page_async(self, session, req, pid):
+        d = await RequestsTool.request_and_pyquery_async(session, **self._catalogue_payload(req, pid))
+        return LongmaApi._parse_catalogue_page(d)
+
+    @staticmethod
+    def _parse_catalogue_page(d):
+        host = RequestsTool.get_host(LongmaApi.CATALOGUE_API)
+        items = d('a')
+        n = len(items)
+        new_chapters = []
+        for i in range(n):
+            item = items.eq(i)
+            href = item.attr('href')
+            if not href or 'showpaper' not in href: continue
+            creq = LongmaApi._url_to_chapter_req(host + href)
+            creq.title = item.text().strip()
+            new_chapters.append(creq)
+        return new_chapters
+
+    # ====================== Get Book Info ==============================
+    def get_book_info(self, req):
+        d = RequestsTool.request_and_pyquery(**self._catalogue_payload(req))
+        return LongmaApi._parse_book_info(req, d)
+
+    async def get_book_info_async(self, session, req):
+        d = await RequestsTool.request_and_pyquery_async(session, **self._catalogue_payload(req))
+        return LongmaApi._parse_book_info(req, d)
+
+    @staticmethod
+    def _parse_book_info(req, d):
         items = d('li')
         n = len(items)
         for i in range(n):
@@ -58,6 +58,10 @@ class MyRicsApi(RequestApi):
     CHAPTER_WEB_API = "https://www.my-rics.club/chapters/{req.chapter_id}"
     WEB_ENCODING = 'utf-8'
     API_ENCODING = 'ascii'
+    SELECTORS = {
+        'chapter_title': 'h1',
+        'chapter_content': 'div.wysiwyg:first'
+    }
 
     @dataclass
     class ChapterRequest(ChapterRequest):
@@ -94,9 +98,9 @@ class MyRicsApi(RequestApi):
     @staticmethod
     def _parse_chapter(req, text):
         d = PyQuery(text)
-        title = d('h1').text().split('.', maxsplit=1)[-1].strip()
+        title = MyRicsApi.select(d, 'chapter_title').text().split('.', maxsplit=1)[-1].strip()
         title = MyRicsApi._get_title(title)
-        content = d('div.wysiwyg:first').text()
+        content = MyRicsApi.select(d, 'chapter_content').text()
         next = None
         arrow = [f for f in text.split('@click.prevent="') if f.startswith('check') and '下一章' in f]
         if len(arrow) > 0:
@@ -142,6 +146,22 @@ class MyRicsApi(RequestApi):
         )
         return MyRicsApi._parse_chapter(req, text)
 
+    async def fetch_chapter_async(self, session, req):
+        if isinstance(req, UrlChapterRequest):
+            req = MyRicsApi._parse_from_url_request(req)
+        return await RequestsTool.request_raw_async(
+            session,
+            MyRicsApi.CHAPTER_WEB_API.format(req=req),
+            encoding=MyRicsApi.WEB_ENCODING,
+            request_kwargs=dict(headers=self.headers)
+        )
+
+    @staticmethod
+    def parse_chapter(req, raw):
+        if isinstance(req, UrlChapterRequest):
+            req = MyRicsApi._parse_from_url_request(req)
+        return MyRicsApi._parse_chapter(req, raw.text(MyRicsApi.WEB_ENCODING))
+
     # ====================== Get chapter list ===========================
     @staticmethod
     def _parse_from_url_catalogue_request(req):
@@ -158,31 +178,43 @@ class MyRicsApi(RequestApi):
         except Exception as e:
             raise ValueError(f'Invalid MY-RICS catalogue URL: `{req.url}`')
 
+    def _catalogue_page_payload(self, req, pid):
+        params = {
+            "id": req.book_id,
+            'page': pid,
+            'sort': 'asc'
+        }
+        return dict(
+            url=MyRicsApi.CATALOGUE_API,
+            encoding=MyRicsApi.API_ENCODING,
+            request_kwargs=dict(headers=self.headers, json=params),
+            method='POST'
+        )
+
+    def get_catalogue_page(self, req, pid):
+        return RequestsTool.request_and_json(**self._catalogue_page_payload(req, pid))
+
+    async def get_catalogue_page_async(self, session, req, pid):
+        return await RequestsTool.request_and_json_async(session, **self._catalogue_page_payload(req, pid))
+
+    @staticmethod
+    def _parse_catalogue_page(d):
+        return [MyRicsApi.ChapterRequest(True, int(item['id']), MyRicsApi._get_title(item['title']))
+                for item in d['data']['list']]
+
     def get_chapter_list_web(self, req):
-        pid = 1
-        total = None
-        res = []
-        while True:
-            params = {
-                "id": req.book_id,
-                'page': pid,
-                'sort': 'asc'
-            }
-            d = RequestsTool.request_and_json(
-                MyRicsApi.CATALOGUE_API,
-                MyRicsApi.API_ENCODING,
-                request_kwargs=dict(headers=self.headers, json=params),
-                method='POST'
-            )
-            if total is None:
-                total = d['data']['total_page']
-            items = d['data']['list']
-            res += [MyRicsApi.ChapterRequest(True, int(item['id']), MyRicsApi._get_title(item['title']))
-                    for item in items]
-            if pid == total:
-                break
-            pid += 1
-        return res
+        first = self.get_catalogue_page(req, 1)
+        total = first['data']['total_page']
+        # the total is known from the first page, request the rest at the same time
+        pages = [first] + RequestsTool.fetch_pages(lambda pid: self.get_catalogue_page(req, pid), start=2, total=total)
+        return [chap for d in pages for chap in MyRicsApi._parse_catalogue_page(d)]
+
+    async def get_chapter_list_web_async(self, session, req):
+        first = await self.get_catalogue_page_async(session, req, 1)
+        total = first['data']['total_page']
+        pages = [first] + await RequestsTool.fetch_pages_async(
+            lambda pid: self.get_catalogue_page_async(session, req, pid), start=2, total=total)
+        return [chap for d in pages for chap in MyRicsApi._parse_catalogue_page(d)]
 
     def get_chapter_list(self, req):
         """
@@ -197,3 +229,8 @@ class MyRicsApi(RequestApi):
             req = MyRicsApi._parse_from_url_catalogue_request(req)
         chapters = self.get_chapter_list_web(req)
         return chapters
+
+    async def get_chapter_list_async(self, session, req):
+        if isinstance(req, UrlCatalogueRequest):
+            req = MyRicsApi._parse_from_url_catalogue_request(req)
+        return await self.get_chapter_list_web_async(session, req)
@@ -61,6 +61,16 @@ class OtherApi(RequestApi):
         d = await RequestsTool.request_and_pyquery_async(session, req.url)
         return self.get_chapter_internal(req, d), self.get_next(req, d)
 
+    async def fetch_chapter_async(self, session, req):
+        return await RequestsTool.request_raw_async(session, req.url)
+
+    def parse_chapter(self, req, raw):
+        """Unlike the other APIs, not a static method, since it calls ``get_chapter_internal`` and ``get_next`` of the
+        subclass. So the ``parse_executor`` of an ``OtherApi`` must be a thread pool, which shares the API instance.
+        """
+        d = raw.pyquery()
+        return self.get_chapter_internal(req, d), self.get_next(req, d)
+
     def get_chapter_list_internal(self, req, d):
         """Get chapter requests
 
@@ -155,6 +155,14 @@ class Po18Api(RequestApi):
     CHAPTER_API = "https://www.po18.tw/books/{req.book_id}/articles/{req.chapter_id}"
     BOOK_INFO_API = "https://www.po18.tw/books/{req.book_id}"
     ENCODING = 'utf-8'
+    SELECTORS = {
+        'chapter_title': 'h1',
+        'chapter_paragraph': 'p',
+        'catalogue_item': 'div.c_l',
+        'catalogue_title': 'div.l_chaptname',
+        'catalogue_link': 'div.l_btn a',
+        'catalogue_pager': '#w1 a'
+    }
 
     @dataclass
     class BookInfoRequest(BookInfoRequest):
@@ -183,9 +191,11 @@ class Po18Api(RequestApi):
         return int(url.strip('/').split('/')[-1])
 
     # ====================== Get Chapter ===========================
-    def _postprocess_chapter(self, req, d):
-        title = d('h1').text().strip()
-        content = "\n".join([item.text.strip() for item in d('p') if item.text is not None])
+    @staticmethod
+    def _postprocess_chapter(req, d):
+        title = Po18Api.select(d, 'chapter_title').text().strip()
+        content = "\n".join(
+            [item.text.strip() for item in Po18Api.select(d, 'chapter_paragraph') if item.text is not None])
         if not title or not content:
             title = req.title
         return Chapter(title, content), None
@@ -215,6 +225,22 @@ class Po18Api(RequestApi):
         )
         return self._postprocess_chapter(req, d)
 
+    async def fetch_chapter_async(self, session, req):
+        headers = dict(**self.headers)
+        headers.update({
+            'referer': Po18Api.CHAPTER_API.format(req=req)
+        })
+        return await RequestsTool.request_raw_async(
+            session,
+            Po18Api.CONTENT_API.format(req=req),
+            encoding=Po18Api.ENCODING,
+            request_kwargs=dict(headers=headers)
+        )
+
+    @staticmethod
+    def parse_chapter(req, raw):
+        return Po18Api._postprocess_chapter(req, raw.pyquery(Po18Api.ENCODING))
+
     # ====================== Get Chapter List ===========================
     def get_chapter_list(self, req):
         """Get the chapter links
@@ -225,31 +251,71 @@ class Po18Api(RequestApi):
         Returns:
             list[ChapterRequest]
         """
+        pages = RequestsTool.fetch_pages(lambda pid: self.get_catalogue_page(req, pid),
+                                         is_last=Po18Api._is_last_catalogue_page,
+                                         get_total=Po18Api._get_catalogue_total)
+        return [chap for chapters, _, _ in pages for chap in chapters]
+
+    async def get_chapter_list_async(self, session, req):
+        pages = await RequestsTool.fetch_pages_async(lambda pid: self.get_catalogue_page_async(session, req, pid),
+                                                     is_last=Po18Api._is_last_catalogue_page,
+                                                     get_total=Po18Api._get_catalogue_total)
+        return [chap for chapters, _, _ in pages for chap in chapters]
+
+    @staticmethod
+    def _is_last_catalogue_page(pages):
+        return not pages[-1][1]
+
+    @staticmethod
+    def _get_catalogue_total(pages):
+        # the pager only shows the pages around the current one, so the last of them is all that is known to exist
+        return max(last for _, _, last in pages)
+
+    def _catalogue_page_payload(self, req, pid):
+        return dict(
+            url=Po18Api.CATALOGUE_API.format(req=req),
+            encoding=Po18Api.ENCODING,
+            request_kwargs=dict(headers=self.headers, params=dict(page=pid)),
+        )
+
+    def get_catalogue_page(self, req, pid):
+        """
+
+        Args:
+            req (CatalogueRequest):
+            pid (int): page number, starts from 1
+
+        Returns:
+            3-tuple: ``(list[ChapterRequest], bool, int)``, the chapters, whether there is a next page, and the last \
+                     page number linked by the pager
+        """
+        d = RequestsTool.request_and_pyquery(**self._catalogue_page_payload(req, pid))
+        return Po18Api._parse_catalogue_page(req, d)
+
+    async def get_catalogue_page_async(self, session, req, pid):
+        d = await RequestsTool.request_and_pyquery_async(session, **self._catalogue_page_payload(req, pid))
+        return Po18Api._parse_catalogue_page(req, d)
+
+    @staticmethod
+    def _parse_catalogue_page(req, d):
         chapters = []
-        pid = 1
-        while True:
-            d = RequestsTool.request_and_pyquery(
-                Po18Api.CATALOGUE_API.format(req=req),
-                Po18Api.ENCODING,
-                request_kwargs=dict(headers=self.headers, params=dict(page=pid)),
-            )
-            items = d('div.c_l')
-            n = len(items)
-            for i in range(n):
-                item = items.eq(i)
-                title = item('div.l_chaptname').text().strip()
-                link = item('div.l_btn a')
-                href = link.attr('href')
-                if href.startswith('javascript'):
-                    chapter_id = int(link.attr('name').strip().split('pop_order', maxsplit=1)[-1])
-                else:
-                    chapter_id = Po18Api._parse_last_id(href)
-                chapters.append(Po18Api.ChapterRequest(True, req.book_id, chapter_id, title))
-            pid += 1
-            has_next = any(item.text.strip() == '>' for item in d('#w1 a'))
-            if not has_next:
-                break
-        return chapters
+        items = Po18Api.select(d, 'catalogue_item')
+        n = len(items)
+        for i in range(n):
+            item = items.eq(i)
+            title = Po18Api.select(item, 'catalogue_title').text().strip()
+            link = Po18Api.select(item, 'catalogue_link')
+            href = link.attr('href')
+            if href.startswith('javascript'):
+                chapter_id = int(link.attr('name').strip().split('pop_order', maxsplit=1)[-1])
+            else:
+                chapter_id = Po18Api._parse_last_id(href)
+            chapters.append(Po18Api.ChapterRequest(True, req.book_id, chapter_id, title))
+        pager = Po18Api.select(d, 'catalogue_pager')
+        has_next = any(item.text.strip() == '>' for item in pager)
+        linked = [RequestsTool.parse_query(item.attrib.get('href', '')).get('page', '') for item in pager]
+        last = max([int(pid) for pid in linked if pid.isdigit()], default=0)
+        return chapters, has_next, last
 
     # ====================== Get Book Info ==============================
     def get_book_info(self, req):
@@ -257,6 +323,18 @@ class Po18Api(RequestApi):
             Po18Api.BOOK_INFO_API.format(req=req),
             request_kwargs=dict(headers=self.headers)
         )
+        return Po18Api._parse_book_info(d)
+
+    async def get_book_info_async(self, session, req):
+        d = await RequestsTool.request_and_pyquery_async(
+            session,
+            Po18Api.BOOK_INFO_API.format(req=req),
+            request_kwargs=dict(headers=self.headers)
+        )
+        return Po18Api._parse_book_info(d)
+
+    @staticmethod
+    def _parse_book_info(d):
         name = d('h1.book_name').text().strip()
         author = d('a.book_author').text().strip()
         preface = d('div.B_I_content').text().strip()
@@ -1,14 +1,11 @@
-import base64
 import logging
 import os.path
 from dataclasses import dataclass
 from typing import Optional
 
-from Crypto.Cipher import AES
-
 from schomeless.api.base import RequestApi, UrlCatalogueRequest, UrlChapterRequest, CookieManager, UrlBookInfoRequest
 from schomeless.schema import Chapter, ChapterRequest, CatalogueRequest, BookInfoRequest, Book
-from schomeless.utils import RequestsTool, EncodingTool
+from schomeless.utils import RequestsTool, EncodingTool, CryptoTool
 
 __all__ = [
     'QimaoApi',
@@ -19,6 +16,7 @@ logger = logging.getLogger('API')
 namespace = 'QIMAO'
 
 INTERNAL_ENCODING = 'utf-8'
+CONTENT_KEY = bytes.fromhex('32343263636238323330643730396531')
 
 
 @RequestApi.register(namespace)
@@ -81,13 +79,33 @@ class QimaoApi(RequestApi):
 
     @staticmethod
     def _decrypt(content):
-        data, iv = content[32:], content[:32]
-        key = EncodingTool.from_hex('32343263636238323330643730396531')
-        iv = EncodingTool.from_hex(iv)
-        aes = AES.new(key, AES.MODE_CBC, iv)
-        data_bytes = EncodingTool.from_hex(data)
-        decrypted_bytes = aes.decrypt(data_bytes)
-        return decrypted_bytes.decode(INTERNAL_ENCODING)
+        """
+
+        Args:
+            content (bytes): the first 16 bytes are the IV
+
+        Returns:
+            str
+        """
+        data, iv = content[16:], content[:16]
+        return CryptoTool.aes_cbc_decrypt(data, CONTENT_KEY, iv).decode(INTERNAL_ENCODING)
+
+    @staticmethod
+    def _decrypt_payload(payload):
+        return QimaoApi._decrypt(CryptoTool.b64decode(payload)).strip()
+
+    @staticmethod
+    def decrypt_payloads(payloads, processes=None):
+        """Decrypt a batch of chapter contents
+
+        Args:
+            payloads (list[str]): the base64 ``content`` field of each response
+            processes (int, optional): if provided, decrypt in a pool of processes
+
+        Returns:
+            list[str]
+        """
+        return CryptoTool.map(QimaoApi._decrypt_payload, [(p,) for p in payloads], processes)
 
     @staticmethod
     def _parse_from_url_request(req):
@@ -107,9 +125,7 @@ class QimaoApi(RequestApi):
         payload = item.get('data', {}).get('content', None)
         if payload is None:
             return None, None
-        txt = base64.b64decode(payload).hex()
-        content = QimaoApi._decrypt(txt).strip()
-        return Chapter(req.title, content), None
+        return Chapter(req.title, QimaoApi._decrypt_payload(payload)), None
 
     def get_chapter_app(self, req):
         item = RequestsTool.request_and_json(
@@ -156,6 +172,22 @@ class QimaoApi(RequestApi):
             req = QimaoApi._parse_from_url_request(req)
         return await self.get_chapter_app_async(session, req)
 
+    async def fetch_chapter_async(self, session, req):
+        if isinstance(req, UrlChapterRequest):
+            req = QimaoApi._parse_from_url_request(req)
+        return await RequestsTool.request_raw_async(
+            session,
+            QimaoApi.CHAPTER_APP_API,
+            encoding=QimaoApi.ENCODING,
+            request_kwargs=dict(headers=self.headers, params=self._preprocess_chapter_app(req))
+        )
+
+    @staticmethod
+    def parse_chapter(req, raw):
+        if isinstance(req, UrlChapterRequest):
+            req = QimaoApi._parse_from_url_request(req)
+        return QimaoApi._parse_chapter_app(req, raw.json(QimaoApi.ENCODING))
+
     # ====================== Get chapter list ===========================
     @staticmethod
     def _parse_from_url_catalogue_request(req):
@@ -172,15 +204,28 @@ class QimaoApi(RequestApi):
         except Exception as e:
             raise ValueError(f'Invalid FQNOVEL catalogue URL: `{req.url}`')
 
-    def get_chapter_list_app(self, req):
+    def _chapter_list_app_payload(self, req):
         sign = EncodingTool.MD5(f'id={req.book_id}d3dGiJc651gSQ8w1')
         params = {
             'id': req.book_id,
             'sign': sign
         }
-        res = RequestsTool.request_and_json(QimaoApi.CATALOGUE_APP_API,
-                                            encoding=QimaoApi.ENCODING,
-                                            request_kwargs=dict(headers=self.headers, params=params))
+        return dict(
+            url=QimaoApi.CATALOGUE_APP_API,
+            encoding=QimaoApi.ENCODING,
+            request_kwargs=dict(headers=self.headers, params=params)
+        )
+
+    def get_chapter_list_app(self, req):
+        res = RequestsTool.request_and_json(**self._chapter_list_app_payload(req))
+        return QimaoApi._parse_chapter_list_app(req, res)
+
+    async def get_chapter_list_app_async(self, session, req):
+        res = await RequestsTool.request_and_json_async(session, **self._chapter_list_app_payload(req))
+        return QimaoApi._parse_chapter_list_app(req, res)
+
+    @staticmethod
+    def _parse_chapter_list_app(req, res):
         items = res['data'].get('chapter_lists', [])
         return [QimaoApi.ChapterRequest(
             True,
@@ -202,17 +247,41 @@ class QimaoApi(RequestApi):
             req = QimaoApi._parse_from_url_catalogue_request(req)
         return self.get_chapter_list_app(req)
 
+    async def get_chapter_list_async(self, session, req):
+        if isinstance(req, UrlCatalogueRequest):
+            req = QimaoApi._parse_from_url_catalogue_request(req)
+        return await self.get_chapter_list_app_async(session, req)
+
     # ====================== Get Book Info ===========================
-    def get_book_info(self, req):
-        if isinstance(req, (UrlBookInfoRequest, UrlCatalogueRequest)):
-            req = QimaoApi.BookInfoRequest(QimaoApi._parse_from_url_catalogue_request(req).book_id)
+    def _book_info_payload(self, req):
         params = {
             'id': req.book_id,
             'ab_type': 2
         }
-        res = RequestsTool.request_and_json(QimaoApi.BOOK_INFO_API,
-                                            encoding=QimaoApi.ENCODING,
-                                            request_kwargs=dict(headers=self.headers, params=params))
+        return dict(
+            url=QimaoApi.BOOK_INFO_API,
+            encoding=QimaoApi.ENCODING,
+            request_kwargs=dict(headers=self.headers, params=params)
+        )
+
+    @staticmethod
+    def _parse_from_url_book_info_request(req):
+        if isinstance(req, (UrlBookInfoRequest, UrlCatalogueRequest)):
+            req = QimaoApi.BookInfoRequest(QimaoApi._parse_from_url_catalogue_request(req).book_id)
+        return req
+
+    def get_book_info(self, req):
+        req = QimaoApi._parse_from_url_book_info_request(req)
+        res = RequestsTool.request_and_json(**self._book_info_payload(req))
+        return QimaoApi._parse_book_info(res)
+
+    async def get_book_info_async(self, session, req):
+        req = QimaoApi._parse_from_url_book_info_request(req)
+        res = await RequestsTool.request_and_json_async(session, **self._book_info_payload(req))
+        return QimaoApi._parse_book_info(res)
+
+    @staticmethod
+    def _parse_book_info(res):
         info = res['data']
         return Book(
             name=info['title'],
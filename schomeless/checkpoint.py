@@ -0,0 +1,157 @@
+"""
+Resumable chapter checkpoint
+"""
+import json
+import logging
+import os.path
+
+from schomeless.schema import Chapter
+from schomeless.utils import EncodingTool, FileSysTool
+
+__all__ = [
+    'ChapterCheckpoint'
+]
+
+logger = logging.getLogger('Checkpoint')
+
+IGNORED_FIELDS = {'is_first', 'title'}
+"""Fields of ``ChapterRequest`` that don't identify the chapter"""
+
+
+class ChapterCheckpoint:
+    """Append-only JSONL journal of the completed chapters.
+
+    Each line is ``{"key": ..., "chapter": {...}}``, where the key is built from the API namespace and the
+    identity fields of the chapter request, e.g. ``item_id``, ``chapter_id`` or ``post_id``. A rerun with the same
+    journal skips every chapter already in it. A truncated last line, e.g. from a killed process, is ignored.
+    """
+
+    def __init__(self, file_path, namespace=''):
+        """
+
+        Args:
+            file_path (str): path of the journal
+            namespace (str, optional): namespace of the API, e.g. ``"JJWXC"``
+        """
+        self.file_path = file_path
+        self.namespace = namespace
+        self.chapters = {}
+        self.fobj = None
+        self.load()
+
+    @staticmethod
+    def get_namespace(api):
+        name = getattr(api, 'name', '')
+        return name if name else type(api).__name__
+
+    @classmethod
+    def for_api(cls, file_path, api):
+        """
+
+        Args:
+            file_path (str):
+            api (RequestApi):
+
+        Returns:
+            ChapterCheckpoint
+        """
+        return cls(file_path, ChapterCheckpoint.get_namespace(api))
+
+    def key(self, req):
+        """
+
+        Args:
+            req (ChapterRequest):
+
+        Returns:
+            str
+        """
+        return EncodingTool.MD5(f"{self.namespace}|{ChapterCheckpoint.identity(req)}")
+
+    @staticmethod
+    def identity(req):
+        """Two requests of the same chapter have the same identity, even if e.g. only one of them has the title
+
+        Args:
+            req (ChapterRequest):
+
+        Returns:
+            str
+        """
+        identity = {k: v for k, v in req._asdict().items() if k not in IGNORED_FIELDS}
+        identity = json.dumps(identity, sort_keys=True, ensure_ascii=False, default=str)
+        return f"{type(req).__name__}|{identity}"
+
+    def load(self):
+        self.chapters = {}
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'r', encoding='utf-8') as fobj:
+            for line in fobj:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skip broken record in `{self.file_path}`")
+                    continue
+                self.chapters[record['key']] = record['chapter']
+        logger.info(f"{len(self.chapters)} chapters loaded from `{self.file_path}`")
+
+    def get(self, req):
+        """
+
+        Args:
+            req (ChapterRequest):
+
+        Returns:
+            Chapter: None if not fetched yet.
+        """
+        chapter = self.chapters.get(self.key(req), None)
+        if chapter is None:
+            return None
+        return Chapter(**chapter)
+
+    def save(self, req, chapter):
+        """Persist a completed chapter immediately
+
+        Args:
+            req (ChapterRequest): the request of the first page of the chapter
+            chapter (Chapter):
+        """
+        if chapter is None:
+            return
+        if self.fobj is None:
+            FileSysTool.enable_path(self.file_path)
+            self.fobj = open(self.file_path, 'a', encoding='utf-8')
+            if self.fobj.tell() > 0 and not self._ends_with_newline():
+                # terminate the truncated record so it doesn't swallow the next one
+                self.fobj.write('\n')
+        key = self.key(req)
+        record = chapter._asdict()
+        self.chapters[key] = record
+        self.fobj.write(json.dumps(dict(key=key, chapter=record), ensure_ascii=False) + '\n')
+        self.fobj.flush()
+
+    def _ends_with_newline(self):
+        with open(self.file_path, 'rb') as fobj:
+            fobj.seek(-1, os.SEEK_END)
+            return fobj.read(1) == b'\n'
+
+    def close(self):
+        if self.fobj is not None:
+            self.fobj.close()
+            self.fobj = None
+
+    def clear(self):
+        """Remove the journal, e.g. when the book is saved."""
+        self.close()
+        self.chapters = {}
+        FileSysTool.delete_path(self.file_path)
+
+    def __len__(self):
+        return len(self.chapters)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,187 @@
+"""
+Change detection of the chapters of a downloaded book
+"""
+import json
+import logging
+import os
+import os.path
+import threading
+
+from schomeless.utils import EncodingTool, FileSysTool
+
+__all__ = [
+    'FingerprintIndex'
+]
+
+logger = logging.getLogger('Fingerprint')
+
+VALIDATOR_HEADERS = {'ETag': 'If-None-Match', 'Last-Modified': 'If-Modified-Since'}
+"""Response header -> conditional request header"""
+
+
+class FingerprintIndex:
+    """Per-chapter fingerprints stored next to the book, as JSON ``{"chapters": {chapter key: content hash},
+    "validators": {request key: {"ETag": ..., "Last-Modified": ..., "chapter": chapter key}}}``.
+
+    The content hashes tell which chapters changed on a re-crawl. The validators are the ``ETag`` and
+    ``Last-Modified`` of the page requests, sent back as ``If-None-Match`` and ``If-Modified-Since``, so that an
+    unchanged page is neither downloaded nor parsed again, see ``RequestsTool.use_validators``.
+    """
+
+    def __init__(self, file_path):
+        """
+
+        Args:
+            file_path (str): path of the index
+        """
+        self.file_path = file_path
+        self.chapters = {}
+        self.validators = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def for_book(cls, book_path):
+        """
+
+        Args:
+            book_path (str): path of the TXT or JSON book
+
+        Returns:
+            FingerprintIndex
+        """
+        return cls(f'{book_path}.fingerprints.json')
+
+    @staticmethod
+    def normalize(content):
+        """Ignore the blank lines and the whitespaces around the lines, which differ between TXT and JSON books
+
+        Args:
+            content (str):
+
+        Returns:
+            str
+        """
+        lines = [line.strip() for line in (content or '').split('\n')]
+        return '\n'.join(line for line in lines if line)
+
+    @staticmethod
+    def hash(content):
+        """
+
+        Args:
+            content (str):
+
+        Returns:
+            str
+        """
+        return EncodingTool.MD5(FingerprintIndex.normalize(content))
+
+    def load(self):
+        self.chapters, self.validators = {}, {}
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as fobj:
+                data = json.load(fobj)
+        except json.JSONDecodeError:
+            logger.warning(f"Ignore broken fingerprints `{self.file_path}`")
+            return
+        self.chapters = data.get('chapters', {})
+        self.validators = data.get('validators', {})
+        logger.info(f"{len(self.chapters)} fingerprints loaded from `{self.file_path}`")
+
+    def save(self):
+        """Write the index atomically"""
+        with self.lock:
+            data = json.dumps(dict(chapters=self.chapters, validators=self.validators), ensure_ascii=False)
+        FileSysTool.enable_path(self.file_path)
+        temp_path = f'{self.file_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as fobj:
+            fobj.write(data)
+        os.replace(temp_path, self.file_path)
+
+    def get_hash(self, key):
+        """
+
+        Args:
+            key (str): key of the chapter, see ``Chapter.key``
+
+        Returns:
+            str: None if unknown
+        """
+        with self.lock:
+            return self.chapters.get(key)
+
+    def set_hash(self, key, content):
+        """
+
+        Args:
+            key (str):
+            content (str):
+
+        Returns:
+            bool: whether the content changed, True if unknown before
+        """
+        digest = FingerprintIndex.hash(content)
+        with self.lock:
+            changed = self.chapters.get(key) != digest
+            self.chapters[key] = digest
+        return changed
+
+    def get_validators(self, request_key):
+        """
+
+        Args:
+            request_key (str): see ``RequestsTool.request_key``
+
+        Returns:
+            dict: the conditional request headers, empty if none stored
+        """
+        with self.lock:
+            validators = self.validators.get(request_key, {})
+        return {VALIDATOR_HEADERS[k]: v for k, v in validators.items() if k in VALIDATOR_HEADERS}
+
+    def set_validators(self, request_key, headers, owner=None):
+        """
+
+        Args:
+            request_key (str):
+            headers: response headers, case-insensitive
+            owner (str, optional): key of the chapter of the request, see ``prune``
+        """
+        validators = {k: headers.get(k) for k in VALIDATOR_HEADERS if headers.get(k)}
+        if validators and owner is not None:
+            validators['chapter'] = owner
+        with self.lock:
+            if validators:
+                self.validators[request_key] = validators
+            else:
+                self.validators.pop(request_key, None)
+
+    def prune(self, keys):
+        """Drop the fingerprints of the chapters not in ``keys``, e.g. no longer in the catalogue. The validators
+        stored without a chapter are kept.
+
+        Args:
+            keys (Iterable[str]): keys of the chapters to keep
+
+        Returns:
+            int: number of the dropped chapters
+        """
+        keys = set(keys)
+        with self.lock:
+            dropped = [key for key in self.chapters if key not in keys]
+            for key in dropped:
+                self.chapters.pop(key)
+            self.validators = {k: v for k, v in self.validators.items() if 'chapter' not in v or v['chapter'] in keys}
+        return len(dropped)
+
+    def __len__(self):
+        return len(self.chapters)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.save()
@@ -0,0 +1,299 @@
+"""
+Live progress of a download
+"""
+import logging
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+__all__ = [
+    'Progress',
+    'ProgressObserver',
+    'CallbackObserver',
+    'LoggingObserver',
+    'ProgressTracker'
+]
+
+logger = logging.getLogger('Progress')
+
+
+@dataclass(frozen=True)
+class Progress:
+    """Snapshot of a download, passed to the observers"""
+    label: str = ''
+    """Namespace of the API"""
+    total: Optional[int] = None
+    """Number of chapters, None if unknown, e.g. for ``IterativeRequester``"""
+    done: int = 0
+    """Completed chapters, restored ones included"""
+    failed: int = 0
+    """Chapters given up"""
+    restored: int = 0
+    """Chapters restored from the checkpoint"""
+    in_flight: int = 0
+    """Pages being requested"""
+    pages: int = 0
+    """Successful page requests"""
+    errors: int = 0
+    """Failed page requests"""
+    bytes: int = 0
+    """UTF-8 size of the downloaded content"""
+    elapsed: float = 0.
+    chapters_per_sec: float = 0.
+    """Over the last ``ProgressTracker.window`` seconds, as are ``bytes_per_sec`` and ``error_rate``"""
+    bytes_per_sec: float = 0.
+    error_rate: float = 0.
+    """Failed requests / all requests"""
+    eta: Optional[float] = None
+    """Seconds left at the current rate, None if unknown"""
+    finished: bool = False
+    aborted: bool = False
+    abort_reason: Optional[str] = None
+    tracker: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def remaining(self):
+        return None if self.total is None else max(0, self.total - self.done - self.failed)
+
+    def abort(self, reason=None):
+        """Stop the download, see ``ProgressTracker.abort``"""
+        if self.tracker is not None:
+            self.tracker.abort(reason)
+
+
+class ProgressObserver:
+    """Receive the progress of the downloads. The methods are called in the thread of the requester, so they
+    should return quickly. An exception is logged and ignored.
+    """
+
+    def on_start(self, progress):
+        """
+
+        Args:
+            progress (Progress):
+        """
+        pass
+
+    def on_progress(self, progress):
+        """Called at most once per ``ProgressTracker.interval`` seconds
+
+        Args:
+            progress (Progress):
+        """
+        pass
+
+    def on_finish(self, progress):
+        """Called once the download is completed or aborted
+
+        Args:
+            progress (Progress):
+        """
+        pass
+
+
+class CallbackObserver(ProgressObserver):
+    """Call a function with the progress at every event"""
+
+    def __init__(self, callback):
+        """
+
+        Args:
+            callback (callable): ``Progress`` -> None
+        """
+        self.callback = callback
+
+    def on_start(self, progress):
+        self.callback(progress)
+
+    def on_progress(self, progress):
+        self.callback(progress)
+
+    def on_finish(self, progress):
+        self.callback(progress)
+
+
+class LoggingObserver(ProgressObserver):
+    """Log a progress line at most once per ``interval`` seconds"""
+
+    def __init__(self, interval=10., level=logging.INFO):
+        self.interval = interval
+        self.level = level
+        self.last = 0.
+
+    @staticmethod
+    def format(progress):
+        total = '?' if progress.total is None else progress.total
+        eta = '?' if progress.eta is None else f'{progress.eta:.0f}s'
+        return f"[{progress.label}] {progress.done}/{total} chapters, {progress.failed} failed, " \
+               f"{progress.in_flight} in flight, {progress.chapters_per_sec:.2f} chapters/s, " \
+               f"{progress.bytes_per_sec / 1024:.1f} KB/s, {progress.error_rate:.1%} errors, ETA {eta}"
+
+    def on_progress(self, progress):
+        if progress.elapsed - self.last >= self.interval:
+            self.last = progress.elapsed
+            logger.log(self.level, self.format(progress))
+
+    def on_finish(self, progress):
+        status = f'aborted: {progress.abort_reason}' if progress.aborted else 'finished'
+        logger.log(self.level, f"{self.format(progress)}, {status} in {progress.elapsed:.1f}s")
+
+
+class ProgressTracker:
+    """Count the events of one download and notify the observers
+
+    The rates are measured over the last ``window`` seconds, so that they follow the current throughput.
+    """
+
+    def __init__(self, observers=None, label='', total=None, restored=0, *, interval=1., window=30.):
+        """
+
+        Args:
+            observers (list[ProgressObserver], optional):
+            label (str, optional): namespace of the API
+            total (int, optional): number of chapters, None if unknown
+            restored (int, optional): chapters restored from the checkpoint
+            interval (float, optional): min seconds between two ``on_progress``
+            window (float, optional): seconds the rates are measured over
+        """
+        self.observers = list(observers or [])
+        self.label = label
+        self.total = total
+        self.restored = restored
+        self.interval = interval
+        self.window = window
+        self.done = restored
+        self.failed = 0
+        self.in_flight = 0
+        self.pages = 0
+        self.errors = 0
+        self.bytes = 0
+        self.finished = False
+        self.aborted = False
+        self.abort_reason = None
+        self.abort_callbacks = []
+        self.lock = threading.Lock()
+        self.start_time = self.last_notified = time.monotonic()
+        self.samples = deque([self._sample(self.start_time)])
+        """``(time, done, bytes, pages, errors)``"""
+
+    def _sample(self, now):
+        return now, self.done, self.bytes, self.pages, self.errors
+
+    def snapshot(self):
+        """
+
+        Returns:
+            Progress
+        """
+        with self.lock:
+            now = time.monotonic()
+            while len(self.samples) > 1 and self.samples[0][0] < now - self.window:
+                self.samples.popleft()
+            t0, done0, bytes0, pages0, errors0 = self.samples[0]
+            dt = now - t0
+            chapters_per_sec = (self.done - done0) / dt if dt > 0 else 0.
+            bytes_per_sec = (self.bytes - bytes0) / dt if dt > 0 else 0.
+            n_requests = self.pages - pages0 + self.errors - errors0
+            error_rate = (self.errors - errors0) / n_requests if n_requests else 0.
+            remaining = None if self.total is None else max(0, self.total - self.done - self.failed)
+            eta = None
+            if remaining == 0:
+                eta = 0.
+            elif remaining is not None and chapters_per_sec > 0:
+                eta = remaining / chapters_per_sec
+            return Progress(self.label, self.total, self.done, self.failed, self.restored, self.in_flight,
+                            self.pages, self.errors, self.bytes, now - self.start_time, chapters_per_sec,
+                            bytes_per_sec, error_rate, eta, self.finished, self.aborted, self.abort_reason, self)
+
+    def notify(self, event):
+        progress = self.snapshot()
+        for observer in self.observers:
+            try:
+                getattr(observer, event)(progress)
+            except Exception:
+                logger.warning(f"Progress observer {observer} failed: {traceback.format_exc()}")
+        return progress
+
+    def update(self):
+        """Notify ``on_progress`` if ``interval`` seconds passed since the last time"""
+        now = time.monotonic()
+        if now - self.last_notified < self.interval or len(self.observers) == 0:
+            return
+        self.last_notified = now
+        with self.lock:
+            self.samples.append(self._sample(now))
+        self.notify('on_progress')
+
+    def start(self):
+        return self.notify('on_start')
+
+    def page_started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def page_finished(self, page=None, is_succ=True):
+        """
+
+        Args:
+            page (Chapter, optional): the requested page
+            is_succ (bool, optional):
+        """
+        with self.lock:
+            self.in_flight -= 1
+            if is_succ:
+                self.pages += 1
+                if page is not None and page.content:
+                    self.bytes += len(page.content.encode('utf-8'))
+            else:
+                self.errors += 1
+        self.update()
+
+    def chapter_finished(self, is_succ=True):
+        with self.lock:
+            if is_succ:
+                self.done += 1
+            else:
+                self.failed += 1
+        self.update()
+
+    def finish(self):
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+        return self.notify('on_finish')
+
+    def abort(self, reason=None):
+        """Stop the download. May be called from any thread, e.g. by an observer.
+
+        The requester stops requesting new pages and returns the chapters completed so far. With a checkpoint, a
+        rerun resumes from them.
+
+        Args:
+            reason (str, optional):
+        """
+        with self.lock:
+            if self.aborted:
+                return
+            self.aborted = True
+            self.abort_reason = reason
+            callbacks = list(self.abort_callbacks)
+        logger.warning(f"[{self.label}] Aborted: {reason}")
+        for callback in callbacks:
+            callback()
+
+    def add_abort_callback(self, callback):
+        """
+
+        Args:
+            callback (callable): called without arguments once aborted, right away if already aborted
+        """
+        with self.lock:
+            aborted = self.aborted
+            if not aborted:
+                self.abort_callbacks.append(callback)
+        if aborted:
+            callback()
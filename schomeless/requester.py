@@ -3,30 +3,146 @@ Book requester
 """
 import asyncio
 import logging
+import random
+import threading
 import traceback
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
 
 import aiohttp
 
-from schomeless.schema import Chapter, Book
-from schomeless.utils import Registerable
+from schomeless.api import RequestApi
+from schomeless.checkpoint import ChapterCheckpoint
+from schomeless.fingerprint import FingerprintIndex
+from schomeless.progress import ProgressObserver, CallbackObserver, ProgressTracker
+from schomeless.schema import Chapter, Book, ChapterRequest
+from schomeless.utils import Registerable, RequestsTool, RateLimiter, Metrics, MetricsTool, NotModifiedError
+from schomeless.writer import BookWriter
 
 __all__ = [
     'BookRequester',
     'IterativeRequester',
-    'AsyncRequester'
+    'AsyncRequester',
+    'BatchRequester'
 ]
 
 logger = logging.getLogger('Requester')
 
+DEFAULT_HEADERS = {
+    'User-Agent': 'python-requests/2.27.1',
+    'Connection': 'keep-alive'
+}
+KEEPALIVE_TIMEOUT = 60
+"""Seconds to keep an idle connection in the pool"""
+DNS_CACHE_TTL = 600
+"""Seconds to cache the resolved host names"""
+
+
+def get_api_label(api):
+    """The label of the metrics of an API, see ``MetricsTool``"""
+    return getattr(api, 'name', None) or type(api).__name__
+
+
+def get_trace_configs(limiter=None):
+    """
+
+    Args:
+        limiter (RateLimiter, optional):
+
+    Returns:
+        list[aiohttp.TraceConfig]: of the limiter and the metrics if enabled
+    """
+    configs = [limiter.trace_config()] if limiter is not None else []
+    if MetricsTool.metrics is not None:
+        configs.append(MetricsTool.trace_config())
+    return configs
+
+
+def create_session(max_concurrency, max_per_host, headers=None, limiter=None):
+    """Create a session whose connection pool is kept alive across books
+
+    Args:
+        max_concurrency (int): max number of connections
+        max_per_host (int): max number of connections to one host
+        headers (dict, optional): default headers of the session. Use ``DEFAULT_HEADERS`` if not provided.
+        limiter (RateLimiter, optional): applied to every request of the session
+
+    Returns:
+        aiohttp.ClientSession
+    """
+    if headers is None:
+        headers = dict(DEFAULT_HEADERS)
+    connector = aiohttp.TCPConnector(
+        limit=max_concurrency,
+        limit_per_host=max_per_host,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL
+    )
+    return aiohttp.ClientSession(headers=headers, connector=connector, trace_configs=get_trace_configs(limiter))
+
 
 class BookRequester(metaclass=Registerable):
-    def __init__(self, api):
+    progress_interval = 1.
+    """Min seconds between two ``ProgressObserver.on_progress``"""
+
+    def __init__(self, api, observers=None):
         """
 
         Args:
             api (RequestApi):
+            observers (list, optional): see ``add_observer``
         """
         self.api = api
+        self.observers = []
+        for observer in observers or []:
+            self.add_observer(observer)
+        self.progress = None
+        """ProgressTracker of the current run"""
+        self.label = None
+        """Label of the progress, the namespace of the API if None"""
+
+    def add_observer(self, observer):
+        """Watch the progress of the following runs, e.g. to abort a slow download::
+
+            def watch(progress):
+                if progress.elapsed > 60 and progress.bytes_per_sec < 1024:
+                    progress.abort('too slow')
+
+            requester.add_observer(watch)
+
+        Args:
+            observer (ProgressObserver or callable): a callable is called with the ``Progress`` at every event
+        """
+        if not isinstance(observer, ProgressObserver):
+            observer = CallbackObserver(observer)
+        self.observers.append(observer)
+
+    def start_progress(self, total=None, restored=0):
+        """
+
+        Args:
+            total (int, optional): number of chapters, None if unknown
+            restored (int, optional): chapters restored from the checkpoint
+
+        Returns:
+            ProgressTracker
+        """
+        self.progress = ProgressTracker(self.observers, self.label or get_api_label(self.api), total, restored,
+                                        interval=self.progress_interval)
+        self.progress.start()
+        return self.progress
+
+    def abort(self, reason=None):
+        """Stop the current run, see ``ProgressTracker.abort``
+
+        Args:
+            reason (str, optional):
+        """
+        if self.progress is not None:
+            self.progress.abort(reason)
 
     def run(self, book_props=None, *args, **kwargs):
         """
@@ -41,6 +157,7 @@ class BookRequester(metaclass=Registerable):
         if not isinstance(book, Book):
             book = Book(**book_props)
         book.chapters = self.run_internal(*args, **kwargs)
+        MetricsTool.flush()
         return book
 
     def run_internal(self, *args, **kwargs):
@@ -59,8 +176,8 @@ class BookRequester(metaclass=Registerable):
 class MultiPageRequester(BookRequester):
     """When there might be multiple page for one chapter"""
 
-    def __init__(self, api, add_enter=False):
-        super().__init__(api)
+    def __init__(self, api, add_enter=False, observers=None):
+        super().__init__(api, observers)
         self.add_enter = add_enter
 
     @staticmethod
@@ -89,31 +206,138 @@ class MultiPageRequester(BookRequester):
         return chapter
 
     @staticmethod
-    def get_chapter_sync(api, req, add_enter=False):
+    def get_chapter_sync(api, req, add_enter=False, progress=None, metrics=None):
+        """
+
+        Args:
+            api (RequestApi):
+            req (ChapterRequest):
+            add_enter (bool, optional):
+            progress (ProgressTracker, optional): updated with each page
+            metrics (Metrics, optional): where the pages are measured, ``MetricsTool`` by default
+
+        Returns:
+            2-tuple: ``(Chapter, ChapterRequest)``
+        """
         chapter = None
+        key = ChapterCheckpoint.identity(req)
+        label = get_api_label(api)
+        if metrics is None:
+            metrics = MetricsTool
         try:
             while True:
-                page, req = api.get_chapter(req)
+                if progress is not None:
+                    progress.page_started()
+                try:
+                    with metrics.span('page', api=label), RequestsTool.use_validators(None, owner=key):
+                        page, req = api.get_chapter(req)
+                except Exception:
+                    if progress is not None:
+                        progress.page_finished(is_succ=False)
+                    raise
+                if progress is not None:
+                    progress.page_finished(page)
                 chapter = MultiPageRequester.reduce_page(chapter, page, add_enter)
                 if req is None or req.is_first:
                     break
         except Exception as e:
+            metrics.count('page_failures', api=label)
             traceback.print_exc()
+        if chapter is not None:
+            chapter.key = key
         return chapter, req
 
     @staticmethod
-    def append_chapter(chapters, chapter):
+    def append_chapter(chapters, chapter, writer=None):
+        """
+
+        Args:
+            chapters (list[Chapter]):
+            chapter (Chapter):
+            writer (BookWriter, optional): if provided, write the chapter and only keep its title in ``chapters``.
+
+        Returns:
+            list[Chapter]
+        """
         if chapter is not None:
             chapter.id = len(chapters)
-            chapters.append(chapter)
             logger.info(f"Chapter {chapter.id + 1}: {chapter.title}")
+            if writer is not None:
+                writer.write(chapter)
+                chapter = MultiPageRequester.release_chapter(chapter)
+            chapters.append(chapter)
         return chapters
 
+    @staticmethod
+    def release_chapter(chapter):
+        """Drop the content of a chapter already written to the file
+
+        Args:
+            chapter (Chapter):
+
+        Returns:
+            Chapter
+        """
+        return Chapter(chapter.title, id=chapter.id, key=chapter.key)
+
+
+class _PageLog(Metrics):
+    """Progress and metrics of a prefetched chapter, replayed once the prediction is confirmed, so that the wasted
+    guesses count in neither"""
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            self.events.append((MetricsTool.observe, (name, value), labels))
+
+    def count(self, name, value=1, **labels):
+        with self.lock:
+            self.events.append((MetricsTool.count, (name, value), labels))
+
+    def page_started(self):
+        with self.lock:
+            self.events.append((ProgressTracker.page_started, (), {}))
+
+    def page_finished(self, page=None, is_succ=True):
+        with self.lock:
+            self.events.append((ProgressTracker.page_finished, (page, is_succ), {}))
+
+    def replay(self, progress):
+        """
+
+        Args:
+            progress (ProgressTracker):
+        """
+        with self.lock:
+            events, self.events = self.events, []
+        for func, args, kwargs in events:
+            if func in (MetricsTool.observe, MetricsTool.count):
+                func(*args, **kwargs)
+            else:
+                func(progress, *args, **kwargs)
+
 
 @BookRequester.register('ITER')
 class IterativeRequester(MultiPageRequester):
     """Query book chapter by chapter"""
 
+    def __init__(self, api, add_enter=False, prefetch=0, observers=None):
+        """
+
+        Args:
+            api (RequestApi):
+            add_enter (bool, optional): whether add "\n" between content from different pages
+            prefetch (int, optional): number of chapters predicted by ``RequestApi.predict_next`` to request ahead \
+                                      in threads. ``0`` to request one chapter at a time.
+            observers (list, optional): see ``add_observer``
+        """
+        super().__init__(api, add_enter, observers)
+        self.prefetch = prefetch
+
     def get_chapter(self, req):
         """
 
@@ -123,114 +347,506 @@ class IterativeRequester(MultiPageRequester):
         Returns:
             2-tuple: ``(Chapter, ChapterRequest)``
         """
-        return MultiPageRequester.get_chapter_sync(self.api, req, self.add_enter)
+        return MultiPageRequester.get_chapter_sync(self.api, req, self.add_enter, self.progress)
+
+    def prefetch_chapter(self, req):
+        """Same as ``get_chapter``, but the progress and the metrics are kept until ``_PageLog.replay``
+
+        Args:
+            req (ChapterRequest):
+
+        Returns:
+            3-tuple: ``(Chapter, ChapterRequest, _PageLog)``
+        """
+        log = _PageLog()
+        chapter, next = MultiPageRequester.get_chapter_sync(self.api, req, self.add_enter, log, log)
+        return chapter, next, log
+
+    def run_internal(self, req, *, writer=None):
+        """
+
+        Args:
+            req (ChapterRequest)
+            writer (BookWriter, optional): write chapters to the file once completed, \
+                                           and only keep their titles in memory.
+
+        Returns:
+            list[Chapter]
+        """
+        progress = self.start_progress()
+        try:
+            if self.prefetch > 0:
+                return self.run_prefetch(req, writer=writer)
+            chapters = []
+            while req is not None and not progress.aborted:
+                chap, req = self.get_chapter(req)
+                if chap is not None:
+                    progress.chapter_finished()
+                chapters = MultiPageRequester.append_chapter(chapters, chap, writer)
+            return chapters
+        finally:
+            progress.finish()
+
+    def predict(self, req):
+        """
+
+        Args:
+            req (ChapterRequest):
 
-    def run_internal(self, req):
+        Returns:
+            list[ChapterRequest]: up to ``prefetch`` predicted requests after ``req``
         """
+        predicted = []
+        while len(predicted) < self.prefetch:
+            req = self.api.predict_next(req)
+            if req is None:
+                break
+            predicted.append(req)
+        return predicted
+
+    def run_prefetch(self, req, *, writer=None):
+        """Same as ``run_internal``, but keep the predicted next chapters in flight while waiting for the current one.
+        A prefetched chapter is used only if it's the actual next one, otherwise it's discarded. Its progress and
+        metrics are recorded only once it's used.
 
         Args:
             req (ChapterRequest)
+            writer (BookWriter, optional):
 
         Returns:
             list[Chapter]
         """
         chapters = []
-        while req is not None:
-            chap, req = self.get_chapter(req)
-            chapters = MultiPageRequester.append_chapter(chapters, chap)
+        inflight = {}
+        n_hits = n_wasted = 0
+        with ThreadPoolExecutor(max_workers=self.prefetch + 1) as executor:
+            while req is not None and not self.progress.aborted:
+                key = ChapterCheckpoint.identity(req)
+                future = inflight.pop(key, None)
+                is_prefetched = future is not None
+                if is_prefetched:
+                    n_hits += 1
+                else:
+                    future = executor.submit(self.get_chapter, req)
+                keys = set()
+                for predicted in self.predict(req):
+                    predicted_key = ChapterCheckpoint.identity(predicted)
+                    keys.add(predicted_key)
+                    if predicted_key not in inflight:
+                        inflight[predicted_key] = executor.submit(self.prefetch_chapter, predicted)
+                for wrong_key in set(inflight) - keys:
+                    inflight.pop(wrong_key).cancel()
+                    n_wasted += 1
+                if is_prefetched:
+                    chap, req, log = future.result()
+                    log.replay(self.progress)
+                else:
+                    chap, req = future.result()
+                if chap is not None:
+                    self.progress.chapter_finished()
+                chapters = MultiPageRequester.append_chapter(chapters, chap, writer)
+            for future in inflight.values():
+                future.cancel()
+            n_wasted += len(inflight)
+        logger.debug(f"Prefetch: {n_hits} used, {n_wasted} discarded")
         return chapters
 
 
+@dataclass
+class _FetchState:
+    """Progress of ``AsyncRequester.fetch_chapters``"""
+    chapters: List[Chapter]
+    used: Dict[int, ChapterRequest]
+    """Requests of the unfinished chapters"""
+    retry_count: int
+    reqs: List[ChapterRequest] = field(default_factory=list)
+    """Requests of the first page of each chapter"""
+    checkpoint: Optional[ChapterCheckpoint] = None
+    writer: Optional[BookWriter] = None
+    previous: Dict[int, Chapter] = field(default_factory=dict)
+    """Previous version of the chapters to recheck, reused if their first page is not modified"""
+    fingerprints: Optional[FingerprintIndex] = None
+    """Where the content hashes of the completed chapters are recorded"""
+    attempts: Dict[int, int] = field(default_factory=dict)
+    """Failed attempts of the current page of each chapter"""
+    n_failed: int = 0
+    n_not_modified: int = 0
+    n_pending: int = 0
+    done: asyncio.Event = None
+
+    def __post_init__(self):
+        self.n_pending = len(self.used)
+        self.done = asyncio.Event()
+        if self.n_pending == 0:
+            self.done.set()
+
+    def finish(self, index, is_succ=True):
+        """
+
+        Args:
+            index (int): index of the chapter
+            is_succ (bool, optional): whether all its pages are requested successfully
+        """
+        if is_succ and self.checkpoint is not None:
+            self.checkpoint.save(self.reqs[index], self.chapters[index])
+        if is_succ and self.fingerprints is not None and self.chapters[index].content:
+            self.fingerprints.set_hash(self.chapters[index].key, self.chapters[index].content)
+        if self.writer is not None:
+            self.writer.write(self.chapters[index])
+            self.chapters[index] = MultiPageRequester.release_chapter(self.chapters[index])
+        self.n_pending -= 1
+        if self.n_pending == 0:
+            self.done.set()
+
+    async def wait(self):
+        await self.done.wait()
+
+
 @BookRequester.register('CATALOGUE')
 class AsyncRequester(MultiPageRequester):
     """Query book chapters asynchronously"""
 
-    async def get_page(self, session, req, index):
+    def __init__(self, api, add_enter=False, max_concurrency=16, max_per_host=8, backoff_base=0.5, backoff_max=60.,
+                 parse_executor=None, observers=None):
+        """
+
+        Args:
+            api (RequestApi):
+            add_enter (bool, optional): whether add "\n" between content from different pages
+            max_concurrency (int, optional): max number of pages requested at the same time
+            max_per_host (int, optional): max number of simultaneous connections to one host
+            backoff_base (float, optional): seconds of the first backoff of a failed page
+            backoff_max (float, optional): max seconds of the backoff of a failed page
+            parse_executor (concurrent.futures.Executor, optional): if provided and the API has a parse stage
+                (see ``RequestApi.has_parse_stage``), parse the pages in it so that the event loop only does I/O.
+                Use a ``ProcessPoolExecutor`` for CPU-heavy parsing, e.g. decryption.
+            observers (list, optional): see ``add_observer``
+        """
+        super().__init__(api, add_enter, observers)
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.parse_executor = parse_executor
+
+    async def request_page(self, session, req, use_cache=True):
         """
 
         Args:
             session (aiohttp.ClientSession):
             req (ChapterRequest):
-            index (int): chapter index
+            use_cache (bool, optional): False to skip the cached responses, see ``RequestsTool.refresh_cache``
 
         Returns:
             2-tuple: ``(Chapter, ChapterRequest)``
         """
+        if not use_cache:
+            with RequestsTool.refresh_cache():
+                return await self.request_page(session, req)
+        if self.parse_executor is None or not self.api.has_parse_stage():
+            return await self.api.get_chapter_async(session, req)
+        raw = await self.api.fetch_chapter_async(session, req)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_executor, self.api.parse_chapter, req, raw)
+
+    async def get_page(self, session, req, index, conditional=False, use_cache=True, owner=None):
+        """
+
+        Args:
+            session (aiohttp.ClientSession):
+            req (ChapterRequest):
+            index (int): chapter index
+            conditional (bool, optional): send the stored validators, see ``RequestsTool.use_validators``
+            use_cache (bool, optional): see ``request_page``
+            owner (str, optional): key of the chapter, which the validators of the page belong to
+
+        Returns:
+            2-tuple: ``(bool, dict)``, whether it succeeded, and the result. ``result['not_modified']`` is True if the
+                     page is unchanged since the validators were stored.
+        """
+        self.progress.page_started()
         try:
-            page, next = await self.api.get_chapter_async(session, req)
+            with MetricsTool.span('page', api=get_api_label(self.api)), \
+                    RequestsTool.use_validators(None, conditional, owner):
+                page, next = await self.request_page(session, req, use_cache)
+            self.progress.page_finished(page)
             logger.info(f"Chapter {index + 1}: {page.title}")
             return True, dict(index=index, page=page, next=next)
+        except NotModifiedError:
+            self.progress.page_finished()
+            logger.info(f"Chapter {index + 1}: not modified")
+            return True, dict(index=index, not_modified=True)
         except Exception as e:
-            import traceback
+            self.progress.page_finished(is_succ=False)
+            MetricsTool.count('page_failures', api=get_api_label(self.api))
             logger.debug(traceback.format_exc())
             logger.debug(f'Error at {req}')
-            return False, dict(index=index, page=req)
+            return False, dict(index=index, page=req, error=e)
 
-    def reduce(self, used, chapters, results):
-        n_failed = 0
-        for is_succ, result in results:
+    def reduce(self, used, chapters, result):
+        """Merge one finished page into ``chapters``
+
+        Args:
+            used (dict[int, ChapterRequest]): the pending requests, updated in place
+            chapters (list[Chapter]):
+            result (dict): the successful result of ``get_page``
+
+        Returns:
+            ChapterRequest: the request of the next page of the same chapter, or None if the chapter is completed.
+        """
+        index = result['index']
+        next = result['next']
+        chapters[index] = MultiPageRequester.reduce_page(chapters[index], result['page'], self.add_enter)
+        if next is None or next.is_first:
+            used.pop(index)
+            return None
+        used[index] = next
+        return next
+
+    def get_backoff(self, attempt, error=None):
+        """Seconds to wait before the ``attempt``-th retry of a page
+
+        Use the ``Retry-After`` header of the failed response if any. Otherwise, use exponential backoff with full
+        jitter, i.e. a random delay in ``[0, min(backoff_max, backoff_base * 2 ** (attempt - 1))]``.
+
+        Args:
+            attempt (int): starts from 1
+            error (Exception, optional): the error of the last attempt
+
+        Returns:
+            float
+        """
+        if error is not None:
+            retry_after = RequestsTool.get_retry_after(error)
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    async def worker(self, session, queue, state):
+        while True:
+            index, req = await queue.get()
+            # only the first page tells whether a previous version is still valid
+            conditional = index in state.previous and req is state.reqs[index]
+            # a retried page may have failed on a cached error page, so it is requested again
+            is_succ, result = await self.get_page(session, req, index, conditional, index not in state.attempts,
+                                                  state.chapters[index].key)
+            if is_succ and result.get('not_modified'):
+                state.attempts.pop(index, None)
+                state.chapters[index] = replace(state.previous[index], id=index, key=state.chapters[index].key)
+                state.used.pop(index)
+                state.n_not_modified += 1
+                MetricsTool.count('chapters', api=get_api_label(self.api))
+                self.progress.chapter_finished()
+                state.finish(index)
+                continue
             if is_succ:
-                index = result.pop('index')
-                next = result.pop('next')
-                chapters[index] = MultiPageRequester.reduce_page(chapters[index], result['page'], self.add_enter)
-                if next is None or next.is_first:
-                    used.pop(index)
+                try:
+                    next = self.reduce(state.used, state.chapters, result)
+                except Exception as e:
+                    # retried as a failed request, so that an invalid page is never saved as a completed chapter
+                    logger.warning(f"Chapter {index + 1}: invalid page {result['page']}: {e}")
+                    logger.debug(traceback.format_exc())
+                    MetricsTool.count('page_failures', api=get_api_label(self.api))
+                    is_succ, result = False, dict(index=index, page=req, error=e)
+            if is_succ:
+                state.attempts.pop(index, None)
+                if next is not None:
+                    queue.put_nowait((index, next))
                 else:
-                    used[index] = next
-            else:
-                n_failed += 1
-        return n_failed
-
-    async def core(self, reqs, *, headers=None):
-        if headers is None:
-            headers = {}
-        tasks = []
-        async with aiohttp.ClientSession(headers=headers) as session:
-            for i, req in reqs.items():
-                tasks.append(asyncio.create_task(self.get_page(session, req, i)))
-            return await asyncio.gather(*tasks)
-
-    def get_chapters_async(self, reqs, *, retry_count=20, headers=None):
-        retry = 0
+                    MetricsTool.count('chapters', api=get_api_label(self.api))
+                    self.progress.chapter_finished()
+                    state.finish(index)
+                continue
+            state.n_failed += 1
+            attempt = state.attempts.get(index, 0) + 1
+            state.attempts[index] = attempt
+            if attempt > state.retry_count:
+                logger.warning(f"Chapter {index + 1}: give up after {attempt} attempts")
+                MetricsTool.count('chapter_failures', api=get_api_label(self.api))
+                self.progress.chapter_finished(False)
+                state.finish(index, False)
+                continue
+            MetricsTool.count('retries', api=get_api_label(self.api))
+            delay = self.get_backoff(attempt, result.get('error'))
+            logger.debug(f"Chapter {index + 1}: retry #{attempt} in {delay:.2f}s")
+            asyncio.get_running_loop().call_later(delay, queue.put_nowait, (index, req))
+
+    def create_session(self, headers=None):
+        """Create a session whose connection pool is kept alive across books, see ``create_session``
+
+        Args:
+            headers (dict, optional):
+
+        Returns:
+            aiohttp.ClientSession
+        """
+        return create_session(self.max_concurrency, self.max_per_host, headers)
+
+    async def core(self, session, state):
+        """Request all pending pages with a fixed pool of workers
+
+        At most ``max_concurrency`` pages are requested at the same time, and at most ``max_per_host`` connections
+        are opened to one host. A worker picks the next page as soon as its current one finishes. A failed page is
+        put back to the queue on its own after a backoff delay, see ``get_backoff``.
+
+        Args:
+            session (aiohttp.ClientSession):
+            state (_FetchState): updated in place
+        """
+        # an abort ends the run as if all the chapters were finished, the unfinished ones are left in ``state.used``
+        loop = asyncio.get_running_loop()
+        self.progress.add_abort_callback(lambda: loop.call_soon_threadsafe(state.done.set))
+        queue = asyncio.Queue()
+        for item in state.used.items():
+            queue.put_nowait(item)
+        n_workers = max(1, min(self.max_concurrency, len(state.used)))
+        workers = [asyncio.create_task(self.worker(session, queue, state)) for _ in range(n_workers)]
+        try:
+            await state.wait()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def fetch_chapters(self, reqs, *, retry_count=20, headers=None, session=None, checkpoint=None,
+                             writer=None, previous=None, fingerprints=None):
+        """Request the chapters on the running event loop
+
+        Args:
+            reqs (list[ChapterRequest]):
+            retry_count (int, optional): max number of retries of one page
+            headers (dict, optional): only used when ``session`` is not provided
+            session (aiohttp.ClientSession, optional): if provided, reuse it and leave it open, \
+                                                       e.g. to share connections among books.
+            checkpoint (ChapterCheckpoint, optional): skip the chapters in it, and save new ones to it once completed.
+            writer (BookWriter, optional): write chapters to the file once completed, \
+                                           and only keep their titles in memory.
+            previous (dict[int, Chapter], optional): previous version of some chapters by index. Their first page is
+                requested conditionally, and the previous version is returned as is if it's not modified, see
+                ``RequestsTool.use_validators``.
+            fingerprints (FingerprintIndex, optional): record the content hash of each completed chapter
+
+        Returns:
+            list[Chapter]
+        """
+        if session is None:
+            async with self.create_session(headers) as session:
+                return await self.fetch_chapters(reqs, retry_count=retry_count, session=session,
+                                                 checkpoint=checkpoint, writer=writer, previous=previous,
+                                                 fingerprints=fingerprints)
+
         total = len(reqs)
-        chapters = [Chapter(id=i) for i in range(total)]
-        used = dict(enumerate(reqs))
+        chapters, used = AsyncRequester.restore_chapters(reqs, checkpoint)
+        state = _FetchState(chapters=chapters, used=used, retry_count=retry_count, reqs=reqs, checkpoint=checkpoint,
+                            writer=writer, previous=dict(previous or {}), fingerprints=fingerprints)
+        if fingerprints is not None:
+            for i, chapter in enumerate(chapters):
+                if i not in used and chapter.content:
+                    fingerprints.set_hash(chapter.key, chapter.content)
+        if writer is not None:
+            for i, chapter in enumerate(chapters):
+                if i not in used:
+                    writer.write(chapter)
+                    chapters[i] = MultiPageRequester.release_chapter(chapter)
+        progress = self.start_progress(total, total - len(used))
+        try:
+            if len(used) > 0:
+                await self.core(session, state)
+        finally:
+            progress.finish()
+        logger.info(f"{total - len(state.used)}/{total} completed, {len(state.used)}/{total} failed"
+                    f", {state.n_failed} retried requests, {state.n_not_modified} not modified")
+        return state.chapters
 
-        if headers is None:
-            headers = {}
-            headers['User-Agent'] = 'python-requests/2.27.1'
-            headers['Connection'] = 'keep-alive'
-
-        last_failed = None
-        while retry < retry_count:
-            results = asyncio.run(self.core(used, headers=headers))
-            n_failed = self.reduce(used, chapters, results)
-            logger.info(f"{total - len(used)}/{total} completed, {n_failed}/{total} failed"
-                        f", {len(used) - n_failed}/{total} undergoing")
-            if len(used) == 0:
-                break
-            if last_failed is not None and n_failed > 0 and last_failed == n_failed:
-                retry += 1
-            last_failed = n_failed
+    @staticmethod
+    def restore_chapters(reqs, checkpoint=None):
+        """
 
-        return chapters
+        Args:
+            reqs (list[ChapterRequest]):
+            checkpoint (ChapterCheckpoint, optional):
 
-    def get_chapters(self, reqs, *, retry_count=20):
+        Returns:
+            2-tuple: ``(list[Chapter], dict[int, ChapterRequest])``, the chapters and the requests still to do.
+        """
+        chapters = [Chapter(id=i, key=ChapterCheckpoint.identity(req)) for i, req in enumerate(reqs)]
+        used = dict(enumerate(reqs))
+        if checkpoint is None:
+            return chapters, used
+        for i, req in enumerate(reqs):
+            chapter = checkpoint.get(req)
+            if chapter is not None:
+                chapter.id = i
+                chapter.key = chapters[i].key
+                chapters[i] = chapter
+                used.pop(i)
+        if len(used) < len(reqs):
+            logger.info(f"{len(reqs) - len(used)}/{len(reqs)} chapters restored from checkpoint")
+        return chapters, used
+
+    def get_chapters_async(self, reqs, *, retry_count=20, headers=None, checkpoint=None, writer=None):
+        return asyncio.run(self.fetch_chapters(reqs, retry_count=retry_count, headers=headers, checkpoint=checkpoint,
+                                               writer=writer))
+
+    def get_chapters(self, reqs, *, retry_count=20, checkpoint=None, writer=None, fingerprints=None):
         chapters = []
-        for req in reqs:
-            retry = 0
-            chapter = None
-            while retry < retry_count:
-                try:
-                    chapter, _ = MultiPageRequester.get_chapter_sync(self.api, req, self.add_enter)
-                except Exception as e:
+        restored = [checkpoint.get(req) for req in reqs] if checkpoint is not None else [None] * len(reqs)
+        progress = self.start_progress(len(reqs), sum(1 for chapter in restored if chapter is not None))
+        try:
+            for req, chapter in zip(reqs, restored):
+                if progress.aborted:
+                    break
+                if chapter is not None:
+                    if fingerprints is not None and chapter.content:
+                        fingerprints.set_hash(ChapterCheckpoint.identity(req), chapter.content)
+                    MultiPageRequester.append_chapter(chapters, chapter, writer)
+                    continue
+                retry = 0
+                while retry < retry_count and not progress.aborted:
+                    # failures are logged and give None, and are retried without the cached responses
+                    with RequestsTool.refresh_cache() if retry > 0 else nullcontext():
+                        chapter, _ = MultiPageRequester.get_chapter_sync(self.api, req, self.add_enter, progress)
+                    if chapter is not None:
+                        break
                     retry += 1
-                else:
+                    if retry < retry_count:
+                        MetricsTool.count('retries', api=get_api_label(self.api))
+                if chapter is None and progress.aborted:
                     break
-            MultiPageRequester.append_chapter(chapters, chapter)
+                MetricsTool.count('chapters' if chapter is not None else 'chapter_failures',
+                                  api=get_api_label(self.api))
+                progress.chapter_finished(chapter is not None)
+                if checkpoint is not None:
+                    checkpoint.save(req, chapter)
+                if fingerprints is not None and chapter is not None and chapter.content:
+                    fingerprints.set_hash(chapter.key, chapter.content)
+                MultiPageRequester.append_chapter(chapters, chapter, writer)
+        finally:
+            progress.finish()
         return chapters
 
-    def run_internal(self, catalogue, *, retry_count=20, chapter_range=None, headers=None, is_async=True):
+    @staticmethod
+    def select_chapters(reqs, chapter_range=None):
+        if chapter_range is None:
+            return reqs
+        chapter_range = set(chapter_range)
+        return [r for i, r in enumerate(reqs) if i in chapter_range]
+
+    def open_checkpoint(self, checkpoint):
+        """
+
+        Args:
+            checkpoint (str or ChapterCheckpoint, optional): the checkpoint or the path of its journal
+
+        Returns:
+            ChapterCheckpoint
+        """
+        if isinstance(checkpoint, str):
+            return ChapterCheckpoint.for_api(checkpoint, self.api)
+        return checkpoint
+
+    def run_internal(self, catalogue, *, retry_count=20, chapter_range=None, headers=None, is_async=True,
+                     checkpoint=None, writer=None, fingerprints=None):
         """
 
         Args:
@@ -239,17 +855,355 @@ class AsyncRequester(MultiPageRequester):
             chapter_range (list[int], optional): id starts from 0
             headers (dict, optional):
             is_async (bool, optional): whether to request asynchronously
+            checkpoint (str or ChapterCheckpoint, optional): journal of the completed chapters. \
+                                                             If provided, a rerun skips the chapters in it.
+            writer (BookWriter, optional): write chapters to the file once completed, \
+                                           and only keep their titles in memory.
+            fingerprints (str or FingerprintIndex, optional): record the content hashes and the validators of the
+                chapters, for a later ``update`` with ``recheck``, see ``open_fingerprints``. Saved.
 
         Returns:
             list[Chapter]
         """
-        reqs = self.api.get_chapter_list(catalogue)
-        n = len(reqs)
-        if chapter_range is None:
-            chapter_range = range(n)
-        chapter_range = set(chapter_range)
-        reqs = [r for i, r in enumerate(reqs) if i in chapter_range]
-
         if is_async:
-            return self.get_chapters_async(reqs, retry_count=retry_count, headers=headers)
-        return self.get_chapters(reqs, retry_count=retry_count)
+            # the catalogue is requested on the same event loop as the chapters
+            return asyncio.run(self.run_internal_async(catalogue, retry_count=retry_count, chapter_range=chapter_range,
+                                                       headers=headers, checkpoint=checkpoint, writer=writer,
+                                                       fingerprints=fingerprints))
+        with MetricsTool.span('catalogue', api=get_api_label(self.api)):
+            catalogue_reqs = self.api.get_chapter_list(catalogue)
+        reqs = AsyncRequester.select_chapters(catalogue_reqs, chapter_range)
+        checkpoint = self.open_checkpoint(checkpoint)
+        fingerprints = AsyncRequester.open_fingerprints(fingerprints)
+        try:
+            with RequestsTool.use_validators(fingerprints):
+                return self.get_chapters(reqs, retry_count=retry_count, checkpoint=checkpoint, writer=writer,
+                                         fingerprints=fingerprints)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+            if fingerprints is not None:
+                fingerprints.save()
+
+    async def run_internal_async(self, catalogue, *, retry_count=20, chapter_range=None, headers=None, session=None,
+                                 checkpoint=None, writer=None, fingerprints=None):
+        """Same as ``run_internal``, but on the running event loop
+
+        Args:
+            catalogue (CatalogueRequest):
+            retry_count (int):
+            chapter_range (list[int], optional): id starts from 0
+            headers (dict, optional): only used when ``session`` is not provided
+            session (aiohttp.ClientSession, optional): shared session, see ``create_session``
+            checkpoint (str or ChapterCheckpoint, optional): journal of the completed chapters
+            writer (BookWriter, optional): write chapters to the file once completed
+            fingerprints (str or FingerprintIndex, optional): record the content hashes and the validators
+
+        Returns:
+            list[Chapter]
+        """
+        if session is None:
+            async with self.create_session(headers) as session:
+                return await self.run_internal_async(catalogue, retry_count=retry_count, chapter_range=chapter_range,
+                                                     session=session, checkpoint=checkpoint, writer=writer,
+                                                     fingerprints=fingerprints)
+        with MetricsTool.span('catalogue', api=get_api_label(self.api)):
+            catalogue_reqs = await self.api.get_chapter_list_async(session, catalogue)
+        reqs = AsyncRequester.select_chapters(catalogue_reqs, chapter_range)
+        checkpoint = self.open_checkpoint(checkpoint)
+        fingerprints = AsyncRequester.open_fingerprints(fingerprints)
+        try:
+            with RequestsTool.use_validators(fingerprints):
+                return await self.fetch_chapters(reqs, retry_count=retry_count, session=session,
+                                                 checkpoint=checkpoint, writer=writer, fingerprints=fingerprints)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+            if fingerprints is not None:
+                fingerprints.save()
+
+    async def run_async(self, book_props=None, *args, **kwargs):
+        """Same as ``run``, but on the running event loop. To share one connection pool among books::
+
+            async with requester.create_session() as session:
+                for props, catalogue in books:
+                    book = await requester.run_async(props, catalogue, session=session)
+
+        Args:
+            book_props (dict or Book, optional): some constant attributes of ``Book``, e.g. preface.
+
+        Returns:
+            Book
+        """
+        book = book_props
+        if not isinstance(book, Book):
+            book = Book(**book_props)
+        book.chapters = await self.run_internal_async(*args, **kwargs)
+        MetricsTool.flush()
+        return book
+
+    @staticmethod
+    def diff_chapters(chapters, reqs, fingerprints=None):
+        """Match the chapters of a previous download to the requests of a fresh catalogue
+
+        The chapters are matched by ``Chapter.key`` if they have keys. Otherwise, e.g. read by ``Book.read_txt``,
+        they are matched by the titles of the requests if all the requests have titles, or else by position, assuming
+        that the catalogue only grows at the end. Empty chapters, e.g. failed ones, are never matched.
+
+        Args:
+            chapters (list[Chapter]): of the previous download
+            reqs (list[ChapterRequest]): of the fresh catalogue
+            fingerprints (FingerprintIndex, optional): the fingerprints of the chapters no longer in the catalogue
+                                                       are dropped from it
+
+        Returns:
+            2-tuple: ``(list[Chapter], list[int])``, the matched chapter of each request or None, and the indices \
+                     of the unmatched requests, i.e. the new or changed chapters
+        """
+        if fingerprints is not None:
+            n_pruned = fingerprints.prune(ChapterCheckpoint.identity(req) for req in reqs)
+            if n_pruned > 0:
+                logger.info(f"{n_pruned} fingerprints of the chapters no longer in the catalogue dropped")
+        chapters = [c for c in chapters if c.content]
+        if any(c.key for c in chapters):
+            keyed = {c.key: c for c in chapters if c.key}
+            matched = [keyed.get(ChapterCheckpoint.identity(req)) for req in reqs]
+        elif all(getattr(req, 'title', None) for req in reqs):
+            titled = {}
+            for c in chapters:
+                titled.setdefault((c.title or '').strip(), deque()).append(c)
+            matched = []
+            for req in reqs:
+                candidates = titled.get(req.title.strip())
+                matched.append(candidates.popleft() if candidates else None)
+        else:
+            logger.warning("Neither keys nor titles to match the chapters, matched by position")
+            matched = chapters[:len(reqs)] + [None] * max(0, len(reqs) - len(chapters))
+        return matched, [i for i, c in enumerate(matched) if c is None]
+
+    def update(self, book, catalogue, **kwargs):
+        return asyncio.run(self.update_async(book, catalogue, **kwargs))
+
+    @staticmethod
+    def open_fingerprints(fingerprints, book=None):
+        """
+
+        Args:
+            fingerprints (str or FingerprintIndex, optional): the index or its path. If None and ``book`` is a path,
+                use the index next to the book, see ``FingerprintIndex.for_book``.
+            book (Book or str, optional):
+
+        Returns:
+            FingerprintIndex: None if no index
+        """
+        if isinstance(fingerprints, str):
+            return FingerprintIndex(fingerprints)
+        if fingerprints is None and isinstance(book, str):
+            return FingerprintIndex.for_book(book)
+        return fingerprints
+
+    async def update_async(self, book, catalogue, *, retry_count=20, headers=None, session=None, checkpoint=None,
+                           recheck=False, fingerprints=None):
+        """Request only the chapters missing in a previous download, e.g. the new chapters of a serialized novel, and
+        merge them with the others in the order of the catalogue. Chapters no longer in the catalogue are dropped.
+        See ``diff_chapters`` for how the chapters are matched.
+
+        With ``recheck``, the kept chapters are requested again to catch the revised ones. Their first page is
+        requested with the ``ETag`` and ``Last-Modified`` stored in the fingerprint index, and a 304 reuses the kept
+        chapter without downloading or parsing it. The content hashes in the index tell which chapters changed.
+
+        Usage::
+
+            book = requester.update('book.json', catalogue, recheck=True)
+            book.to_json('book.json')
+
+        Args:
+            book (Book or str): the previous download, or its file, see ``Book.read``
+            catalogue (CatalogueRequest):
+            retry_count (int):
+            headers (dict, optional): only used when ``session`` is not provided
+            session (aiohttp.ClientSession, optional): shared session, see ``create_session``
+            checkpoint (str or ChapterCheckpoint, optional): journal of the newly completed chapters
+            recheck (bool, optional): whether to request the kept chapters again
+            fingerprints (str or FingerprintIndex, optional): see ``open_fingerprints``. Updated and saved.
+
+        Returns:
+            Book: ``book`` with the merged chapters
+        """
+        if session is None:
+            async with self.create_session(headers) as session:
+                return await self.update_async(book, catalogue, retry_count=retry_count, session=session,
+                                               checkpoint=checkpoint, recheck=recheck, fingerprints=fingerprints)
+        fingerprints = AsyncRequester.open_fingerprints(fingerprints, book)
+        if isinstance(book, str):
+            book = Book.read(book)
+        with MetricsTool.span('catalogue', api=get_api_label(self.api)):
+            reqs = await self.api.get_chapter_list_async(session, catalogue)
+        matched, missing = AsyncRequester.diff_chapters(book.chapters, reqs, fingerprints)
+        # the empty chapters, e.g. failed ones, are never matched, but they are requested again rather than dropped
+        kept = {id(c) for c in matched if c is not None}
+        n_dropped = sum(1 for c in book.chapters if c.content and id(c) not in kept)
+        todo = list(range(len(reqs))) if recheck else missing
+        logger.info(f"{len(reqs) - len(missing)} chapters kept, {len(missing)} missing, {len(todo)} to request, "
+                    f"{n_dropped} dropped")
+        previous = {j: matched[i] for j, i in enumerate(todo) if matched[i] is not None}
+        checkpoint = self.open_checkpoint(checkpoint)
+        try:
+            with RequestsTool.use_validators(fingerprints):
+                fetched = await self.fetch_chapters([reqs[i] for i in todo], retry_count=retry_count,
+                                                    session=session, checkpoint=checkpoint, previous=previous)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        changed = []
+        for i, chapter in zip(todo, fetched):
+            if matched[i] is None:
+                matched[i] = chapter
+            elif chapter.content:
+                # a failed recheck keeps the previous version
+                key = ChapterCheckpoint.identity(reqs[i])
+                old_hash = fingerprints.get_hash(key) if fingerprints is not None else None
+                if (old_hash or FingerprintIndex.hash(matched[i].content)) != FingerprintIndex.hash(chapter.content):
+                    changed.append(i)
+                matched[i] = chapter
+        for i, (chapter, req) in enumerate(zip(matched, reqs)):
+            chapter.id = i
+            chapter.key = ChapterCheckpoint.identity(req)
+            if fingerprints is not None and chapter.content:
+                fingerprints.set_hash(chapter.key, chapter.content)
+        book.chapters = matched
+        if recheck:
+            logger.info(f"{len(changed)} chapters changed: {[i + 1 for i in changed]}")
+        if fingerprints is not None:
+            fingerprints.save()
+        MetricsTool.flush()
+        return book
+
+
+class BatchRequester:
+    """Download many books on one event loop and one connection pool
+
+    The catalogues and chapters of different books overlap, while the budget is shared by all the books: the total
+    number of connections, the connections to one host, and the request rate to one host.
+    """
+
+    def __init__(self, max_books=4, max_concurrency=32, max_per_host=8, rate_per_host=None, retry_count=20,
+                 observers=None, book_concurrency=None, **kwargs):
+        """
+
+        Args:
+            max_books (int, optional): max number of books requested at the same time
+            max_concurrency (int, optional): max number of connections of all the books
+            max_per_host (int, optional): max number of connections to one host of all the books
+            rate_per_host (float, optional): max requests per second to one host of all the books. No limit if None. \
+                                             Not allowed with ``RequestsTool.set_limiter``, which limits them already.
+            retry_count (int, optional): max number of retries of one page
+            observers (list, optional): watch the progress of every book, see ``BookRequester.add_observer``. \
+                                        ``Progress.label`` is ``"<namespace> #<index of the book + 1>"``.
+            book_concurrency (int, optional): max number of pages of one book requested at the same time. Defaults
+                to ``max_concurrency``, since the shared connector enforces ``max_concurrency`` and ``max_per_host``
+                over all the books anyway.
+            **kwargs: other arguments of ``AsyncRequester``, e.g. ``add_enter``
+        """
+        self.max_books = max_books
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.book_concurrency = book_concurrency or max_concurrency
+        self.limiter = RateLimiter(rate_per_host) if rate_per_host else None
+        self.retry_count = retry_count
+        self.requester_kwargs = kwargs
+        self.observers = list(observers or [])
+        self.apis = {}
+        self.requesters = {}
+        """Index of a started book -> its requester, e.g. for ``requesters[0].progress`` or ``requesters[0].abort()``"""
+
+    def get_api(self, api):
+        """One API instance per namespace, shared by the books of it
+
+        Args:
+            api (str or RequestApi): namespace of the API, e.g. ``"JJWXC"``, or the API itself
+
+        Returns:
+            RequestApi
+        """
+        if not isinstance(api, str):
+            return api
+        if api not in self.apis:
+            self.apis[api] = RequestApi[api]()
+        return self.apis[api]
+
+    def create_session(self, headers=None):
+        """The session shared by all the books, see ``create_session``
+
+        Args:
+            headers (dict, optional):
+
+        Returns:
+            aiohttp.ClientSession
+        """
+        # the global limiter also applies to the requests of the session, so each request would be throttled twice
+        if self.limiter is not None and RequestsTool.limiter is not None:
+            raise ValueError("`rate_per_host` of BatchRequester and `RequestsTool.set_limiter` cannot be combined")
+        return create_session(self.max_concurrency, self.max_per_host, headers, self.limiter)
+
+    async def run_book(self, session, api, catalogue, book_props=None, *, index=None):
+        """
+
+        Args:
+            session (aiohttp.ClientSession):
+            api (str or RequestApi):
+            catalogue (CatalogueRequest):
+            book_props (dict or Book, optional):
+            index (int, optional): index of the book, to label its progress and keep its requester
+
+        Returns:
+            Book
+        """
+        requester = AsyncRequester(self.get_api(api), max_concurrency=self.book_concurrency,
+                                   max_per_host=self.max_per_host, observers=self.observers, **self.requester_kwargs)
+        if index is not None:
+            requester.label = f"{get_api_label(requester.api)} #{index + 1}"
+            self.requesters[index] = requester
+        return await requester.run_async(book_props or {}, catalogue, retry_count=self.retry_count, session=session)
+
+    def abort(self, reason=None):
+        """Stop all the started books, see ``ProgressTracker.abort``"""
+        for requester in list(self.requesters.values()):
+            requester.abort(reason)
+
+    async def run_async(self, books, headers=None):
+        """
+
+        Args:
+            books (list[tuple]): ``(api, catalogue)`` or ``(api, catalogue, book_props)`` of each book, \
+                                 see ``run_book``
+            headers (dict, optional):
+
+        Returns:
+            list: the ``Book`` of each book, or the exception if it failed
+        """
+        semaphore = asyncio.Semaphore(self.max_books)
+        total = len(books)
+        n_done = 0
+
+        async def _run(index, book):
+            nonlocal n_done
+            async with semaphore:
+                logger.info(f"Book {index + 1}/{total} started: {book[1]}")
+                try:
+                    result = await self.run_book(session, *book, index=index)
+                    failed = sum(1 for c in result.chapters if not c.content)
+                    status = f"{len(result.chapters)} chapters, {failed} empty"
+                except Exception as e:
+                    logger.debug(traceback.format_exc())
+                    result, status = e, f"failed: {e}"
+                n_done += 1
+                logger.info(f"Book {index + 1}/{total} {status}. {n_done}/{total} books done")
+                return result
+
+        self.requesters = {}
+        async with self.create_session(headers) as session:
+            return await asyncio.gather(*[_run(i, book) for i, book in enumerate(books)])
+
+    def run(self, books, headers=None):
+        return asyncio.run(self.run_async(books, headers))
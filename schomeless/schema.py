@@ -1,10 +1,11 @@
 import json
 import logging
-from dataclasses import dataclass
+import os.path
+from dataclasses import dataclass, field
 from difflib import SequenceMatcher
 from typing import List, Optional
 
-from schomeless.utils import DataClassExtension, EncodingTool
+from schomeless.utils import DataClassExtension, EncodingTool, MetricsTool
 
 __all__ = [
     'Book',
@@ -25,6 +26,8 @@ class Chapter(DataClassExtension):
     title: Optional[str] = None
     content: str = ''
     id: Optional[int] = None
+    key: Optional[str] = field(default=None, compare=False)
+    """Identity of the request of the chapter, see ``ChapterCheckpoint.identity``. Used to update the book."""
 
     @staticmethod
     def cleaned_content(text):
@@ -94,19 +97,28 @@ class Book(DataClassExtension):
             else:
                 for i, chap in enumerate(self.chapters):
                     chap.id = i
-        with open(file_path, 'w') as fobj:
+        with MetricsTool.span('write'), open(file_path, 'w') as fobj:
             fobj.write(preface_format.format(book=self) + "\n\n")
             for chapter in self.chapters:
-                title = f"第{self.start_chapter + chapter.id}章 {chapter.title}"
-                L = len(chapter.content)
-                if L < MAYBE_ERROR_THRESHOLD:
-                    logger.warning(f"Maybe invalid chapter:\nTitle: {title}, Content: {chapter.content}")
-                fobj.write(f"{title}\n\n")
-                fobj.write(chapter.content.strip())
-                fobj.write('\n\n\n')
+                fobj.write(self.chapter_to_txt(chapter))
+
+    def chapter_to_txt(self, chapter):
+        """The text of one chapter in the TXT file
+
+        Args:
+            chapter (Chapter):
+
+        Returns:
+            str
+        """
+        title = f"第{self.start_chapter + chapter.id}章 {chapter.title}"
+        L = len(chapter.content)
+        if L < MAYBE_ERROR_THRESHOLD:
+            logger.warning(f"Maybe invalid chapter:\nTitle: {title}, Content: {chapter.content}")
+        return f"{title}\n\n{chapter.content.strip()}\n\n\n"
 
     def to_json(self, json_path):
-        with open(json_path, 'w') as f:
+        with MetricsTool.span('write'), open(json_path, 'w') as f:
             json.dump(self._asdict(), f)
 
     def clean_chapter_id(self):
@@ -117,6 +129,16 @@ class Book(DataClassExtension):
 
     @staticmethod
     def read_txt(file_path, parse_preface=_default_parse_preface):
+        """Read a book written by ``to_txt``. The title and content of every chapter, the last one included, are
+        stripped, so that a TXT round-trip gives back the chapters.
+
+        Args:
+            file_path (str):
+            parse_preface (callable, optional): ``Book`` -> None, parse e.g. the name and author from the preface
+
+        Returns:
+            Book
+        """
         book = Book()
         chapter = None
         with open(file_path, 'r') as fobj:
@@ -134,11 +156,27 @@ class Book(DataClassExtension):
                 else:
                     book.preface += line
         if chapter and chapter.title:
+            chapter.title = chapter.title.strip()
+            chapter.content = chapter.content.strip()
             book.chapters.append(chapter)
         book.clean_chapter_id()
         parse_preface(book)
         return book
 
+    @staticmethod
+    def read(file_path):
+        """Choose the reader by the file extension
+
+        Args:
+            file_path (str): ``*.json`` for ``read_json``, otherwise ``read_txt``
+
+        Returns:
+            Book
+        """
+        if os.path.splitext(file_path)[1].lower() == '.json':
+            return Book.read_json(file_path)
+        return Book.read_txt(file_path)
+
     @staticmethod
     def read_json(json_path):
         with open(json_path, 'r') as f:
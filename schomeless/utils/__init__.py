@@ -1,2 +1,7 @@
 from .base_class import *
 from .util import *
+from .cache import *
+from .crypto import *
+from .selector import *
+from .limiter import *
+from .metrics import *
@@ -107,6 +107,14 @@ class DataClassExtension:
     def __str__(self):
         return str(self.__dict__())
 
+    def __getstate__(self):
+        # ``__dict__`` is overridden above, so pickle the fields explicitly
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            object.__setattr__(self, key, value)
+
     def update(self, new):
         for key, value in new.items():
             if hasattr(self, key):
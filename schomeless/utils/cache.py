@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .util import FileSysTool, RequestsTool
+
+__all__ = [
+    'ResponseCache'
+]
+
+
+class ResponseCache:
+    """Disk-backed cache of HTTP responses, used by ``RequestsTool`` once set by ``RequestsTool.set_cache``.
+
+    Responses are keyed on method, URL, params and body. The TTL of a response is decided by the longest URL
+    prefix in ``ttls``, e.g. long for chapter content and short for catalogues. When the total size exceeds
+    ``max_size``, the least recently used responses are evicted.
+
+    SQLite blocks, so the async requests use ``get_async`` and ``set_async``, which run in a thread of the cache.
+    """
+    logger = logging.getLogger('ResponseCache')
+
+    def __init__(self, file_path, *, default_ttl=3600, ttls=None, max_size=512 * 1024 * 1024):
+        """
+
+        Args:
+            file_path (str): path of the SQLite database
+            default_ttl (float, optional): seconds to keep a response if no prefix in ``ttls`` matches its URL
+            ttls (dict[str, float], optional): URL prefix -> seconds to keep a response. ``0`` to disable caching.
+            max_size (int, optional): max total size of the cached bodies in bytes
+        """
+        self.file_path = file_path
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ResponseCache')
+        """Runs the queries of the async requests, one at a time as they are serialized by the lock anyway"""
+        FileSysTool.enable_path(file_path)
+        self.conn = sqlite3.connect(file_path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                          'key TEXT PRIMARY KEY, url TEXT, expires REAL, accessed REAL, size INTEGER, '
+                          'text TEXT, headers TEXT)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_expires ON responses (expires)')
+        self.conn.commit()
+
+    def set_ttl(self, url_prefix, ttl):
+        """
+
+        Args:
+            url_prefix (str): e.g. ``FqNovelApi.CHAPTER_APP_API``
+            ttl (float): seconds. ``0`` to disable caching.
+        """
+        self.ttls[url_prefix] = ttl
+
+    def get_ttl(self, url):
+        matched = [prefix for prefix in self.ttls if url.startswith(prefix)]
+        if len(matched) == 0:
+            return self.default_ttl
+        return self.ttls[max(matched, key=len)]
+
+    @staticmethod
+    def key(method, url, request_kwargs=None):
+        """
+
+        Args:
+            method (str):
+            url (str):
+            request_kwargs (dict, optional): only ``params``, ``data`` and ``json`` are used
+
+        Returns:
+            str
+        """
+        return RequestsTool.request_key(method, url, request_kwargs)
+
+    def get(self, key):
+        """
+
+        Args:
+            key (str):
+
+        Returns:
+            2-tuple: ``(str, dict)``, the text and headers of the response. None if not cached or expired.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT expires, text, headers FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] < now:
+                if row is not None:
+                    self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return row[1], json.loads(row[2])
+
+    async def get_async(self, key):
+        """Same as ``get``, without blocking the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.get, key)
+
+    def set(self, key, url, text, headers=None):
+        """
+
+        Args:
+            key (str):
+            url (str):
+            text (str): the decoded body
+            headers (dict, optional):
+        """
+        ttl = self.get_ttl(url)
+        if ttl <= 0:
+            return
+        now = time.time()
+        headers = json.dumps(dict(headers or {}))
+        size = len(text.encode('utf-8')) + len(headers)
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (key, url, now + ttl, now, size, text, headers))
+            self.evict()
+            self.conn.commit()
+
+    async def set_async(self, key, url, text, headers=None):
+        """Same as ``set``, without blocking the event loop"""
+        headers = dict(headers or {})
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.set, key, url, text, headers)
+
+    def evict(self):
+        """Drop expired responses, then the least recently used ones until the size fits ``max_size``"""
+        self.conn.execute('DELETE FROM responses WHERE expires < ?', (time.time(),))
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_size:
+            return
+        for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall():
+            self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_size:
+                break
+        self.logger.debug(f"{self.evictions} responses evicted in total")
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM responses')
+            self.conn.commit()
+
+    def stats(self):
+        """
+
+        Returns:
+            dict: hits, misses, evictions, number of entries and total size in bytes
+        """
+        with self.lock:
+            entries, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, entries=entries, size=size)
+
+    def close(self):
+        self.executor.shutdown()
+        self.conn.close()
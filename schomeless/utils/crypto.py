@@ -0,0 +1,108 @@
+import base64
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from Crypto.Cipher import AES, DES
+from Crypto.Util.Padding import unpad
+
+from .metrics import MetricsTool
+
+__all__ = [
+    'CryptoTool'
+]
+
+
+class CryptoTool:
+    """Decryption helpers working on bytes end to end.
+
+    CBC cipher objects are stateful, so one is still created per message. What is cached is everything around it,
+    e.g. the encoded hardcoded keys.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def to_bytes(key, encoding='utf-8'):
+        """Encode a key or IV, cached for the hardcoded ones
+
+        Args:
+            key (str or bytes):
+            encoding (str, optional):
+
+        Returns:
+            bytes
+        """
+        if isinstance(key, bytes):
+            return key
+        return key.encode(encoding)
+
+    @staticmethod
+    def md5_prefix(s, length=8, encoding='utf-8'):
+        """The first ``length`` hex digits of the MD5 of ``s``"""
+        return hashlib.md5(s.encode(encoding)).hexdigest()[:length]
+
+    @staticmethod
+    def b64decode(data):
+        """
+
+        Args:
+            data (str or bytes):
+
+        Returns:
+            bytes
+        """
+        return base64.b64decode(data)
+
+    @staticmethod
+    def des_cbc_decrypt(data, key, iv):
+        """
+
+        Args:
+            data (bytes): the encrypted bytes, padded in PKCS#7
+            key (str or bytes):
+            iv (str or bytes):
+
+        Returns:
+            bytes: unpadded
+        """
+        with MetricsTool.span('decrypt'):
+            des = DES.new(CryptoTool.to_bytes(key), DES.MODE_CBC, CryptoTool.to_bytes(iv))
+            return unpad(des.decrypt(data), DES.block_size)
+
+    @staticmethod
+    def aes_cbc_decrypt(data, key, iv):
+        """
+
+        Args:
+            data (bytes): the encrypted bytes
+            key (str or bytes):
+            iv (str or bytes):
+
+        Returns:
+            bytes: not unpadded
+        """
+        with MetricsTool.span('decrypt'):
+            aes = AES.new(CryptoTool.to_bytes(key), AES.MODE_CBC, CryptoTool.to_bytes(iv))
+            return aes.decrypt(data)
+
+    @staticmethod
+    def map(func, items, processes=None, chunksize=16):
+        """Decrypt a batch of chapters
+
+        Args:
+            func (callable): a picklable function, e.g. a static method of an API class
+            items (list): arguments of ``func``, each item is a tuple of positional arguments
+            processes (int, optional): if provided, decrypt in a pool of processes. Otherwise, in this process.
+            chunksize (int, optional): number of items sent to a process at once
+
+        Returns:
+            list
+        """
+        if not processes:
+            return [func(*item) for item in items]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(_star_call, [func] * len(items), items, chunksize=chunksize))
+
+
+def _star_call(func, item):
+    return func(*item)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import threading
+import time
+
+import aiohttp
+
+from .util import RequestsTool
+
+__all__ = [
+    'RateLimiter'
+]
+
+THROTTLED_STATUS = {429, 503}
+"""Status codes meaning the server asks to slow down"""
+
+
+class RateLimiter:
+    """Token bucket of each host, shared by all the requests to it.
+
+    A request takes one token, and the tokens are refilled at the rate of the host per second up to ``burst``. When
+    there is no token left, the request reserves a future one and waits until then, so the waiting requests go in
+    order.
+
+    If ``adaptive``, the rate of a host is multiplied by ``decrease`` on 429/503, and by ``increase`` after
+    ``success_run`` successful responses in a row, so that it settles around the fastest rate the host tolerates.
+    """
+    logger = logging.getLogger('RateLimiter')
+
+    def __init__(self, rate, burst=None, *, rates=None, adaptive=False, min_rate=0.2, max_rate=None, decrease=0.5,
+                 increase=1.2, success_run=20):
+        """
+
+        Args:
+            rate (float): default max requests per second to one host
+            burst (int, optional): max number of requests sent at once after idling. Defaults to the rate.
+            rates (dict[str, float], optional): domain name -> rate, e.g. ``{"app.jjwxc.org": 5}``
+            adaptive (bool, optional): whether to adjust the rates by the responses, see ``feedback``
+            min_rate (float, optional): lower bound of an adapted rate
+            max_rate (float, optional): upper bound of an adapted rate. No bound if None.
+            decrease (float, optional): factor of the rate when throttled
+            increase (float, optional): factor of the rate after ``success_run`` successes
+            success_run (int, optional):
+        """
+        self.rate = rate
+        self.burst = burst
+        self.rates = dict(rates or {})
+        self.adaptive = adaptive
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.success_run = success_run
+        self.buckets = {}
+        """host -> ``(tokens, last update)``"""
+        self.successes = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _host(host):
+        """The domain name of a URL, or the domain name itself"""
+        return RequestsTool.get_domain_name(host) if '://' in host else host
+
+    def get_rate(self, host):
+        return self.rates.get(self._host(host), self.rate)
+
+    def get_burst(self, host):
+        return self.burst if self.burst is not None else max(1., self.get_rate(host))
+
+    def reserve(self, host):
+        """Take one token of the host
+
+        Args:
+            host (str): domain name, or a URL
+
+        Returns:
+            float: seconds to wait before sending the request
+        """
+        host = self._host(host)
+        with self.lock:
+            now = time.monotonic()
+            rate, burst = self.get_rate(host), self.get_burst(host)
+            tokens, updated = self.buckets.get(host, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate) - 1
+            self.buckets[host] = (tokens, now)
+        return 0. if tokens >= 0 else -tokens / rate
+
+    def acquire(self, host):
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, host):
+        delay = self.reserve(host)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def feedback(self, host, status, retry_after=None):
+        """Adapt the rate of the host to a response
+
+        Args:
+            host (str): domain name, or a URL
+            status (int): status code of the response
+            retry_after (float, optional): seconds the server asked to wait. No token is given until then.
+        """
+        host = self._host(host)
+        with self.lock:
+            if retry_after:
+                # refill up to now first, otherwise the next ``reserve`` refills the idle time over the wait
+                now = time.monotonic()
+                rate, burst = self.get_rate(host), self.get_burst(host)
+                tokens, updated = self.buckets.get(host, (burst, now))
+                tokens = min(burst, tokens + (now - updated) * rate)
+                self.buckets[host] = (min(tokens, -retry_after * rate), now)
+            if not self.adaptive:
+                return
+            rate = self.get_rate(host)
+            if status in THROTTLED_STATUS:
+                self.successes[host] = 0
+                new_rate = max(self.min_rate, rate * self.decrease)
+            elif status < 400:
+                self.successes[host] = self.successes.get(host, 0) + 1
+                if self.successes[host] < self.success_run:
+                    return
+                self.successes[host] = 0
+                new_rate = rate * self.increase
+                if self.max_rate is not None:
+                    new_rate = min(self.max_rate, new_rate)
+            else:
+                return
+            if new_rate != rate:
+                self.logger.debug(f"Rate of {host}: {rate:.2f} -> {new_rate:.2f}/s")
+                self.rates[host] = new_rate
+
+    def trace_config(self):
+        """Apply the limit to every request of an ``aiohttp.ClientSession``::
+
+            aiohttp.ClientSession(trace_configs=[limiter.trace_config()])
+
+        Returns:
+            aiohttp.TraceConfig
+        """
+
+        async def on_request_start(session, context, params):
+            await self.acquire_async(str(params.url))
+
+        async def on_request_end(session, context, params):
+            self.feedback(str(params.url), params.response.status)
+
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(on_request_start)
+        config.on_request_end.append(on_request_end)
+        return config
@@ -0,0 +1,401 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import List
+
+import aiohttp
+
+__all__ = [
+    'Metrics',
+    'MetricsTool',
+    'MetricsSink',
+    'HistogramSink',
+    'JsonlSink',
+    'PrometheusSink'
+]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30.)
+"""Upper bounds in seconds of the histogram buckets"""
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+class MetricsSink:
+    """Receiver of the measurements of ``Metrics``. The methods may be called from any thread."""
+
+    def observe(self, name, value, labels):
+        """
+
+        Args:
+            name (str): stage, e.g. ``"parse"``
+            value (float): seconds
+            labels (dict): e.g. ``{"host": "app.jjwxc.org"}``
+        """
+        pass
+
+    def count(self, name, value, labels):
+        """
+
+        Args:
+            name (str): e.g. ``"retries"``
+            value (int):
+            labels (dict):
+        """
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+@dataclass
+class _Histogram:
+    buckets: tuple
+    counts: List[int] = field(default_factory=list)
+    count: int = 0
+    sum: float = 0.
+    max: float = 0.
+
+    def __post_init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Upper bound of the bucket of the ``q``-th percentile, or the max if in the last bucket"""
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class HistogramSink(MetricsSink):
+    """Keep a histogram of each stage and the sum of each counter in memory, per set of labels"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+
+        Args:
+            buckets (tuple[float], optional): ascending upper bounds in seconds
+        """
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        """``(name, labels)`` -> ``_Histogram``"""
+        self.counters = {}
+        """``(name, labels)`` -> sum"""
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram(self.buckets)
+            histogram.add(value)
+
+    def count(self, name, value, labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self):
+        """
+
+        Returns:
+            dict: ``{"stages": [...], "counters": [...]}``, each item has the name and labels, and the stages have
+                  ``count``, ``sum``, ``mean``, ``p50``, ``p99`` and ``max`` in seconds
+        """
+        with self.lock:
+            stages = [dict(name=name, labels=dict(labels), count=h.count, sum=h.sum, mean=h.sum / h.count,
+                           p50=h.percentile(50), p99=h.percentile(99), max=h.max)
+                      for (name, labels), h in sorted(self.histograms.items())]
+            counters = [dict(name=name, labels=dict(labels), value=value)
+                        for (name, labels), value in sorted(self.counters.items())]
+        return dict(stages=stages, counters=counters)
+
+    def report(self):
+        """
+
+        Returns:
+            str: a table of the stages followed by the counters
+        """
+        summary = self.summary()
+        lines = [f"{'stage':<12} {'labels':<32} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>8} "
+                 f"{'p99 ms':>8} {'max ms':>8}"]
+        for s in summary['stages']:
+            labels = ','.join(f'{k}={v}' for k, v in s['labels'].items())
+            lines.append(f"{s['name']:<12} {labels:<32} {s['count']:>7} {s['sum']:>9.3f} {s['mean'] * 1000:>9.2f} "
+                         f"{s['p50'] * 1000:>8.2f} {s['p99'] * 1000:>8.2f} {s['max'] * 1000:>8.2f}")
+        for c in summary['counters']:
+            labels = ','.join(f'{k}={v}' for k, v in c['labels'].items())
+            lines.append(f"{c['name']:<12} {labels:<32} {c['value']:>7}")
+        return '\n'.join(lines)
+
+
+class JsonlSink(MetricsSink):
+    """Append each measurement to a file as one JSON line, e.g.
+    ``{"time": 1700000000.1, "type": "observe", "name": "parse", "value": 0.0012, "labels": {"host": "..."}}``
+    """
+
+    def __init__(self, file_path):
+        """
+
+        Args:
+            file_path (str):
+        """
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.fobj = None
+
+    def write(self, type, name, value, labels):
+        line = json.dumps(dict(time=time.time(), type=type, name=name, value=value,
+                               labels={k: v for k, v in labels.items() if v is not None}), ensure_ascii=False)
+        with self.lock:
+            if self.fobj is None:
+                self.fobj = open(self.file_path, 'a', encoding='utf-8')
+            self.fobj.write(line + '\n')
+
+    def observe(self, name, value, labels):
+        self.write('observe', name, value, labels)
+
+    def count(self, name, value, labels):
+        self.write('count', name, value, labels)
+
+    def flush(self):
+        with self.lock:
+            if self.fobj is not None:
+                self.fobj.flush()
+
+    def close(self):
+        with self.lock:
+            if self.fobj is not None:
+                self.fobj.close()
+                self.fobj = None
+
+
+class PrometheusSink(HistogramSink):
+    """Write the histograms and counters in the Prometheus text format on ``flush``, e.g. for the textfile
+    collector of node_exporter. The file is replaced at once, so a scrape never sees a partial file.
+    """
+
+    def __init__(self, file_path, prefix='schomeless', buckets=DEFAULT_BUCKETS):
+        """
+
+        Args:
+            file_path (str): e.g. ``"/var/lib/node_exporter/schomeless.prom"``
+            prefix (str, optional): prefix of the metric names
+            buckets (tuple[float], optional):
+        """
+        super().__init__(buckets)
+        self.file_path = file_path
+        self.prefix = prefix
+
+    @staticmethod
+    def format_labels(labels, **extra):
+        items = list(labels) + list(extra.items())
+        if len(items) == 0:
+            return ''
+        escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+        return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+    def to_text(self):
+        """
+
+        Returns:
+            str
+        """
+        lines = []
+        typed = set()
+        with self.lock:
+            for (name, labels), h in sorted(self.histograms.items()):
+                metric = f'{self.prefix}_{name}_seconds'
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f'# TYPE {metric} histogram')
+                cumulative = 0
+                for bound, n in zip(self.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{self.format_labels(labels, le=repr(bound))} {cumulative}')
+                lines.append(f'{metric}_bucket{self.format_labels(labels, le="+Inf")} {h.count}')
+                lines.append(f'{metric}_sum{self.format_labels(labels)} {h.sum}')
+                lines.append(f'{metric}_count{self.format_labels(labels)} {h.count}')
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f'{self.prefix}_{name}_total'
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f'# TYPE {metric} counter')
+                lines.append(f'{metric}{self.format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        temp_path = f'{self.file_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as fobj:
+            fobj.write(self.to_text())
+        os.replace(temp_path, self.file_path)
+
+
+class Metrics:
+    """Timings of the stages of the requests and counters of the events, dispatched to the sinks
+
+    Stages, in seconds:
+
+    * ``throttle``: waiting for the ``RateLimiter``
+    * ``dns``, ``connect``: resolving a host and opening a connection (TLS included), async requests only
+    * ``first_byte``: from sending a request to receiving the response headers
+    * ``body``: reading the response body
+    * ``decode``, ``parse``, ``decrypt``: bytes to ``str``, text to a tree or JSON, and decryption
+    * ``page``: one chapter page, all the above included
+    * ``catalogue``: the chapter list
+    * ``write``: writing chapters to a file
+
+    Counters: ``responses`` (with the status), ``bytes``, ``cache_hits``, ``cache_misses``, ``not_modified``,
+    ``connections``, ``reused_connections``, ``retries``, ``page_failures``, ``chapter_failures`` and ``chapters``.
+
+    Usage::
+
+        histogram = HistogramSink()
+        MetricsTool.set_metrics(Metrics([histogram, JsonlSink('metrics.jsonl')]))
+        book = requester.run(book_props, catalogue)
+        print(histogram.report())
+    """
+    logger = logging.getLogger('Metrics')
+
+    def __init__(self, sinks=None):
+        """
+
+        Args:
+            sinks (list[MetricsSink], optional):
+        """
+        self.sinks = list(sinks or [])
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def observe(self, name, value, **labels):
+        for sink in self.sinks:
+            sink.observe(name, value, labels)
+
+    def count(self, name, value=1, **labels):
+        for sink in self.sinks:
+            sink.count(name, value, labels)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Observe the seconds spent in the block, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class MetricsTool:
+    """Entry of the instrumentation of the whole package. Nothing is measured until ``set_metrics``."""
+    metrics = None
+    """Metrics, see ``set_metrics``"""
+    NULL_SPAN = nullcontext()
+
+    @classmethod
+    def set_metrics(cls, metrics):
+        """Measure all requests, sync or async, and the requesters
+
+        Args:
+            metrics (Metrics, optional): None to disable measuring
+        """
+        cls.metrics = metrics
+
+    @classmethod
+    def span(cls, name, **labels):
+        """``Metrics.span`` if enabled, otherwise a no-op context"""
+        metrics = cls.metrics
+        if metrics is None:
+            return cls.NULL_SPAN
+        return metrics.span(name, **labels)
+
+    @classmethod
+    def observe(cls, name, value, **labels):
+        metrics = cls.metrics
+        if metrics is not None:
+            metrics.observe(name, value, **labels)
+
+    @classmethod
+    def count(cls, name, value=1, **labels):
+        metrics = cls.metrics
+        if metrics is not None:
+            metrics.count(name, value, **labels)
+
+    @classmethod
+    def flush(cls):
+        metrics = cls.metrics
+        if metrics is not None:
+            metrics.flush()
+
+    @classmethod
+    def trace_config(cls):
+        """Measure the connections of an ``aiohttp.ClientSession``, which are out of reach of ``RequestsTool``::
+
+            aiohttp.ClientSession(trace_configs=[MetricsTool.trace_config()])
+
+        Returns:
+            aiohttp.TraceConfig
+        """
+
+        async def on_request_start(session, context, params):
+            context.host = params.url.raw_authority
+            context.start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            cls.observe('first_byte', time.perf_counter() - context.start, host=context.host)
+
+        async def on_dns_resolvehost_start(session, context, params):
+            context.dns_start = time.perf_counter()
+
+        async def on_dns_resolvehost_end(session, context, params):
+            cls.observe('dns', time.perf_counter() - context.dns_start, host=params.host)
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            cls.observe('connect', time.perf_counter() - context.connect_start, host=context.host)
+            cls.count('connections', host=context.host)
+
+        async def on_connection_reuseconn(session, context, params):
+            cls.count('reused_connections', host=context.host)
+
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(on_request_start)
+        config.on_request_end.append(on_request_end)
+        config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        config.on_connection_create_start.append(on_connection_create_start)
+        config.on_connection_create_end.append(on_connection_create_end)
+        config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return config
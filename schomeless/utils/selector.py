@@ -0,0 +1,66 @@
+from functools import lru_cache
+
+from lxml import etree
+from pyquery import PyQuery
+from pyquery.cssselectpatch import JQueryTranslator
+
+__all__ = [
+    'SelectorTool'
+]
+
+
+class SelectorTool:
+    """CSS selectors compiled to ``lxml.etree.XPath`` once, instead of being translated by ``PyQuery`` on each call.
+
+    The translation is the same as ``PyQuery``'s, so the jQuery extensions, e.g. ``:first``, keep their meaning.
+    """
+    translator = JQueryTranslator(xhtml=False)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def compile(selector):
+        """
+
+        Args:
+            selector (str): CSS selector
+
+        Returns:
+            lxml.etree.XPath
+        """
+        selector = selector.replace('[@', '[')
+        return etree.XPath(SelectorTool.translator.css_to_xpath(selector, 'descendant-or-self::'))
+
+    @staticmethod
+    def findall(d, selector):
+        """Same as ``select``, but the plain elements without the ``PyQuery`` wrapper, for the hot paths
+
+        Args:
+            d (PyQuery or lxml.etree.Element):
+            selector (str or lxml.etree.XPath):
+
+        Returns:
+            list[lxml.etree.Element]
+        """
+        xpath = SelectorTool.compile(selector) if isinstance(selector, str) else selector
+        if isinstance(d, PyQuery):
+            elements = []
+            for root in d:
+                elements.extend(xpath(root))
+            return elements
+        return xpath(d)
+
+    @staticmethod
+    def select(d, selector):
+        """Same as ``d(selector)``
+
+        Args:
+            d (PyQuery or lxml.etree.Element):
+            selector (str or lxml.etree.XPath):
+
+        Returns:
+            PyQuery
+        """
+        elements = SelectorTool.findall(d, selector)
+        if isinstance(d, PyQuery):
+            return PyQuery(elements, parent=d)
+        return PyQuery(elements)
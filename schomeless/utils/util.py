@@ -1,22 +1,43 @@
+import asyncio
+import codecs
+import contextvars
 import hashlib
 import json
 import logging
 import os.path
 import re
-from dataclasses import dataclass
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from queue import Empty, Full, LifoQueue
+from email.utils import parsedate_to_datetime
+from io import BytesIO
 from shutil import rmtree
+from typing import Optional
 from urllib.parse import urlparse, quote, parse_qs
 
 import cchardet
 import requests
-from lxml import html
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from lxml import html, etree
 from pyquery import PyQuery as pq
 
+from .metrics import MetricsTool
+
 __all__ = [
     'LogTool',
     'RequestsTool',
     'FileSysTool',
-    'EncodingTool'
+    'EncodingTool',
+    'RequestCoalescer',
+    'RawResponse',
+    'SessionPool',
+    'NotModifiedError'
 ]
 
 
@@ -52,8 +73,179 @@ class LogTool:
         logging.basicConfig(**kwargs)
 
 
+@dataclass
+class RawResponse:
+    """Undecoded response, which can be sent to another process to be parsed"""
+    content: bytes
+    headers: dict = field(default_factory=dict)
+    charset: Optional[str] = None
+    """Charset declared in ``Content-Type``"""
+    url: Optional[str] = None
+
+    def text(self, encoding='utf-8'):
+        """See ``RequestsTool.decode``
+
+        Args:
+            encoding (str, optional):
+
+        Returns:
+            str
+        """
+        return RequestsTool.decode(self.content, encoding, self.url, self.charset)
+
+    def json(self, encoding='utf-8'):
+        text = self.text(encoding)
+        with MetricsTool.span('parse', host=RequestsTool.get_domain_name(self.url) if self.url else None):
+            return json.loads(text)
+
+    def tree(self, encoding='utf-8'):
+        """Parse the bytes as HTML directly, without decoding them to ``str`` first
+
+        Args:
+            encoding (str, optional):
+
+        Returns:
+            lxml.html.HtmlElement
+        """
+        resolved = RequestsTool.resolve_encoding(self.content, encoding, self.url, self.charset)
+        try:
+            parser = RequestsTool.get_html_parser(resolved)
+        except LookupError:
+            content, parser = self.text(encoding), None
+        else:
+            content = self.content
+        with MetricsTool.span('parse', host=RequestsTool.get_domain_name(self.url) if self.url else None):
+            return html.fromstring(content, parser=parser)
+
+    def pyquery(self, encoding='utf-8'):
+        return pq(self.tree(encoding))
+
+    def xpath(self, path, encoding='utf-8'):
+        """Extract the nodes directly from the tree, without a ``PyQuery`` wrapper
+
+        Args:
+            path (str): XPath
+            encoding (str, optional):
+
+        Returns:
+            list
+        """
+        return self.tree(encoding).xpath(path)
+
+    def iterparse(self, tag, encoding='utf-8'):
+        """Yield the elements of ``tag`` while parsing, and clear each one once the next is requested, so that the
+        whole tree is never kept in memory. Extract what's needed from an element before the next iteration.
+
+        Args:
+            tag (str): e.g. ``"a"``
+            encoding (str, optional):
+
+        Yields:
+            lxml.etree.Element
+        """
+        resolved = RequestsTool.resolve_encoding(self.content, encoding, self.url, self.charset)
+        for _, element in etree.iterparse(BytesIO(self.content), events=('end',), tag=tag, html=True,
+                                          encoding=resolved):
+            yield element
+            element.clear(keep_tail=True)
+
+
+class NotModifiedError(Exception):
+    """304 to a conditional request, i.e. the page is unchanged since its validators were stored, see
+    ``RequestsTool.use_validators``
+    """
+
+    def __init__(self, url):
+        super().__init__(f"Not modified: {url}")
+        self.url = url
+
+
+class SessionPool:
+    """Pool of keep-alive ``requests.Session``, so that the sync requests reuse their connections.
+
+    A session is used by one thread at a time, see ``session``. Each session mounts an ``HTTPAdapter`` keeping up
+    to ``pool_maxsize`` connections to each of the last ``pool_connections`` hosts. Cookies set by the responses
+    are not kept, so a request carries only the cookies passed to it, as with ``requests.request``.
+    """
+
+    def __init__(self, size=16, *, pool_connections=16, pool_maxsize=8):
+        """
+
+        Args:
+            size (int, optional): max number of idle sessions kept
+            pool_connections (int, optional): number of hosts to keep connections to in a session
+            pool_maxsize (int, optional): max connections kept to one host in a session
+        """
+        self.size = size
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.idle = LifoQueue(maxsize=size)
+
+    def create(self):
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @contextmanager
+    def session(self):
+        """Borrow an idle session, or a new one if none::
+
+            with pool.session() as session:
+                res = session.request('GET', url)
+
+        Returns:
+            requests.Session
+        """
+        try:
+            session = self.idle.get_nowait()
+        except Empty:
+            session = self.create()
+        try:
+            yield session
+        finally:
+            try:
+                self.idle.put_nowait(session)
+            except Full:
+                session.close()
+
+    def request(self, method, url, **kwargs):
+        """Same as ``requests.request``, on a pooled session
+
+        Returns:
+            requests.Response
+        """
+        with self.session() as session:
+            return session.request(method, url, **kwargs)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Empty:
+                return
+
+
 class RequestsTool:
     logger = logging.getLogger('RequestTool')
+    cache = None
+    """ResponseCache, see ``set_cache``"""
+    limiter = None
+    """RateLimiter, see ``set_limiter``"""
+    sessions = SessionPool()
+    """Sessions of the sync requests, see ``set_sessions``"""
+    DETECT_SIZE = 4096
+    """Number of leading bytes used to detect the encoding"""
+    encodings = {}
+    """``(host, expected encoding)`` -> the encoding that worked last time"""
+    parsers = threading.local()
+    """Reusable ``lxml.html.HTMLParser`` of each encoding, one set per thread"""
+    validators = contextvars.ContextVar('validators', default=None)
+    """``(store, conditional, owner)`` of the current context, see ``use_validators``"""
+    refresh = contextvars.ContextVar('refresh', default=False)
+    """Whether the cached responses are skipped in the current context, see ``refresh_cache``"""
 
     @staticmethod
     def quote(url, encoding='utf-8'):
@@ -79,71 +271,575 @@ class RequestsTool:
         base, _ = os.path.split(url)
         return base
 
+    @staticmethod
+    def get_charset(content_type):
+        """The charset declared in a ``Content-Type`` header, or None"""
+        match = re.search(r'charset=["\']?([\w.:-]+)', content_type or '', re.I)
+        return match.group(1) if match else None
+
+    @classmethod
+    def detect_encoding(cls, content, encoding='utf-8'):
+        """Detect the encoding from the first ``DETECT_SIZE`` bytes
+
+        Args:
+            content (bytes):
+            encoding (str, optional): the expected encoding, used unless the detection is confident about another one
+
+        Returns:
+            str
+        """
+        detected = cchardet.detect(content[:cls.DETECT_SIZE])
+        name = (detected['encoding'] or '').lower()
+        if detected['confidence'] and detected['confidence'] > 0.8 and name not in ('ascii', encoding.lower()):
+            cls.logger.debug(f"Maybe should be `{detected['encoding']}` encoding. Used it.")
+            return detected['encoding']
+        return encoding
+
+    @staticmethod
+    def _get_encoding_key(url, encoding):
+        return (RequestsTool.get_domain_name(url), encoding.lower()) if url else None
+
+    @classmethod
+    def _decode(cls, content, encoding='utf-8', url=None, charset=None):
+        with MetricsTool.span('decode', host=cls.get_domain_name(url) if url else None):
+            return cls._decode_internal(content, encoding, url, charset)
+
+    @classmethod
+    def _decode_internal(cls, content, encoding='utf-8', url=None, charset=None):
+        key = cls._get_encoding_key(url, encoding)
+        remembered = cls.encodings.get(key) if key else None
+        # a declared charset wins over the remembered one, which a permissive codec may decode into mojibake
+        candidates = (charset, remembered, cls.detect_encoding(content, encoding), encoding)
+        for enc in candidates:
+            if not enc:
+                continue
+            try:
+                text = content.decode(enc)
+            except (UnicodeDecodeError, LookupError):
+                continue
+            if key:
+                cls.encodings[key] = enc
+            return text, enc
+        if key:
+            cls.encodings.pop(key, None)
+        detected = cchardet.detect(content)['encoding'] or encoding
+        return content.decode(detected, errors='replace'), detected
+
+    @classmethod
+    def decode(cls, content, encoding='utf-8', url=None, charset=None):
+        """Decode a response body once from bytes. Try the declared charset, the encoding remembered for the host,
+        the detected one and the expected one in order. The one that works is remembered.
+
+        Args:
+            content (bytes):
+            encoding (str, optional): the expected encoding
+            url (str, optional): the requested URL, to remember the encoding for its host
+            charset (str, optional): the charset declared in ``Content-Type``
+
+        Returns:
+            str
+        """
+        return cls._decode(content, encoding, url, charset)[0]
+
+    @classmethod
+    def resolve_encoding(cls, content, encoding='utf-8', url=None, charset=None):
+        """The encoding to parse ``content`` with. Once an encoding is remembered for the host, it's trusted without
+        decoding, unless the response declares another charset. Otherwise it's checked by ``decode``.
+
+        Returns:
+            str
+        """
+        key = cls._get_encoding_key(url, encoding)
+        remembered = cls.encodings.get(key) if key else None
+        if remembered and (not charset or cls.same_encoding(charset, remembered)):
+            return remembered
+        return cls._decode(content, encoding, url, charset)[1]
+
+    @staticmethod
+    def same_encoding(enc1, enc2):
+        """Whether two names are of the same codec, e.g. ``"UTF8"`` and ``"utf-8"``"""
+        try:
+            return codecs.lookup(enc1).name == codecs.lookup(enc2).name
+        except LookupError:
+            return enc1.lower() == enc2.lower()
+
+    @classmethod
+    def get_html_parser(cls, encoding):
+        """
+
+        Args:
+            encoding (str):
+
+        Returns:
+            lxml.html.HTMLParser
+        """
+        encoding = encoding.lower()
+        if not hasattr(cls.parsers, 'cache'):
+            cls.parsers.cache = {}
+        if encoding not in cls.parsers.cache:
+            cls.parsers.cache[encoding] = html.HTMLParser(encoding=encoding)
+        return cls.parsers.cache[encoding]
+
+    @classmethod
+    def set_cache(cls, cache):
+        """Cache the responses of all requests
+
+        Args:
+            cache (ResponseCache, optional): None to disable caching
+        """
+        cls.cache = cache
+
+    @classmethod
+    def set_limiter(cls, limiter):
+        """Limit the rate of all requests to each domain, sync or async
+
+        Args:
+            limiter (RateLimiter, optional): None to disable limiting
+        """
+        cls.limiter = limiter
+
+    @classmethod
+    def set_sessions(cls, sessions):
+        """Replace the session pool of the sync requests, e.g. to tune the connection pools
+
+        Args:
+            sessions (SessionPool):
+        """
+        old, cls.sessions = cls.sessions, sessions
+        if old is not sessions:
+            old.close()
+
+    @staticmethod
+    def request_key(method, url, request_kwargs=None):
+        """Identity of a request, ignoring the headers
+
+        Args:
+            method (str):
+            url (str):
+            request_kwargs (dict, optional): only ``params``, ``data`` and ``json`` are used
+
+        Returns:
+            str
+        """
+        request_kwargs = request_kwargs or {}
+        body = {k: request_kwargs.get(k) for k in ('params', 'data', 'json')}
+        body = json.dumps(body, sort_keys=True, ensure_ascii=False, default=str)
+        return EncodingTool.MD5(f"{method.upper()} {url} {body}")
+
+    @classmethod
+    @contextmanager
+    def use_validators(cls, store, conditional=False, owner=None):
+        """Keep the ``ETag`` and ``Last-Modified`` of the responses in the block, sync or async, in ``store``.
+        The tasks created in the block inherit it, as any context variable.
+
+        If ``conditional``, also send the stored validators as ``If-None-Match`` and ``If-Modified-Since``, and raise
+        ``NotModifiedError`` on 304, so that neither the body is downloaded nor the page parsed again.
+
+        Args:
+            store: with ``get_validators(request_key)`` -> headers and ``set_validators(request_key, headers, owner)``,
+                   e.g. ``FingerprintIndex``. If None, use the store of the outer block.
+            conditional (bool, optional):
+            owner (str, optional): key of the chapter the requests in the block belong to, so that the store can drop
+                                   their validators with the chapter. If None, the owner of the outer block.
+        """
+        current = cls.validators.get()
+        if store is None:
+            store = current[0] if current is not None else None
+        if owner is None and current is not None:
+            owner = current[2]
+        token = cls.validators.set((store, conditional, owner) if store is not None else None)
+        try:
+            yield
+        finally:
+            cls.validators.reset(token)
+
+    @classmethod
+    @contextmanager
+    def refresh_cache(cls):
+        """Skip the cached responses in the block, sync or async, and cache the fresh ones in their place.
+
+        Used to retry a page whose body was received but could not be parsed, e.g. a 200 error page, which would
+        otherwise be served from the cache again.
+        """
+        token = cls.refresh.set(True)
+        try:
+            yield
+        finally:
+            cls.refresh.reset(token)
+
+    @classmethod
+    def _prepare_conditional(cls, method, url, request_kwargs):
+        """
+
+        Returns:
+            2-tuple: ``(str, dict)``, the key of the request if the validators are kept, and the request kwargs \
+                     with the conditional headers if any.
+        """
+        current = cls.validators.get()
+        if current is None:
+            return None, request_kwargs
+        store, conditional, _ = current
+        key = cls.request_key(method, url, request_kwargs)
+        if conditional:
+            headers = store.get_validators(key)
+            if headers:
+                request_kwargs = dict(request_kwargs, headers={**(request_kwargs.get('headers') or {}), **headers})
+        return key, request_kwargs
+
+    @classmethod
+    def _check_conditional(cls, key, url, res):
+        if key is None:
+            return
+        status = res.status_code if isinstance(res, requests.Response) else res.status
+        if status == 304:
+            MetricsTool.count('not_modified', host=cls.get_domain_name(url))
+            raise NotModifiedError(url)
+        if status < 300:
+            store, _, owner = cls.validators.get()
+            store.set_validators(key, res.headers, owner)
+
+    @classmethod
+    def _acquire(cls, url):
+        if cls.limiter is not None:
+            host = cls.get_domain_name(url)
+            with MetricsTool.span('throttle', host=host):
+                cls.limiter.acquire(host)
+
+    @classmethod
+    async def _acquire_async(cls, url):
+        if cls.limiter is not None:
+            host = cls.get_domain_name(url)
+            with MetricsTool.span('throttle', host=host):
+                await cls.limiter.acquire_async(host)
+
+    @staticmethod
+    def _measure(url, res, size, started):
+        """Observe the time of the headers and the body of a successful response
+
+        Args:
+            url (str):
+            res (requests.Response or aiohttp.ClientResponse):
+            size (int): bytes of the body
+            started (float): ``time.perf_counter()`` before sending a sync request, when the headers took
+                             ``res.elapsed`` and the body took the rest, or before reading the body of an async one,
+                             whose headers are measured by ``MetricsTool.trace_config``.
+        """
+        if MetricsTool.metrics is None:
+            return
+        host = RequestsTool.get_domain_name(url)
+        elapsed = time.perf_counter() - started
+        if isinstance(res, requests.Response):
+            first_byte = min(elapsed, res.elapsed.total_seconds())
+            MetricsTool.observe('first_byte', first_byte, host=host)
+            elapsed -= first_byte
+        MetricsTool.observe('body', elapsed, host=host)
+        MetricsTool.count('bytes', size, host=host)
+
+    @classmethod
+    def _feedback(cls, url, res):
+        if cls.limiter is None and MetricsTool.metrics is None:
+            return
+        host = cls.get_domain_name(url)
+        status = res.status_code if isinstance(res, requests.Response) else res.status
+        MetricsTool.count('responses', host=host, status=status)
+        if cls.limiter is None:
+            return
+        retry_after = cls.parse_retry_after(res.headers) if status in (429, 503) else None
+        cls.limiter.feedback(host, status, retry_after)
+
+    @classmethod
+    def _get_cached(cls, method, url, request_kwargs, include_headers):
+        if cls.cache is None:
+            return None, None
+        key = cls.cache.key(method, url, request_kwargs)
+        if cls.refresh.get():
+            return key, None
+        cached = cls.cache.get(key)
+        MetricsTool.count('cache_misses' if cached is None else 'cache_hits', host=cls.get_domain_name(url))
+        if cached is None:
+            return key, None
+        text, headers = cached
+        return key, ((text, CaseInsensitiveDict(headers)) if include_headers else text)
+
+    @classmethod
+    async def _get_cached_async(cls, method, url, request_kwargs, include_headers):
+        """Same as ``_get_cached``, with the cache queried off the event loop"""
+        if cls.cache is None:
+            return None, None
+        key = cls.cache.key(method, url, request_kwargs)
+        if cls.refresh.get():
+            return key, None
+        cached = await cls.cache.get_async(key)
+        MetricsTool.count('cache_misses' if cached is None else 'cache_hits', host=cls.get_domain_name(url))
+        if cached is None:
+            return key, None
+        text, headers = cached
+        return key, ((text, CaseInsensitiveDict(headers)) if include_headers else text)
+
     @classmethod
     def request(cls, url, *, encoding='utf-8', method='GET', request_kwargs=None, include_headers=False):
         if request_kwargs is None:
             request_kwargs = {}
-        res = requests.request(method, url, **request_kwargs)
+        key, cached = cls._get_cached(method, url, request_kwargs, include_headers)
+        if cached is not None:
+            return cached
+        conditional_key, request_kwargs = cls._prepare_conditional(method, url, request_kwargs)
+        cls._acquire(url)
+        started = time.perf_counter()
+        res = cls.sessions.request(method, url, **request_kwargs)
+        cls._feedback(url, res)
         res.raise_for_status()
-        detected = cchardet.detect(res.content)
-        if detected['confidence'] > 0.8 and detected['encoding'].lower() != encoding.lower():
-            cls.logger.debug(f"Maybe should be `{detected['encoding']}` encoding. Used it.")
-            res.encoding = detected['encoding']
-        else:
-            res.encoding = encoding
+        cls._check_conditional(conditional_key, url, res)
+        cls._measure(url, res, len(res.content), started)
+        text = cls.decode(res.content, encoding, url, cls.get_charset(res.headers.get('Content-Type')))
+        if key is not None:
+            cls.cache.set(key, url, text, res.headers)
         if include_headers:
-            return res.text, res.headers
-        return res.text
+            return text, res.headers
+        return text
 
     @staticmethod
     async def request_async(session, url, *, encoding='utf-8', method='GET', request_kwargs=None,
                             include_headers=False):
-        async def try_encodings_async(res):
-            try:
-                return await res.text()
-            except UnicodeDecodeError as e:
-                try:
-                    return await res.text(encoding=encoding)
-                except UnicodeDecodeError as e:
-                    return RequestsTool.request(url, encoding=encoding, method=method,
-                                                request_kwargs=request_kwargs)
-            raise e
-
         if request_kwargs is None:
             request_kwargs = {}
+        key, cached = await RequestsTool._get_cached_async(method, url, request_kwargs, include_headers)
+        if cached is not None:
+            return cached
+        conditional_key, request_kwargs = RequestsTool._prepare_conditional(method, url, request_kwargs)
+        await RequestsTool._acquire_async(url)
         async with session.request(method, url, **request_kwargs) as res:
-            text = await try_encodings_async(res)
+            RequestsTool._feedback(url, res)
+            res.raise_for_status()
+            RequestsTool._check_conditional(conditional_key, url, res)
+            started = time.perf_counter()
+            content = await res.read()
+            RequestsTool._measure(url, res, len(content), started)
+            text = RequestsTool.decode(content, encoding, url, res.charset)
+            if key is not None:
+                await RequestsTool.cache.set_async(key, url, text, res.headers)
             if include_headers:
                 return text, res.headers
             return text
 
+    @classmethod
+    def request_raw(cls, url, *, encoding='utf-8', method='GET', request_kwargs=None):
+        """Request without decoding
+
+        Args:
+            url (str):
+            encoding (str, optional): only used to cache the text if caching is enabled
+            method (str, optional):
+            request_kwargs (dict, optional):
+
+        Returns:
+            RawResponse
+        """
+        if request_kwargs is None:
+            request_kwargs = {}
+        key, cached = cls._get_cached(method, url, request_kwargs, True)
+        if cached is not None:
+            text, headers = cached
+            return RawResponse(text.encode('utf-8'), headers, 'utf-8')
+        conditional_key, request_kwargs = cls._prepare_conditional(method, url, request_kwargs)
+        cls._acquire(url)
+        started = time.perf_counter()
+        res = cls.sessions.request(method, url, **request_kwargs)
+        cls._feedback(url, res)
+        res.raise_for_status()
+        cls._check_conditional(conditional_key, url, res)
+        cls._measure(url, res, len(res.content), started)
+        raw = RawResponse(res.content, res.headers, cls.get_charset(res.headers.get('Content-Type')), url)
+        if key is not None:
+            cls.cache.set(key, url, raw.text(encoding), raw.headers)
+        return raw
+
+    @staticmethod
+    async def request_raw_async(session, url, *, encoding='utf-8', method='GET', request_kwargs=None):
+        """Request without decoding, so that decoding and parsing can be done elsewhere
+
+        Args:
+            session (aiohttp.ClientSession):
+            url (str):
+            encoding (str, optional): only used to cache the text if caching is enabled
+            method (str, optional):
+            request_kwargs (dict, optional):
+
+        Returns:
+            RawResponse
+        """
+        if request_kwargs is None:
+            request_kwargs = {}
+        key, cached = await RequestsTool._get_cached_async(method, url, request_kwargs, True)
+        if cached is not None:
+            text, headers = cached
+            return RawResponse(text.encode('utf-8'), headers, 'utf-8')
+        conditional_key, request_kwargs = RequestsTool._prepare_conditional(method, url, request_kwargs)
+        await RequestsTool._acquire_async(url)
+        async with session.request(method, url, **request_kwargs) as res:
+            RequestsTool._feedback(url, res)
+            res.raise_for_status()
+            RequestsTool._check_conditional(conditional_key, url, res)
+            started = time.perf_counter()
+            content = await res.read()
+            RequestsTool._measure(url, res, len(content), started)
+            raw = RawResponse(content, CaseInsensitiveDict(res.headers), res.charset, url)
+        if key is not None:
+            await RequestsTool.cache.set_async(key, url, raw.text(encoding), raw.headers)
+        return raw
+
     @staticmethod
     def request_and_pyquery(url, encoding='utf-8', method='GET', request_kwargs=None):
-        res = RequestsTool.request(url, encoding=encoding, method=method, request_kwargs=request_kwargs)
-        a = html.fromstring(res)
-        d = pq(a)
-        return d
+        res = RequestsTool.request_raw(url, encoding=encoding, method=method, request_kwargs=request_kwargs)
+        return res.pyquery(encoding)
 
     @staticmethod
     async def request_and_pyquery_async(session, url, encoding='utf-8', method='GET', request_kwargs=None):
-        res = await RequestsTool.request_async(session, url, encoding=encoding, method=method,
-                                               request_kwargs=request_kwargs)
-        d = pq(res)
-        return d
+        res = await RequestsTool.request_raw_async(session, url, encoding=encoding, method=method,
+                                                   request_kwargs=request_kwargs)
+        return res.pyquery(encoding)
 
     @staticmethod
     def request_and_json(url, encoding='utf-8', method='GET', request_kwargs=None):
         res = RequestsTool.request(url, encoding=encoding, method=method, request_kwargs=request_kwargs)
-        d = json.loads(res)
+        with MetricsTool.span('parse', host=RequestsTool.get_domain_name(url)):
+            d = json.loads(res)
         return d
 
     @staticmethod
     async def request_and_json_async(session, url, encoding='utf-8', method='GET', request_kwargs=None):
         res = await RequestsTool.request_async(session, url, encoding=encoding, method=method,
                                                request_kwargs=request_kwargs)
-        d = json.loads(res)
+        with MetricsTool.span('parse', host=RequestsTool.get_domain_name(url)):
+            d = json.loads(res)
         return d
 
+    @staticmethod
+    def fetch_pages(get_page, *, start=1, total=None, is_last=None, get_total=None, window=8):
+        """Fetch the numbered pages of a catalogue concurrently, in a sliding window of threads.
+
+        If ``total`` is unknown but ``get_total`` tells the last page the results so far link to, e.g. from a pager, only
+        the pages up to it are requested, starting with the first page alone. If neither is known, the pages after the
+        current one are requested speculatively until ``is_last`` says the current one is the last. The results of the
+        pages after it are discarded. The speculative window starts from one page and doubles with each page, so that
+        a short catalogue costs few extra requests.
+
+        Args:
+            get_page (callable): page number -> result of the page
+            start (int, optional): number of the first page
+            total (int, optional): number of the last page, if known
+            is_last (callable, optional): list of the results so far -> whether the last result is of the last page.
+                                          Required if ``total`` is unknown.
+            get_total (callable, optional): list of the results so far -> number of the last page known to exist
+            window (int, optional): max number of pages requested at the same time
+
+        Returns:
+            list: results of the pages in order, until the last one
+        """
+        assert total is not None or is_last is not None, "Either `total` or `is_last` is required!"
+        results = []
+        futures = deque()
+        pid = start
+        size = window if total is not None or get_total is not None else 1
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            while True:
+                limit = RequestsTool._get_page_limit(results, start, total, get_total)
+                while len(futures) < size and (limit is None or pid <= limit):
+                    futures.append((pid, executor.submit(get_page, pid)))
+                    pid += 1
+                if len(futures) == 0:
+                    break
+                current, future = futures.popleft()
+                results.append(future.result())
+                if (total is not None and current >= total) or (is_last is not None and is_last(results)):
+                    break
+                size = min(window, size * 2)
+            for _, future in futures:
+                future.cancel()
+        return results
+
+    @staticmethod
+    async def fetch_pages_async(get_page, *, start=1, total=None, is_last=None, get_total=None, window=8):
+        """Same as ``fetch_pages``, but on the running event loop
+
+        Args:
+            get_page (callable): coroutine function, page number -> result of the page
+            start (int, optional):
+            total (int, optional):
+            is_last (callable, optional):
+            get_total (callable, optional):
+            window (int, optional):
+
+        Returns:
+            list
+        """
+        assert total is not None or is_last is not None, "Either `total` or `is_last` is required!"
+        results = []
+        tasks = deque()
+        pid = start
+        size = window if total is not None or get_total is not None else 1
+        try:
+            while True:
+                limit = RequestsTool._get_page_limit(results, start, total, get_total)
+                while len(tasks) < size and (limit is None or pid <= limit):
+                    tasks.append((pid, asyncio.ensure_future(get_page(pid))))
+                    pid += 1
+                if len(tasks) == 0:
+                    break
+                current, task = tasks.popleft()
+                results.append(await task)
+                if (total is not None and current >= total) or (is_last is not None and is_last(results)):
+                    break
+                size = min(window, size * 2)
+        finally:
+            for _, task in tasks:
+                task.cancel()
+            await asyncio.gather(*[task for _, task in tasks], return_exceptions=True)
+        return results
+
+    @staticmethod
+    def _get_page_limit(results, start, total, get_total):
+        """The last page number ``fetch_pages`` may request now, None if unlimited"""
+        if total is not None or get_total is None:
+            return total
+        return get_total(results) if results else start
+
+    @staticmethod
+    def get_retry_after(error):
+        """Get the waiting time the server asked for in the ``Retry-After`` header of a failed response
+
+        Args:
+            error (Exception): ``requests.HTTPError`` or ``aiohttp.ClientResponseError``
+
+        Returns:
+            float: seconds to wait, or None if not provided
+        """
+        headers = getattr(error, 'headers', None)
+        if headers is None and getattr(error, 'response', None) is not None:
+            headers = error.response.headers
+        return RequestsTool.parse_retry_after(headers)
+
+    @staticmethod
+    def parse_retry_after(headers):
+        """
+
+        Args:
+            headers (dict, optional): response headers
+
+        Returns:
+            float: seconds to wait in the ``Retry-After`` header, or None if not provided
+        """
+        value = headers.get('Retry-After') if headers else None
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0., parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
     @staticmethod
     def parse_query(url):
         parsed_url = urlparse(url)
@@ -219,3 +915,57 @@ class EncodingTool:
         new_path = os.path.join(filedir, f"{name}_{to_encoding}{ext}")
         with open(file_path, 'r', encoding=from_encoding) as f, open(new_path, 'w', encoding=to_encoding) as w:
             w.write(f.read())
+
+
+class RequestCoalescer:
+    """Share one in-flight request among concurrent callers with the same key.
+
+    The result is not kept once the request finishes, so a later call sends a new request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.tasks = {}
+
+    def call(self, key, func, *args, **kwargs):
+        """Call ``func`` unless another thread is calling it with the same key, then wait for its result.
+
+        Args:
+            key (hashable):
+            func (callable):
+
+        Returns:
+            The result of ``func(*args, **kwargs)``
+        """
+        with self.lock:
+            future = self.futures.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self.futures[key] = Future()
+        if not is_owner:
+            return future.result()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.futures.pop(key, None)
+        return future.result()
+
+    async def call_async(self, key, func, *args, **kwargs):
+        """Await ``func`` unless another task is awaiting it with the same key, then share its result.
+
+        Args:
+            key (hashable):
+            func (callable): coroutine function
+
+        Returns:
+            The result of ``await func(*args, **kwargs)``
+        """
+        task = self.tasks.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = self.tasks[key] = asyncio.ensure_future(func(*args, **kwargs))
+            task.add_done_callback(lambda t: self.tasks.pop(key, None) if self.tasks.get(key) is t else None)
+        return await asyncio.shield(task)
@@ -0,0 +1,157 @@
+"""
+Streaming book writer
+"""
+import json
+import logging
+
+from schomeless.schema import Book
+from schomeless.utils import FileSysTool, MetricsTool
+
+__all__ = [
+    'BookWriter',
+    'TxtBookWriter',
+    'JsonBookWriter'
+]
+
+logger = logging.getLogger('Writer')
+
+
+class BookWriter:
+    """Write chapters to the file as soon as they are completed.
+
+    Chapters can be fed in any order. They are written in the order of ``Chapter.id`` starting from 0, and only
+    those arriving before their predecessors are buffered. So the memory is bounded by the out-of-order window
+    instead of the book size. The output is the same as ``Book.to_txt`` or ``Book.to_json``.
+
+    Usage::
+
+        with BookWriter.for_path('book.txt', book_props) as writer:
+            book = requester.run(book_props, catalogue, writer=writer)
+    """
+
+    def __init__(self, file_path, book_props=None):
+        """
+
+        Args:
+            file_path (str):
+            book_props (dict or Book, optional): attributes of the book except the chapters, e.g. preface.
+        """
+        book = book_props
+        if book is None:
+            book = Book()
+        elif not isinstance(book, Book):
+            book = Book(**book_props)
+        self.book = book
+        self.file_path = file_path
+        self.fobj = None
+        self.buffer = {}
+        self.next_id = 0
+        self.n_written = 0
+
+    @staticmethod
+    def for_path(file_path, book_props=None):
+        """Choose the writer by the file extension
+
+        Args:
+            file_path (str): ``*.json`` for ``JsonBookWriter``, otherwise ``TxtBookWriter``
+            book_props (dict or Book, optional):
+
+        Returns:
+            BookWriter
+        """
+        if FileSysTool.File.parse(file_path).extension.lower() == '.json':
+            return JsonBookWriter(file_path, book_props)
+        return TxtBookWriter(file_path, book_props)
+
+    def open(self):
+        FileSysTool.enable_path(self.file_path)
+        self.fobj = open(self.file_path, 'w')
+        self.write_header()
+        return self
+
+    def write(self, chapter):
+        """Write the chapter if all the previous chapters are written. Otherwise, buffer it.
+
+        Args:
+            chapter (Chapter): ``chapter.id`` is required
+        """
+        if self.fobj is None:
+            self.open()
+        if chapter.id < self.next_id or chapter.id in self.buffer:
+            logger.warning(f"Chapter {chapter.id + 1} is written more than once, ignored.")
+            return
+        self.buffer[chapter.id] = chapter
+        while self.next_id in self.buffer:
+            self.write_chapter(self.buffer.pop(self.next_id))
+            self.next_id += 1
+
+    def close(self):
+        """Write the remaining chapters in order, even if some chapters are missing"""
+        if self.fobj is None:
+            return
+        if len(self.buffer) > 0:
+            logger.warning(f"Missing chapters before chapter {min(self.buffer) + 1}")
+            for i in sorted(self.buffer):
+                self.write_chapter(self.buffer.pop(i))
+        self.write_footer()
+        self.fobj.close()
+        self.fobj = None
+
+    def write_chapter(self, chapter):
+        self.n_written += 1
+        with MetricsTool.span('write'):
+            self.fobj.write(self.format_chapter(chapter))
+            self.fobj.flush()
+
+    def write_header(self):
+        pass
+
+    def write_footer(self):
+        pass
+
+    def format_chapter(self, chapter):
+        """
+
+        Args:
+            chapter (Chapter):
+
+        Returns:
+            str
+        """
+        raise NotImplementedError("``format_chapter``")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TxtBookWriter(BookWriter):
+    """Streaming version of ``Book.to_txt``"""
+
+    def __init__(self, file_path, book_props=None, preface_format="【{book.author}】{book.name}\n\n{book.preface}"):
+        super().__init__(file_path, book_props)
+        self.preface_format = preface_format
+
+    def write_header(self):
+        self.fobj.write(self.preface_format.format(book=self.book) + "\n\n")
+
+    def format_chapter(self, chapter):
+        return self.book.chapter_to_txt(chapter)
+
+
+class JsonBookWriter(BookWriter):
+    """Streaming version of ``Book.to_json``, can be read by ``Book.read_json``"""
+
+    def write_header(self):
+        props = self.book._asdict()
+        props.pop('chapters')
+        self.fobj.write(json.dumps(props)[:-1] + ', "chapters": [')
+
+    def format_chapter(self, chapter):
+        prefix = ', ' if self.n_written > 1 else ''
+        return prefix + json.dumps(chapter._asdict())
+
+    def write_footer(self):
+        self.fobj.write(']}')
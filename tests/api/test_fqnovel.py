@@ -7,6 +7,7 @@ import aiohttp
 
 from schomeless.api.base import UrlCatalogueRequest, CookieManager, ReloginSettings
 from schomeless.api.fqnovel import *
+from schomeless.api.fqnovel import TextEncoder
 
 BASE_DIR = os.path.dirname(__file__)
 
@@ -151,3 +152,13 @@ class TestFqNovelApi(unittest.TestCase):
 
     def tearDown(self):
         self.recover_cookies()
+
+
+class TestTextEncoder(unittest.TestCase):
+
+    def test_decrypt(self):
+        start, n = TextEncoder.CODE_START, len(TextEncoder.CHARSET)
+        text = ''.join(map(chr, range(start - 10, start + n + 10))) + '普通文本 text\n'
+        self.assertEqual(TextEncoder.decrypt(text), ''.join(map(TextEncoder._interpret, text)))
+        self.assertEqual(TextEncoder.decrypt(chr(start + 1)), '在')
+        self.assertEqual(TextEncoder.decrypt(chr(start + 14)), chr(start + 14))
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import aiohttp
+
+from benchmarks.bench_requesters import run_scenario
+from benchmarks.fixtures import Fixture, NAMESPACES, build, write_accounts
+from benchmarks.server import StandInServer, LocalSessionPool, LocalSession
+from schomeless.api import CookieManager, FqNovelApi, JjwxcApi
+from schomeless.utils import RequestsTool, SessionPool
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_fixture(self):
+        fixture = build('QIMAO', 3, 100)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'QIMAO.json')
+            fixture.save(path)
+            loaded = Fixture.load(path)
+        self.assertEqual(fixture.catalogue, loaded.catalogue)
+        self.assertEqual([r.body for r in fixture.responses], [r.body for r in loaded.responses])
+
+    def test_requesters(self):
+        fixtures = [build(ns, 5, 200) for ns in NAMESPACES]
+        with StandInServer(fixtures, error_rate=0.2) as server:
+            for fixture in fixtures:
+                for requester in ['sync', 'async']:
+                    with self.subTest(api=fixture.namespace, requester=requester):
+                        result = run_scenario(fixture, requester, server.base_url)
+                        self.assertEqual(result['expected'], result['chapters'])
+
+    def test_fqnovel_app_catalogue(self):
+        fixture = build('FQNOVEL', 3, 200)
+
+        async def _core(api):
+            async with LocalSession(aiohttp.ClientSession(), server.base_url) as session:
+                # not ``get_chapter_list_async``, which falls back to the WEB catalogue
+                return await api.get_chapter_list_app_async(session, fixture.catalogue)
+
+        account_path = CookieManager.ACCOUNT_PATH
+        with StandInServer([fixture]) as server, tempfile.TemporaryDirectory() as tempdir:
+            write_accounts(tempdir)
+            RequestsTool.set_sessions(LocalSessionPool(server.base_url))
+            try:
+                api = FqNovelApi()
+                reqs = api.get_chapter_list_app(fixture.catalogue)
+                self.assertEqual(asyncio.run(_core(api)), reqs)
+            finally:
+                RequestsTool.set_sessions(SessionPool())
+                CookieManager.ACCOUNT_PATH = account_path
+        self.assertEqual(len(reqs), 3)
+
+    def test_fqnovel_legs(self):
+        fixture = build('FQNOVEL', 2, 200)
+        failed_id = 1
+        fixture.add('GET', FqNovelApi.CHAPTER_APP_API, '内容获取失败', params=dict(item_id=failed_id),
+                    content_type='text')
+        first = fixture.first
+        failed = FqNovelApi.ChapterRequest(True, failed_id, 'title')
+
+        async def _core(api):
+            async with LocalSession(aiohttp.ClientSession(), server.base_url) as session:
+                result = await api.get_chapter_async(session, first)
+                with self.assertRaises(AssertionError):
+                    await api.get_chapter_async(session, failed)
+                return result
+
+        account_path = CookieManager.ACCOUNT_PATH
+        with StandInServer([fixture]) as server, tempfile.TemporaryDirectory() as tempdir:
+            write_accounts(tempdir)
+            RequestsTool.set_sessions(LocalSessionPool(server.base_url))
+            try:
+                api = FqNovelApi(skip_web=True)
+                # both legs: the title and the next chapter from WEB, the content from APP
+                chapter, next = api.get_chapter(first)
+                self.assertEqual((chapter, next), asyncio.run(_core(api)))
+                with self.assertRaises(AssertionError):
+                    api.get_chapter(failed)
+                # the pool is shared by the instances
+                self.assertIs(FqNovelApi.get_executor(), FqNovelApi(skip_web=True).get_executor())
+            finally:
+                RequestsTool.set_sessions(SessionPool())
+                FqNovelApi.shutdown_executor()
+                CookieManager.ACCOUNT_PATH = account_path
+        self.assertTrue(chapter.title)
+        self.assertTrue(chapter.content)
+        self.assertIsNotNone(next)
+        self.assertIsNone(FqNovelApi.executor)
+
+    def test_jjwxc_parse_stage(self):
+        fixture = build('JJWXC', 3, 200)
+        novel_id = fixture.catalogue.novel_id
+        fixture.add('GET', JjwxcApi.CHAPTER_APP_API, '{"broken', content_type='json',
+                    params=dict(novelId=novel_id, chapterId=2, versionCode=JjwxcApi.APP_VERSION))
+        broken, ok = (JjwxcApi.ChapterRequest(True, novel_id, i, True) for i in (2, 3))
+
+        async def _core(api):
+            async with LocalSession(aiohttp.ClientSession(), server.base_url) as session:
+                result = await api.get_chapter_async(session, ok)
+                self.assertEqual(api.parse_chapter(ok, await api.fetch_chapter_async(session, ok)), result)
+                # the same error as ``get_chapter_async`` after the APP API, since the WEB one refuses VIP chapters
+                with self.assertRaisesRegex(AssertionError, 'Web API'):
+                    await api.get_chapter_async(session, broken)
+                raw = await api.fetch_chapter_async(session, broken)
+                with self.assertRaisesRegex(AssertionError, 'Web API') as cm:
+                    api.parse_chapter(broken, raw)
+                self.assertIsNotNone(cm.exception.__cause__)
+                return result
+
+        account_path = CookieManager.ACCOUNT_PATH
+        with StandInServer([fixture]) as server, tempfile.TemporaryDirectory() as tempdir:
+            write_accounts(tempdir)
+            try:
+                chapter, next = asyncio.run(_core(JjwxcApi()))
+            finally:
+                CookieManager.ACCOUNT_PATH = account_path
+        self.assertTrue(chapter.content)
+        self.assertEqual(next.chapter_id, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
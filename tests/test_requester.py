@@ -0,0 +1,580 @@
+import asyncio
+import os.path
+import tempfile
+import unittest
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from schomeless.api import RequestApi
+from schomeless.checkpoint import ChapterCheckpoint
+from schomeless.fingerprint import FingerprintIndex
+from schomeless.progress import ProgressObserver
+from schomeless.requester import AsyncRequester, BookRequester, IterativeRequester, BatchRequester
+from schomeless.schema import Book, Chapter, ChapterRequest
+from schomeless.utils import RequestsTool, ResponseCache, RateLimiter, Metrics, MetricsTool, HistogramSink
+from schomeless.writer import BookWriter
+
+
+@dataclass
+class FakeChapterRequest(ChapterRequest):
+    chapter_id: int
+    page: int = 0
+
+
+class FakeApi:
+    """Offline API: every chapter has ``n_pages`` pages, and the first ``n_errors`` calls fail"""
+
+    def __init__(self, n_pages=1, n_errors=0, delay=0.01):
+        self.n_pages = n_pages
+        self.n_errors = n_errors
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+
+    async def get_chapter_async(self, session, req):
+        self.calls += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.n_errors > 0:
+                self.n_errors -= 1
+                raise ConnectionError('fake error')
+        finally:
+            self.running -= 1
+        next = None
+        if req.page + 1 < self.n_pages:
+            next = FakeChapterRequest(False, req.chapter_id, req.page + 1)
+        return Chapter(f'title {req.chapter_id}', f'{req.chapter_id}-{req.page}'), next
+
+
+class FakeCatalogueApi(FakeApi, RequestApi):
+    """``FakeApi`` whose catalogue is the number of chapters, and only has the sync ``get_chapter_list``"""
+
+    def __init__(self, *args, **kwargs):
+        FakeApi.__init__(self, *args, **kwargs)
+        self.catalogue_thread = None
+
+    def get_chapter_list(self, catalogue):
+        self.catalogue_thread = threading.get_ident()
+        return [FakeChapterRequest(True, i) for i in range(catalogue)]
+
+
+class FakeServerApi(RequestApi):
+    """API of a local server whose chapter ``i`` is ``/{i}``, at version ``versions[i]`` with it as the ETag"""
+
+    def __init__(self):
+        self.versions = {}
+        self.requests = []
+        versions, requests = self.versions, self.requests
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                etag = versions[int(self.path[1:])]
+                requests.append((self.path, self.headers.get('If-None-Match')))
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = f'{self.path[1:]}-{etag}'.encode('utf-8')
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_chapter_list(self, catalogue):
+        return [FakeChapterRequest(True, i) for i in range(catalogue)]
+
+    def get_chapter(self, req):
+        text = RequestsTool.request(f'{self.url}/{req.chapter_id}')
+        return Chapter(f'title {req.chapter_id}', text), None
+
+    async def get_chapter_async(self, session, req):
+        text = await RequestsTool.request_async(session, f'{self.url}/{req.chapter_id}')
+        return Chapter(f'title {req.chapter_id}', text), None
+
+
+class FakeSplitApi(FakeApi):
+    """``FakeApi`` with the parse stage split out of ``get_chapter_async``"""
+
+    @classmethod
+    def has_parse_stage(cls):
+        return True
+
+    async def fetch_chapter_async(self, session, req):
+        await asyncio.sleep(self.delay)
+        return f'{req.chapter_id}-{req.page}'.encode('utf-8')
+
+    @staticmethod
+    def parse_chapter(req, raw):
+        return Chapter(f'title {req.chapter_id} in {os.getpid()}', raw.decode('utf-8')), None
+
+
+class FakeIterApi:
+    """Offline API of chained chapters ``0, 1, ..., n - 1``, except that chapter ``jump`` links to ``jump + 10``"""
+
+    def __init__(self, n=30, jump=5, delay=0.02):
+        self.n = n
+        self.jump = jump
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requested = []
+
+    def get_chapter(self, req):
+        with self.lock:
+            self.requested.append(req.chapter_id)
+        time.sleep(self.delay)
+        if req.chapter_id >= self.n:
+            return None, None
+        next_id = req.chapter_id + (10 if req.chapter_id == self.jump else 1)
+        next = FakeChapterRequest(True, next_id) if next_id < self.n else None
+        return Chapter(f'title {req.chapter_id}', f'{req.chapter_id}'), next
+
+    def predict_next(self, req):
+        return FakeChapterRequest(True, req.chapter_id + 1)
+
+
+class TestIterativeRequester(unittest.TestCase):
+
+    def test_registry(self):
+        self.assertIs(BookRequester['ITER'], IterativeRequester)
+        self.assertIs(BookRequester['CATALOGUE'], AsyncRequester)
+
+    def test_prefetch(self):
+        expected = [str(i) for i in range(30) if not 5 < i < 15]
+        serial = IterativeRequester(FakeIterApi()).run_internal(FakeChapterRequest(True, 0))
+        self.assertEqual([c.content for c in serial], expected)
+
+        api = FakeIterApi()
+        requester = IterativeRequester(api, prefetch=4)
+        sink = HistogramSink()
+        MetricsTool.set_metrics(Metrics([sink]))
+        try:
+            start = time.time()
+            chapters = requester.run_internal(FakeChapterRequest(True, 0))
+            elapsed = time.time() - start
+        finally:
+            MetricsTool.set_metrics(None)
+        self.assertEqual([c.content for c in chapters], expected)
+        self.assertEqual([c.id for c in chapters], list(range(len(expected))))
+        self.assertLess(elapsed, len(expected) * api.delay)
+        self.assertEqual(len(set(api.requested)), len(api.requested))
+        # the wasted guesses after the jump are not counted
+        self.assertGreater(len(api.requested), len(expected))
+        last = requester.progress.snapshot()
+        self.assertEqual((last.pages, last.bytes, last.in_flight), (len(expected), len(''.join(expected)), 0))
+        stages = {s['name']: s['count'] for s in sink.summary()['stages']}
+        self.assertEqual(stages['page'], len(expected))
+
+
+class TestAsyncRequester(unittest.TestCase):
+
+    def test_bounded_concurrency(self):
+        api = FakeApi()
+        requester = AsyncRequester(api, max_concurrency=4)
+        reqs = [FakeChapterRequest(True, i) for i in range(50)]
+        chapters = requester.get_chapters_async(reqs)
+        self.assertEqual(len(chapters), 50)
+        self.assertLessEqual(api.max_running, 4)
+        self.assertEqual([c.content for c in chapters], [f'{i}-0' for i in range(50)])
+
+    def test_multi_page_and_failures(self):
+        api = FakeApi(n_pages=3, n_errors=5)
+        requester = AsyncRequester(api, max_concurrency=3, backoff_base=0.01)
+        reqs = [FakeChapterRequest(True, i) for i in range(10)]
+        chapters = requester.get_chapters_async(reqs)
+        self.assertEqual([c.content for c in chapters], [f'{i}-0{i}-1{i}-2' for i in range(10)])
+        self.assertEqual([c.title for c in chapters], [f'title {i}' for i in range(10)])
+
+    def test_invalid_page(self):
+        class InvalidPageApi(FakeApi):
+            async def get_chapter_async(self, session, req):
+                page, next = await super().get_chapter_async(session, req)
+                if req.chapter_id == 1 and req.page == 1 and not getattr(self, 'invalid', False):
+                    # the title differs from the first page
+                    self.invalid = True
+                    page.title = 'other'
+                return page, next
+
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = ChapterCheckpoint(os.path.join(tmp, 'checkpoint.jsonl'))
+            requester = AsyncRequester(InvalidPageApi(n_pages=2), backoff_base=0.01)
+            chapters = requester.get_chapters_async([FakeChapterRequest(True, i) for i in range(3)],
+                                                    retry_count=0, checkpoint=checkpoint)
+            checkpoint.close()
+            self.assertEqual(len(ChapterCheckpoint(checkpoint.file_path)), 2)
+        self.assertEqual(chapters[1].content, '1-0')
+        last = requester.progress.snapshot()
+        self.assertEqual((last.done, last.failed), (2, 1))
+        chapters = AsyncRequester(InvalidPageApi(n_pages=2), backoff_base=0.01).get_chapters_async(
+            [FakeChapterRequest(True, i) for i in range(3)])
+        self.assertEqual([c.content for c in chapters], [f'{i}-0{i}-1' for i in range(3)])
+
+    def test_shared_session(self):
+        async def _core():
+            async with requester.create_session() as session:
+                first = await requester.fetch_chapters(reqs[:5], session=session)
+                second = await requester.fetch_chapters(reqs[5:], session=session)
+                self.assertFalse(session.closed)
+            return first + second
+
+        api = FakeApi(n_errors=2)
+        requester = AsyncRequester(api, max_concurrency=2, backoff_base=0.01)
+        reqs = [FakeChapterRequest(True, i) for i in range(10)]
+        chapters = asyncio.run(_core())
+        self.assertEqual([c.content for c in chapters], [f'{i}-0' for i in range(10)])
+
+    def test_parse_executor(self):
+        reqs = [FakeChapterRequest(True, i) for i in range(20)]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            requester = AsyncRequester(FakeSplitApi(), parse_executor=executor)
+            chapters = requester.get_chapters_async(reqs)
+        self.assertEqual([c.content for c in chapters], [f'{i}-0' for i in range(20)])
+        self.assertTrue(all(not c.title.endswith(f' in {os.getpid()}') for c in chapters))
+        # without an executor, the API is used as a whole
+        api = FakeSplitApi()
+        chapters = AsyncRequester(api).get_chapters_async(reqs)
+        self.assertEqual(api.calls, 20)
+        self.assertEqual([c.content for c in chapters], [f'{i}-0' for i in range(20)])
+
+    def test_run_internal(self):
+        api = FakeCatalogueApi(n_pages=2)
+        chapters = AsyncRequester(api).run_internal(10, chapter_range=[1, 3, 5])
+        self.assertEqual([c.content for c in chapters], ['1-01-1', '3-03-1', '5-05-1'])
+        # the sync catalogue API is run in a thread, off the event loop
+        self.assertNotEqual(api.catalogue_thread, threading.get_ident())
+
+    def test_backoff(self):
+        class RetryAfterError(Exception):
+            headers = {'Retry-After': '3'}
+
+        requester = AsyncRequester(FakeApi(), backoff_base=1, backoff_max=10)
+        for attempt in range(1, 10):
+            self.assertLessEqual(requester.get_backoff(attempt), min(10, 2 ** (attempt - 1)))
+        self.assertEqual(requester.get_backoff(1, RetryAfterError()), 3)
+
+    def test_give_up(self):
+        api = FakeApi(n_errors=100)
+        requester = AsyncRequester(api, backoff_base=0.001)
+        chapters = requester.get_chapters_async([FakeChapterRequest(True, i) for i in range(2)], retry_count=3)
+        self.assertEqual(api.calls, 8)
+        self.assertEqual([c.content for c in chapters], ['', ''])
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'journal.jsonl')
+            reqs = [FakeChapterRequest(True, i) for i in range(10)]
+            with ChapterCheckpoint(path, 'FAKE') as checkpoint:
+                AsyncRequester(FakeApi(n_pages=2)).get_chapters_async(reqs[:6], checkpoint=checkpoint)
+            with open(path, 'a') as fobj:
+                fobj.write('{"key": "broken')
+
+            api = FakeApi(n_pages=2)
+            with ChapterCheckpoint(path, 'FAKE') as checkpoint:
+                self.assertEqual(len(checkpoint), 6)
+                chapters = AsyncRequester(api).get_chapters_async(reqs, checkpoint=checkpoint)
+            self.assertEqual(api.calls, 8)
+            self.assertEqual([c.content for c in chapters], [f'{i}-0{i}-1' for i in range(10)])
+            self.assertEqual([c.id for c in chapters], list(range(10)))
+            self.assertEqual(len(ChapterCheckpoint(path, 'FAKE')), 10)
+
+    def test_sync_checkpoint_retry(self):
+        class FakeSyncApi(FakeCatalogueApi):
+            def get_chapter(self, req):
+                self.calls += 1
+                if self.n_errors > 0:
+                    self.n_errors -= 1
+                    raise ConnectionError('fake error')
+                return Chapter(f'title {req.chapter_id}', f'{req.chapter_id}-0'), None
+
+        api = FakeSyncApi(n_errors=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'journal.jsonl')
+            # the errors are swallowed by ``get_chapter_sync``, and must still be retried
+            chapters = AsyncRequester(api).run_internal(5, is_async=False, retry_count=5, checkpoint=path)
+            self.assertEqual(len(ChapterCheckpoint.for_api(path, api)), 5)
+        self.assertEqual(api.calls, 9)
+        self.assertEqual([c.content for c in chapters], [f'{i}-0' for i in range(5)])
+
+    def test_cached_error_page(self):
+        class FakeErrorApi(FakeServerApi):
+            """Each chapter is first served as an error page with a 200"""
+
+            def parse(self, req, text):
+                if text.endswith('-error'):
+                    self.versions[req.chapter_id] = 'ok'
+                    raise ValueError(text)
+                return Chapter(f'title {req.chapter_id}', text), None
+
+            def get_chapter(self, req):
+                return self.parse(req, RequestsTool.request(f'{self.url}/{req.chapter_id}'))
+
+            async def get_chapter_async(self, session, req):
+                return self.parse(req, await RequestsTool.request_async(session, f'{self.url}/{req.chapter_id}'))
+
+        for is_async in (True, False):
+            api = FakeErrorApi()
+            api.versions.update({i: 'error' for i in range(3)})
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = ResponseCache(os.path.join(tmp, 'cache.db'))
+                RequestsTool.set_cache(cache)
+                try:
+                    requester = AsyncRequester(api, backoff_base=0.001)
+                    chapters = requester.run_internal(3, is_async=is_async, retry_count=3)
+                finally:
+                    RequestsTool.set_cache(None)
+                    cache.close()
+                    api.close()
+            # the retries skip the cached error pages
+            self.assertEqual([c.content for c in chapters], [f'{i}-ok' for i in range(3)])
+            self.assertEqual(len(api.requests), 6)
+
+    def test_writer(self):
+        api = FakeApi(n_pages=2, n_errors=3)
+        requester = AsyncRequester(api, max_concurrency=4, backoff_base=0.01)
+        reqs = [FakeChapterRequest(True, i) for i in range(20)]
+        props = dict(name='name', author='author', preface='preface')
+        with tempfile.TemporaryDirectory() as tmp:
+            txt_path, json_path = os.path.join(tmp, 'book.txt'), os.path.join(tmp, 'book.json')
+            with BookWriter.for_path(txt_path, props) as txt_writer:
+                chapters = requester.get_chapters_async(reqs, writer=txt_writer)
+            self.assertEqual([c.content for c in chapters], [''] * 20)
+            with BookWriter.for_path(json_path, props) as json_writer:
+                requester.get_chapters_async(reqs, writer=json_writer)
+
+            expected = Book(chapters=[Chapter(f'title {i}', f'{i}-0{i}-1', i) for i in range(20)], **props)
+            expected_path = os.path.join(tmp, 'expected.txt')
+            expected.to_txt(expected_path)
+            with open(txt_path) as fobj, open(expected_path) as fexp:
+                self.assertEqual(fobj.read(), fexp.read())
+            self.assertEqual(Book.read_json(json_path).chapters, expected.chapters)
+
+
+class TestBatchRequester(unittest.TestCase):
+
+    def test_run(self):
+        class BrokenCatalogueApi(FakeCatalogueApi):
+            def get_chapter_list(self, catalogue):
+                raise ConnectionError('fake error')
+
+        apis = [FakeCatalogueApi(n_pages=2), FakeCatalogueApi(), BrokenCatalogueApi()]
+        books = [(apis[0], 5, dict(name='a')), (apis[1], 3), (apis[2], 4), (apis[0], 2, dict(name='d'))]
+        results = BatchRequester(max_books=2, max_per_host=4, rate_per_host=1000).run(books)
+        self.assertEqual([c.content for c in results[0].chapters], [f'{i}-0{i}-1' for i in range(5)])
+        self.assertEqual(results[0].name, 'a')
+        self.assertEqual([c.content for c in results[1].chapters], [f'{i}-0' for i in range(3)])
+        self.assertIsInstance(results[2], ConnectionError)
+        self.assertEqual(results[3].name, 'd')
+        self.assertLessEqual(apis[0].max_running, 8)
+
+    def test_book_concurrency(self):
+        # the per-host limit is left to the shared connector, instead of limiting the pages of each book
+        batch = BatchRequester(max_concurrency=16, max_per_host=2)
+        batch.run([(FakeCatalogueApi(), 3)])
+        self.assertEqual((batch.requesters[0].max_concurrency, batch.requesters[0].max_per_host), (16, 2))
+        batch = BatchRequester(max_concurrency=16, book_concurrency=4)
+        batch.run([(FakeCatalogueApi(), 3)])
+        self.assertEqual(batch.requesters[0].max_concurrency, 4)
+
+    def test_global_limiter(self):
+        books = [(FakeCatalogueApi(), 3)]
+        RequestsTool.set_limiter(RateLimiter(1000))
+        try:
+            with self.assertRaises(ValueError):
+                BatchRequester(rate_per_host=1000).run(books)
+            results = BatchRequester().run(books)
+        finally:
+            RequestsTool.set_limiter(None)
+        self.assertEqual([c.content for c in results[0].chapters], [f'{i}-0' for i in range(3)])
+
+    def test_progress(self):
+        observer = RecordingObserver()
+        api = FakeCatalogueApi(n_pages=2)
+        batch = BatchRequester(max_books=2, observers=[observer])
+        batch.run([(api, 5), (api, 3), (api, 2)])
+        finished = {p.label: p for e, p in observer.events if e == 'finish'}
+        self.assertEqual({label: (p.total, p.done) for label, p in finished.items()},
+                         {'FakeCatalogueApi #1': (5, 5), 'FakeCatalogueApi #2': (3, 3), 'FakeCatalogueApi #3': (2, 2)})
+        self.assertEqual(sorted(batch.requesters), [0, 1, 2])
+        self.assertTrue(batch.requesters[0].progress.finished)
+
+
+class TestUpdate(unittest.TestCase):
+
+    def test_update_json(self):
+        api = FakeCatalogueApi()
+        requester = AsyncRequester(api)
+        book = requester.run(dict(name='a'), 5)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, 'book.json')
+            book.to_json(json_path)
+            previous = Book.read(json_path)
+        previous.chapters[1].content = ''
+        api.calls = 0
+        book = requester.update(previous, 8)
+        # the new chapters and the empty one
+        self.assertEqual(api.calls, 4)
+        self.assertEqual(book.name, 'a')
+        self.assertEqual([c.content for c in book.chapters], [f'{i}-0' for i in range(8)])
+        self.assertEqual([c.id for c in book.chapters], list(range(8)))
+        api.calls = 0
+        requester.update(book, 8)
+        self.assertEqual(api.calls, 0)
+        # only the chapters with content count as dropped, an empty one is requested again
+        book.chapters[2].content = ''
+        with self.assertLogs('Requester', 'INFO') as logs:
+            requester.update(book, 6)
+        self.assertIn('5 chapters kept, 1 missing, 1 to request, 2 dropped', '\n'.join(logs.output))
+
+    def test_update_txt(self):
+        api = FakeCatalogueApi()
+        requester = AsyncRequester(api)
+        book = requester.run(dict(name='a', author='b'), 5)
+        with tempfile.TemporaryDirectory() as tmp:
+            txt_path = os.path.join(tmp, 'book.txt')
+            book.to_txt(txt_path)
+            api.calls = 0
+            # no keys in the TXT and no titles in the requests, so matched by position
+            book = requester.update(txt_path, 7)
+        self.assertEqual(api.calls, 2)
+        self.assertEqual((book.name, book.author), ('a', 'b'))
+        self.assertEqual([c.content for c in book.chapters], [f'{i}-0' for i in range(7)])
+
+    def test_recheck(self):
+        api = FakeServerApi()
+        api.versions.update({i: 'v1' for i in range(5)})
+        requester = AsyncRequester(api)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                json_path = os.path.join(tmp, 'book.json')
+                requester.run(dict(name='a'), 4).to_json(json_path)
+                # no validators yet, so requested in full
+                requester.update(json_path, 4, recheck=True).to_json(json_path)
+                self.assertEqual(len(FingerprintIndex.for_book(json_path)), 4)
+                api.requests.clear()
+                api.versions[2] = 'v2'
+                book = requester.update(json_path, 5, recheck=True)
+        finally:
+            api.close()
+        self.assertEqual([c.content for c in book.chapters], ['0-v1', '1-v1', '2-v2', '3-v1', '4-v1'])
+        self.assertEqual([c.id for c in book.chapters], list(range(5)))
+        self.assertEqual(sorted(api.requests), [('/0', 'v1'), ('/1', 'v1'), ('/2', 'v1'), ('/3', 'v1'), ('/4', None)])
+
+    def test_run_fingerprints(self):
+        for is_async in (True, False):
+            api = FakeServerApi()
+            api.versions.update({i: 'v1' for i in range(4)})
+            requester = AsyncRequester(api)
+            try:
+                with tempfile.TemporaryDirectory() as tmp:
+                    json_path = os.path.join(tmp, 'book.json')
+                    requester.run(dict(name='a'), 4, is_async=is_async,
+                                  fingerprints=FingerprintIndex.for_book(json_path)).to_json(json_path)
+                    index = FingerprintIndex.for_book(json_path)
+                    self.assertEqual((len(index), len(index.validators)), (4, 4))
+                    # validated from the first recheck on
+                    api.requests.clear()
+                    book = requester.update(json_path, 3, recheck=True)
+                    index = FingerprintIndex.for_book(json_path)
+            finally:
+                api.close()
+            self.assertEqual(sorted(api.requests), [('/0', 'v1'), ('/1', 'v1'), ('/2', 'v1')])
+            self.assertEqual([c.content for c in book.chapters], ['0-v1', '1-v1', '2-v1'])
+            # the fingerprints of the dropped chapter are dropped too
+            self.assertEqual((len(index), len(index.validators)), (3, 3))
+
+    def test_txt_round_trip(self):
+        chapters = [Chapter(f'title {i}', f'line 1\n\nline {i}', i) for i in range(3)]
+        book = Book(chapters, 'preface', 'a', 'b')
+        with tempfile.TemporaryDirectory() as tmp:
+            txt_path = os.path.join(tmp, 'book.txt')
+            book.to_txt(txt_path)
+            read = Book.read_txt(txt_path)
+        # the last chapter is stripped as the others, instead of keeping the trailing blank lines
+        self.assertEqual(read.chapters, chapters)
+        self.assertEqual((read.preface, read.name, read.author), ('preface', 'a', 'b'))
+
+    def test_diff_chapters(self):
+        @dataclass
+        class TitledRequest(ChapterRequest):
+            chapter_id: int
+            title: str = None
+
+        chapters = [Chapter('a', 'x'), Chapter('b', ''), Chapter('c', 'z'), Chapter('a', 'w')]
+        reqs = [TitledRequest(True, i, t) for i, t in enumerate(['a', 'b', 'a', 'd'])]
+        matched, missing = AsyncRequester.diff_chapters(chapters, reqs)
+        self.assertEqual([c.content if c else None for c in matched], ['x', None, 'w', None])
+        self.assertEqual(missing, [1, 3])
+
+
+class RecordingObserver(ProgressObserver):
+    def __init__(self):
+        self.events = []
+
+    def on_start(self, progress):
+        self.events.append(('start', progress))
+
+    def on_progress(self, progress):
+        self.events.append(('progress', progress))
+
+    def on_finish(self, progress):
+        self.events.append(('finish', progress))
+
+
+class TestProgress(unittest.TestCase):
+
+    def test_observer(self):
+        observer = RecordingObserver()
+        requester = AsyncRequester(FakeApi(n_pages=2, n_errors=3), max_concurrency=4, backoff_base=0.01,
+                                   observers=[observer])
+        requester.progress_interval = 0
+        requester.get_chapters_async([FakeChapterRequest(True, i) for i in range(20)])
+        events = [e for e, _ in observer.events]
+        self.assertEqual(events[0], 'start')
+        self.assertEqual(events[-1], 'finish')
+        self.assertIn('progress', events)
+        self.assertEqual(observer.events[0][1].total, 20)
+        last = observer.events[-1][1]
+        self.assertEqual((last.done, last.failed, last.pages, last.errors, last.in_flight), (20, 0, 40, 3, 0))
+        self.assertEqual(last.bytes, sum(len(f'{i}-0{i}-1') for i in range(20)))
+        self.assertEqual(last.eta, 0)
+        self.assertTrue(last.finished)
+        self.assertGreater(max(p.in_flight for _, p in observer.events), 1)
+
+    def test_abort(self):
+        def watch(progress):
+            if progress.done >= 5:
+                progress.abort('enough')
+
+        requester = AsyncRequester(FakeApi(), max_concurrency=2, observers=[watch])
+        requester.progress_interval = 0
+        chapters = requester.get_chapters_async([FakeChapterRequest(True, i) for i in range(100)])
+        done = sum(1 for c in chapters if c.content)
+        self.assertGreaterEqual(done, 5)
+        self.assertLess(done, 20)
+        self.assertTrue(requester.progress.aborted)
+        self.assertEqual(requester.progress.abort_reason, 'enough')
+
+        requester = IterativeRequester(FakeIterApi())
+        requester.add_observer(watch)
+        requester.progress_interval = 0
+        chapters = requester.run_internal(FakeChapterRequest(True, 0))
+        self.assertEqual(len(chapters), 5)
@@ -0,0 +1,87 @@
+import asyncio
+import os.path
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from requests.structures import CaseInsensitiveDict
+
+from schomeless.utils import RequestsTool, ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.tmp.name, 'cache.db'), default_ttl=100,
+                                   ttls={'https://a.com/catalogue': 0, 'https://a.com/chapter': 1000})
+
+    def test_key(self):
+        key = ResponseCache.key('get', 'https://a.com/chapter', dict(params={'id': 1}, headers={'x': 1}))
+        self.assertEqual(key, ResponseCache.key('GET', 'https://a.com/chapter', dict(params={'id': 1})))
+        self.assertNotEqual(key, ResponseCache.key('GET', 'https://a.com/chapter', dict(params={'id': 2})))
+        self.assertNotEqual(key, ResponseCache.key('POST', 'https://a.com/chapter', dict(params={'id': 1})))
+
+    def test_ttl_and_stats(self):
+        self.assertEqual(self.cache.get_ttl('https://a.com/chapter/1'), 1000)
+        self.assertEqual(self.cache.get_ttl('https://b.com'), 100)
+        self.cache.set('a', 'https://a.com/catalogue?id=1', 'not cached')
+        self.cache.set('b', 'https://a.com/chapter/1', 'cached', {'ETag': 'x'})
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), ('cached', {'ETag': 'x'}))
+        with mock.patch('time.time', return_value=1e12):
+            self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.stats(), dict(hits=1, misses=2, evictions=0, entries=0, size=0))
+
+    def test_lru_eviction(self):
+        self.cache.max_size = 40
+        for key in 'abc':
+            self.cache.set(key, 'https://b.com', key * 10)
+        self.cache.get('a')
+        self.cache.set('d', 'https://b.com', 'd' * 10)
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_requests_tool(self):
+        class FakeResponse:
+            headers = CaseInsensitiveDict({'Accesskey': 'k'})
+            charset = None
+
+            def raise_for_status(self):
+                pass
+
+            async def read(self):
+                return b'body'
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                pass
+
+        session = mock.Mock()
+        session.request.return_value = FakeResponse()
+        threads = []
+        get, set = self.cache.get, self.cache.set
+        self.cache.get = lambda *args: threads.append(threading.current_thread().name) or get(*args)
+        self.cache.set = lambda *args: threads.append(threading.current_thread().name) or set(*args)
+        RequestsTool.set_cache(self.cache)
+        try:
+            for _ in range(3):
+                text, headers = asyncio.run(RequestsTool.request_async(session, 'https://b.com', include_headers=True))
+                self.assertEqual(text, 'body')
+                self.assertEqual(headers.get('accesskey'), 'k')
+            self.assertEqual(RequestsTool.request('https://b.com'), 'body')
+        finally:
+            RequestsTool.set_cache(None)
+        self.assertEqual(session.request.call_count, 1)
+        # SQLite is queried off the event loop by the async requests
+        self.assertEqual(len(threads), 5)
+        self.assertTrue(all(name.startswith('ResponseCache') for name in threads[:4]))
+        self.assertEqual(threads[4], threading.main_thread().name)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from schomeless.utils import RateLimiter, RequestsTool
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_reserve(self):
+        limiter = RateLimiter(10, burst=3)
+        delays = [limiter.reserve('a.com') for _ in range(6)]
+        self.assertEqual(delays[:3], [0, 0, 0])
+        for i, delay in enumerate(delays[3:]):
+            self.assertAlmostEqual(delay, 0.1 * (i + 1), delta=0.01)
+        # each host has its own bucket
+        self.assertEqual(limiter.reserve('b.com'), 0)
+
+    def test_acquire_async(self):
+        async def _core():
+            await asyncio.gather(*[limiter.acquire_async('a.com') for _ in range(10)])
+
+        limiter = RateLimiter(50, burst=5)
+        start = time.time()
+        asyncio.run(_core())
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+    def test_trace_config(self):
+        async def handler(request):
+            return web.Response(text='ok')
+
+        async def _core():
+            app = web.Application()
+            app.router.add_get('/', handler)
+            async with TestServer(app) as server:
+                async with aiohttp.ClientSession(trace_configs=[limiter.trace_config()]) as session:
+                    for _ in range(6):
+                        async with session.get(server.make_url('/')) as res:
+                            self.assertEqual(await res.text(), 'ok')
+
+        limiter = RateLimiter(20, burst=1)
+        start = time.time()
+        asyncio.run(_core())
+        self.assertGreaterEqual(time.time() - start, 0.24)
+
+    def test_feedback(self):
+        limiter = RateLimiter(4, rates={'a.com': 8}, adaptive=True, min_rate=1, max_rate=10, success_run=3)
+        self.assertEqual(limiter.get_rate('https://a.com/x'), 8)
+        limiter.feedback('a.com', 429)
+        self.assertEqual(limiter.get_rate('a.com'), 4)
+        for _ in range(3):
+            limiter.feedback('a.com', 200)
+        self.assertAlmostEqual(limiter.get_rate('a.com'), 4.8)
+        # errors other than throttling do not count
+        limiter.feedback('a.com', 404)
+        for _ in range(3):
+            limiter.feedback('a.com', 503)
+        self.assertEqual(limiter.get_rate('a.com'), 1)
+        self.assertEqual(limiter.get_rate('b.com'), 4)
+
+    def test_feedback_retry_after(self):
+        limiter = RateLimiter(10, burst=5)
+        limiter.feedback('a.com', 429, retry_after=1)
+        self.assertAlmostEqual(limiter.reserve('a.com'), 1.1, delta=0.01)
+
+    def test_feedback_retry_after_idle(self):
+        limiter = RateLimiter(10, burst=5)
+        limiter.acquire('a.com')
+        # idle long enough to refill the whole wait if the bucket kept its old timestamp
+        time.sleep(0.6)
+        limiter.feedback('a.com', 429, retry_after=0.5)
+        start = time.monotonic()
+        limiter.acquire('a.com')
+        self.assertAlmostEqual(time.monotonic() - start, 0.6, delta=0.1)
+
+    def test_requests_tool(self):
+        statuses = [429, 200, 200, 200]
+
+        async def handler(request):
+            return web.Response(text='ok', status=statuses.pop(0))
+
+        async def _core():
+            app = web.Application()
+            app.router.add_get('/', handler)
+            async with TestServer(app) as server:
+                url = str(server.make_url('/'))
+                async with aiohttp.ClientSession() as session:
+                    with self.assertRaises(aiohttp.ClientResponseError):
+                        await RequestsTool.request_async(session, url)
+                    for _ in range(3):
+                        self.assertEqual(await RequestsTool.request_async(session, url), 'ok')
+                return RequestsTool.get_domain_name(url)
+
+        limiter = RateLimiter(40, burst=1, adaptive=True, success_run=10)
+        RequestsTool.set_limiter(limiter)
+        try:
+            start = time.time()
+            host = asyncio.run(_core())
+        finally:
+            RequestsTool.set_limiter(None)
+        # halved to 20/s after the 429
+        self.assertEqual(limiter.get_rate(host), 20)
+        self.assertGreaterEqual(time.time() - start, 0.12)
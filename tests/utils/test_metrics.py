@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from schomeless.utils import Metrics, MetricsTool, HistogramSink, JsonlSink, PrometheusSink, RequestsTool, \
+    CryptoTool
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        sink = HistogramSink(buckets=(0.01, 0.1, 1.))
+        metrics = Metrics([sink])
+        for value in [0.005] * 98 + [0.05, 0.5]:
+            metrics.observe('parse', value, host='a.com')
+        metrics.count('retries', api='JJWXC')
+        metrics.count('retries', 2, api='JJWXC')
+        with metrics.span('write'):
+            pass
+        stages = {s['name']: s for s in sink.summary()['stages']}
+        self.assertEqual(stages['parse']['count'], 100)
+        self.assertEqual(stages['parse']['labels'], {'host': 'a.com'})
+        self.assertEqual(stages['parse']['p50'], 0.01)
+        self.assertEqual(stages['parse']['p99'], 0.1)
+        self.assertEqual(stages['parse']['max'], 0.5)
+        self.assertEqual(stages['write']['count'], 1)
+        self.assertEqual(sink.summary()['counters'], [dict(name='retries', labels={'api': 'JJWXC'}, value=3)])
+        self.assertIn('retries', sink.report())
+
+    def test_file_sinks(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            jsonl_path = os.path.join(tempdir, 'metrics.jsonl')
+            prom_path = os.path.join(tempdir, 'metrics.prom')
+            metrics = Metrics([JsonlSink(jsonl_path), PrometheusSink(prom_path, buckets=(0.1, 1.))])
+            metrics.observe('body', 0.5, host='a.com')
+            metrics.count('bytes', 100, host='a.com')
+            metrics.close()
+            with open(jsonl_path) as f:
+                lines = [json.loads(line) for line in f]
+            with open(prom_path) as f:
+                text = f.read()
+        self.assertEqual([(l['type'], l['name'], l['value'], l['labels']) for l in lines],
+                         [('observe', 'body', 0.5, {'host': 'a.com'}), ('count', 'bytes', 100, {'host': 'a.com'})])
+        self.assertIn('# TYPE schomeless_body_seconds histogram', text)
+        self.assertIn('schomeless_body_seconds_bucket{host="a.com",le="0.1"} 0', text)
+        self.assertIn('schomeless_body_seconds_bucket{host="a.com",le="1.0"} 1', text)
+        self.assertIn('schomeless_body_seconds_count{host="a.com"} 1', text)
+        self.assertIn('schomeless_bytes_total{host="a.com"} 100', text)
+
+    def test_disabled(self):
+        self.assertIsNone(MetricsTool.metrics)
+        with MetricsTool.span('parse'):
+            MetricsTool.count('retries')
+
+    def test_requests_tool(self):
+        statuses = [503, 200]
+
+        async def handler(request):
+            return web.Response(text='{"a": 1}', status=statuses.pop(0))
+
+        async def _core():
+            app = web.Application()
+            app.router.add_get('/', handler)
+            async with TestServer(app) as server:
+                url = str(server.make_url('/'))
+                async with aiohttp.ClientSession(trace_configs=[MetricsTool.trace_config()]) as session:
+                    with self.assertRaises(aiohttp.ClientResponseError):
+                        await RequestsTool.request_async(session, url)
+                    self.assertEqual(await RequestsTool.request_and_json_async(session, url), {'a': 1})
+                return RequestsTool.get_domain_name(url)
+
+        sink = HistogramSink()
+        MetricsTool.set_metrics(Metrics([sink]))
+        try:
+            host = asyncio.run(_core())
+            CryptoTool.aes_cbc_decrypt(b'0' * 16, b'0' * 16, b'0' * 16)
+        finally:
+            MetricsTool.set_metrics(None)
+        stages = {s['name']: s['count'] for s in sink.summary()['stages']}
+        counters = {(c['name'], tuple(c['labels'].items())): c['value'] for c in sink.summary()['counters']}
+        self.assertEqual(stages['first_byte'], 2)
+        self.assertEqual(stages['connect'], 1)
+        self.assertEqual(stages['body'], 1)
+        self.assertEqual(stages['decode'], 1)
+        self.assertEqual(stages['parse'], 1)
+        self.assertEqual(stages['decrypt'], 1)
+        self.assertEqual(counters[('responses', (('host', host), ('status', '503')))], 1)
+        self.assertEqual(counters[('responses', (('host', host), ('status', '200')))], 1)
+        self.assertEqual(counters[('bytes', (('host', host),))], 8)
+        self.assertEqual(counters[('reused_connections', (('host', host),))], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
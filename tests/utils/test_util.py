@@ -0,0 +1,350 @@
+import asyncio
+import os.path
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+from pyquery import PyQuery
+
+from schomeless.fingerprint import FingerprintIndex
+from schomeless.utils import RequestCoalescer, CryptoTool, RequestsTool, RawResponse, SelectorTool, \
+    SessionPool, NotModifiedError
+
+
+class TestRequestCoalescer(unittest.TestCase):
+
+    def test_call(self):
+        calls = []
+
+        def request(key):
+            calls.append(key)
+            time.sleep(0.2)
+            return key * 2
+
+        coalescer = RequestCoalescer()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(coalescer.call('a', request, 'a')))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ['aa'] * 5)
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(coalescer.call('a', request, 'a'), 'aa')
+        self.assertEqual(calls, ['a', 'a'])
+
+    def test_call_async(self):
+        calls = []
+
+        async def request(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key * 2
+
+        async def _core():
+            return await asyncio.gather(*[coalescer.call_async(k, request, k) for k in 'aaab'])
+
+        coalescer = RequestCoalescer()
+        self.assertEqual(asyncio.run(_core()), ['aa', 'aa', 'aa', 'bb'])
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertEqual(coalescer.tasks, {})
+
+
+def _double(x):
+    return x * 2
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def test_keep_alive(self):
+        clients = set()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                clients.add(self.client_address)
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.send_header('Set-Cookie', 'sid=1')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/'
+        pool = SessionPool(size=2)
+        try:
+            with ThreadPoolExecutor(2) as executor:
+                responses = list(executor.map(lambda _: pool.request('GET', url), range(20)))
+        finally:
+            pool.close()
+            server.shutdown()
+            server.server_close()
+        self.assertEqual({res.text for res in responses}, {'ok'})
+        # one connection per session
+        self.assertLessEqual(len(clients), 2)
+        # cookies of the responses are not kept
+        self.assertEqual(responses[-1].request.headers.get('Cookie'), None)
+
+
+class TestConditional(unittest.TestCase):
+
+    def setUp(self):
+        self.versions = {'/a': 'v1', '/b': 'v1'}
+        self.requests = []
+        versions, requests = self.versions, self.requests
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                etag = f'"{versions[self.path]}"'
+                requests.append((self.path, self.headers.get('If-None-Match')))
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                body = f'{self.path} {versions[self.path]}'.encode('utf-8')
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.index = FingerprintIndex(os.path.join(self.tempdir.name, 'book.fingerprints.json'))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tempdir.cleanup()
+
+    def test_sync(self):
+        with RequestsTool.use_validators(self.index):
+            self.assertEqual(RequestsTool.request(f'{self.url}/a'), '/a v1')
+            # not conditional
+            self.assertEqual(RequestsTool.request(f'{self.url}/a'), '/a v1')
+        self.versions['/b'] = 'v2'
+        with RequestsTool.use_validators(self.index, conditional=True):
+            with self.assertRaises(NotModifiedError):
+                RequestsTool.request_raw(f'{self.url}/a')
+            self.assertEqual(RequestsTool.request(f'{self.url}/b', include_headers=True)[1]['ETag'], '"v2"')
+            with self.assertRaises(NotModifiedError):
+                RequestsTool.request(f'{self.url}/b')
+        self.assertEqual(self.requests, [('/a', None), ('/a', None), ('/a', '"v1"'), ('/b', None), ('/b', '"v2"')])
+        # no validators outside the block
+        self.assertEqual(RequestsTool.request(f'{self.url}/a'), '/a v1')
+
+    def test_async(self):
+        async def _core():
+            async with aiohttp.ClientSession() as session:
+                with RequestsTool.use_validators(self.index):
+                    await asyncio.gather(RequestsTool.request_async(session, f'{self.url}/a'),
+                                         RequestsTool.request_raw_async(session, f'{self.url}/b'))
+                    self.versions['/a'] = 'v2'
+                    with RequestsTool.use_validators(None, conditional=True):
+                        with self.assertRaises(NotModifiedError):
+                            await RequestsTool.request_raw_async(session, f'{self.url}/b')
+                        return await RequestsTool.request_async(session, f'{self.url}/a')
+
+        self.assertEqual(asyncio.run(_core()), '/a v2')
+        self.index.save()
+        index = FingerprintIndex(self.index.file_path)
+        self.assertEqual(index.get_validators(RequestsTool.request_key('GET', f'{self.url}/a')),
+                         {'If-None-Match': '"v2"'})
+
+
+class TestCryptoTool(unittest.TestCase):
+
+    def test_des_cbc_decrypt(self):
+        from Crypto.Cipher import DES
+        from Crypto.Util.Padding import pad
+
+        text = '晋江文学城'.encode('utf-8')
+        data = DES.new(b'KW8Dvm2N', DES.MODE_CBC, b'1ae2c94b').encrypt(pad(text, DES.block_size))
+        self.assertEqual(CryptoTool.des_cbc_decrypt(data, 'KW8Dvm2N', '1ae2c94b'), text)
+
+    def test_aes_cbc_decrypt(self):
+        from Crypto.Cipher import AES
+
+        text = '七猫小说'.encode('utf-8').ljust(32)
+        key, iv = b'242ccb8230d709e1', b'0123456789abcdef'
+        data = AES.new(key, AES.MODE_CBC, iv).encrypt(text)
+        self.assertEqual(CryptoTool.aes_cbc_decrypt(data, key, iv), text)
+
+    def test_map(self):
+        items = [(i,) for i in range(10)]
+        self.assertEqual(CryptoTool.map(_double, items), list(range(0, 20, 2)))
+        self.assertEqual(CryptoTool.map(_double, items, processes=2), list(range(0, 20, 2)))
+
+
+class TestEncoding(unittest.TestCase):
+
+    def setUp(self):
+        RequestsTool.encodings.clear()
+
+    def test_detect_prefix(self):
+        text = '第一章 晋江文学城，欢迎你的到来。' * 2000
+        content = text.encode('gb18030')
+        self.assertEqual(RequestsTool.detect_encoding(content, 'utf-8').lower(), 'gb18030')
+        self.assertEqual(RequestsTool.detect_encoding(b'{"code": 0}' * 1000, 'gbk'), 'gbk')
+        self.assertEqual(RequestsTool.decode(content, 'utf-8', 'https://a.com/1'), text)
+        self.assertEqual(RequestsTool.encodings[('a.com', 'utf-8')].lower(), 'gb18030')
+
+    def test_decode_fallback(self):
+        # the prefix is ASCII, the rest isn't
+        text = 'a' * 10000 + '第一章'
+        url = 'https://b.com/chapter?id=1'
+        self.assertEqual(RequestsTool.decode(text.encode('gbk'), 'gbk', url, charset='utf-8'), text)
+        self.assertEqual(RequestsTool.encodings[('b.com', 'gbk')], 'gbk')
+        # the remembered encoding fails, so try the others
+        self.assertEqual(RequestsTool.decode(text.encode('utf-8'), 'gbk', url, charset='utf-8'), text)
+        self.assertEqual(RequestsTool.encodings[('b.com', 'gbk')], 'utf-8')
+        self.assertEqual(RawResponse(text.encode('utf-8'), charset='utf-8').text('ascii'), text)
+
+    def test_declared_charset_first(self):
+        url = 'https://c.com/1'
+        text = '第一章 晋江文学城'
+        self.assertEqual(RequestsTool.decode('abc'.encode('latin-1'), 'latin-1', url), 'abc')
+        self.assertEqual(RequestsTool.encodings[('c.com', 'latin-1')], 'latin-1')
+        # latin-1 decodes anything, so only the declared charset avoids mojibake
+        self.assertEqual(RequestsTool.decode(text.encode('utf-8'), 'latin-1', url, charset='utf-8'), text)
+        self.assertEqual(RequestsTool.resolve_encoding(text.encode('gbk'), 'latin-1', url, charset='GBK'), 'GBK')
+        self.assertEqual(RequestsTool.resolve_encoding(b'', 'latin-1', url, charset='gbk'), 'GBK')
+        # nothing declared, so the remembered one is trusted
+        self.assertEqual(RequestsTool.resolve_encoding(b'', 'latin-1', url), 'GBK')
+
+    def test_get_charset(self):
+        self.assertEqual(RequestsTool.get_charset('text/html; charset=GBK'), 'GBK')
+        self.assertEqual(RequestsTool.get_charset('application/json; charset="utf-8"'), 'utf-8')
+        self.assertIsNone(RequestsTool.get_charset('text/html'))
+        self.assertIsNone(RequestsTool.get_charset(None))
+
+
+class TestRawResponse(unittest.TestCase):
+    CATALOGUE = '''<html><head><meta charset="gb18030"></head><body><table>
+        <tr itemscope><td><span itemprop="headline"><div><a itemprop="url" href="a?id=1">第一章</a></div>
+            <div><a itemprop="url" href="a?id=x">伪</a></div></span></td></tr>
+        <tr itemscope><td><span itemprop="headline"><div><a itemprop="url" href="a?id=2">第二章</a></div></span></td></tr>
+        <tr><td><span itemprop="headline"><div><a itemprop="url" href="a?id=y">无</a></div></span></td></tr>
+        </table></body></html>'''
+
+    def setUp(self):
+        RequestsTool.encodings.clear()
+        self.raw = RawResponse(self.CATALOGUE.encode('gb18030'), url='https://c.com/catalogue')
+
+    def test_xpath(self):
+        css = [a.attrib['href'] for a in self.raw.pyquery('gb18030')(
+            "tr[itemscope] span[itemprop=headline] div:first a[itemprop=url]")]
+        xpath = [a.attrib['href'] for a in self.raw.xpath(
+            "//tr[@itemscope]//span[@itemprop='headline']/descendant::div[1]//a[@itemprop='url']", 'gb18030')]
+        self.assertEqual(css, ['a?id=1', 'a?id=2'])
+        self.assertEqual(xpath, css)
+
+    def test_iterparse(self):
+        titles = [a.text for a in self.raw.iterparse('a', 'gb18030')]
+        self.assertEqual(titles, ['第一章', '伪', '第二章', '无'])
+
+    def test_parser_reused(self):
+        self.assertEqual(self.raw.tree('gb18030').xpath('//a')[0].text, '第一章')
+        self.assertIs(RequestsTool.get_html_parser('GB18030'), RequestsTool.get_html_parser('gb18030'))
+        cached = RawResponse(self.CATALOGUE.encode('utf-8'), charset='utf-8')
+        self.assertEqual(cached.tree('gb18030').xpath('//a')[0].text, '第一章')
+
+    def test_selector(self):
+        selector = "tr[itemscope] span[itemprop=headline] div:first a[itemprop=url]"
+        d = self.raw.pyquery('gb18030')
+        self.assertIs(SelectorTool.compile(selector), SelectorTool.compile(selector))
+        self.assertEqual(list(SelectorTool.select(d, selector)), list(d(selector)))
+        self.assertEqual([a.attrib['href'] for a in SelectorTool.select(self.raw.tree('gb18030'), selector)],
+                         ['a?id=1', 'a?id=2'])
+        rows = d('tr')
+        self.assertEqual(SelectorTool.select(rows.eq(1), 'a').text(), rows.eq(1)('a').text())
+        self.assertIsInstance(SelectorTool.select(rows, 'a:first'), PyQuery)
+        self.assertEqual(list(SelectorTool.select(rows, 'a:first')), list(rows('a:first')))
+        self.assertEqual(SelectorTool.findall(d, selector), list(d(selector)))
+        self.assertIsInstance(SelectorTool.findall(self.raw.tree('gb18030'), selector), list)
+
+
+class TestFetchPages(unittest.TestCase):
+
+    def test_total(self):
+        running = []
+        lock = threading.Lock()
+
+        def get_page(pid):
+            with lock:
+                running.append(pid)
+            time.sleep(0.05)
+            return pid * 10
+
+        start = time.time()
+        self.assertEqual(RequestsTool.fetch_pages(get_page, start=2, total=17, window=8), list(range(20, 180, 10)))
+        self.assertLess(time.time() - start, 16 * 0.05)
+        self.assertEqual(sorted(running), list(range(2, 18)))
+        self.assertEqual(RequestsTool.fetch_pages(get_page, start=2, total=1), [])
+
+    def test_is_last(self):
+        def get_page(pid):
+            if pid > 6:
+                raise ValueError('no such page')
+            time.sleep(0.01 * (6 - pid))
+            return [pid] * (3 if pid < 6 else 1)
+
+        pages = RequestsTool.fetch_pages(get_page, is_last=lambda pages: len(pages[-1]) < 3, window=4)
+        self.assertEqual(pages, [[1] * 3, [2] * 3, [3] * 3, [4] * 3, [5] * 3, [6]])
+
+    def test_get_total(self):
+        requested = []
+
+        def get_page(pid):
+            requested.append(pid)
+            # a pager of the current page and the next two
+            return pid, min(pid + 2, 9)
+
+        def run(**kwargs):
+            requested.clear()
+            return RequestsTool.fetch_pages(get_page, is_last=lambda pages: pages[-1][0] == pages[-1][1], window=4,
+                                            **kwargs)
+
+        pages = run(get_total=lambda pages: max(last for _, last in pages))
+        self.assertEqual([pid for pid, _ in pages], list(range(1, 10)))
+        self.assertEqual(sorted(requested), list(range(1, 10)))
+        # probed from one page on if unknown, so never more than the pages read so far are wasted
+        pages = run()
+        self.assertEqual(len(pages), 9)
+        self.assertLessEqual(max(requested), 12)
+        requested.clear()
+        RequestsTool.fetch_pages(get_page, is_last=lambda pages: True, window=4)
+        self.assertEqual(requested, [1])
+
+    def test_async(self):
+        running = []
+
+        async def get_page(pid):
+            running.append(pid)
+            await asyncio.sleep(0.01)
+            return list(range(pid * 10, pid * 10 + (10 if pid < 4 else 3)))
+
+        pages = asyncio.run(RequestsTool.fetch_pages_async(get_page, is_last=lambda pages: len(pages[-1]) < 10,
+                                                           window=3))
+        self.assertEqual(sum(pages, []), list(range(10, 43)))
+        self.assertLessEqual(max(running), 6)
+        pages = asyncio.run(RequestsTool.fetch_pages_async(get_page, start=2, total=5))
+        self.assertEqual([p[0] for p in pages], [20, 30, 40, 50])